@@ -6,7 +6,10 @@ import requests # use requests to obtain the information from URL
 import pandas as pd
 import os 
 import json
+import re
 import numpy as np
+import solar_API_cache
+import solar_metrics
 # function for access the PV watts API
 def solar_PV_watts_API(api_key, 
     solar_api_url, 
@@ -19,7 +22,13 @@ def solar_PV_watts_API(api_key,
     tilt,
     azimuth,
     timeframe,
-    output_dir):
+    output_dir,
+    cache_dir = None,
+    cache_ttl = None,
+    cache_max_bytes = None,
+    replay_only = False,
+    lat = None,
+    lon = None):
 
     """
     This is the function that obtain the dataset as .json file from PVwatts website.
@@ -62,15 +71,16 @@ def solar_PV_watts_API(api_key,
                 Required input argument
 
                 The address information for the residential house.
+                Use None together with lat and lon to ask for a location instead of an address.
 
 
-        latitude : string (character) ---- decimal
-                Required input argument (Optional if there is address information)
+        lat : string (character) ---- decimal
+                Optional input argument (Required if address is None)
 
                 The latitude for the location to use. The range of the latitude is [-90, 90].    
 
-        longitude : string (character) ---- decimal 
-                Required input argument (Optional if there is address information)
+        lon : string (character) ---- decimal 
+                Optional input argument (Required if address is None)
 
                 The longitude for the location to use. The range of longitude is [-180, 180].
 
@@ -129,64 +139,150 @@ def solar_PV_watts_API(api_key,
                 Default is True.
                 When the value is True that means will save the solar data into the output_dir
 
+        cache_dir : string (character)
+                Optional input argument, default is None (no cache).
+
+                The working directory of the on-disk response cache.
+                The cache key is the hash of all the request parameters except the api_key,
+                see solar_API_cache.py
+
+        cache_ttl : numeric (unit : seconds)
+                Optional input argument, default is None (the cached response never expires).
+
+        cache_max_bytes : numeric
+                Optional input argument, default is None (the cache size is not bounded).
+
+                When the cache is larger than cache_max_bytes, the least recently used responses are removed.
+
+        replay_only : Boolean
+                Default is False.
+                When the value is True, the API is never called and the response must come from cache_dir,
+                which allows re-running the whole pipeline without network.
+
     Output :
         A .json file with the solar PV data
     """
-    api_key = api_key
-    # url for obtain PV watts dataset
-    pv_watts_url = solar_api_url
-    # data format
-    # represent for the data format that you want to download
-    # Options : .json, .xml
-    data_format = data_format
-
-    address = address
-
-    # system capacity, Nameplates capacity(kW)
-    system_capacity = system_capacity # type = decimal, range = (0.05, 500000)
-
-    # module type 
-    # module type for PV 
-    # Options : 0 for Standard. 1 for Premium. 2 for Thin film
-    module_type = module_type # Here step up the modu;e type is Standard
-
-    # System loss (precent)
-    losses = losses # data type = decimal, range = (-5, 99)
-
-    # array_type 
-    array_type = array_type # data type = integer
-    # option:
-    # 0, Fixed - Open Rack
-    # 1, Fixed - Roof Mounted
-    # 2, 1 - Axis 
-    # 3, 1 - Axis Backtracking
-    # 4, 2 - Axis
-
-    # tilt angle degrees
-    tilt = tilt # data type = decimal, range = [0, 90]
-
-    # azimuth angle
-    azimuth = azimuth # data type = decimal, range = (0,360)
-    # time frame 
-    timeframe = timeframe
-    url = pv_watts_url + data_format + "?" +\
-        "api_key=" + api_key + "&"\
-            + "address=" + address + "&" \
-                    + "losses=" + losses + "&" \
-                        + "system_capacity=" + system_capacity + "&"\
-                            + "module_type=" + module_type + "&" \
-                                + "array_type=" + array_type + "&" \
-                                    + "tilt=" + tilt + "&" \
-                                        + "azimuth=" + azimuth + "&" \
-                                            + "timeframe=" + timeframe
-    response = requests.get(url) # requests.get() is the function that obtain the data through API
-    data = response.text
+    # the query parameters of the PV watts API request
+    params = PV_watts_request_parameters(api_key = api_key,
+                                        address = address,
+                                        system_capacity = system_capacity,
+                                        module_type = module_type,
+                                        losses = losses,
+                                        array_type = array_type,
+                                        tilt = tilt,
+                                        azimuth = azimuth,
+                                        timeframe = timeframe,
+                                        lat = lat,
+                                        lon = lon)
     if not os.path.exists(output_dir):
         os.mkdir(output_dir)
+    data = PV_watts_response_text(solar_api_url = solar_api_url,
+                                data_format = data_format,
+                                params = params,
+                                cache_dir = cache_dir,
+                                cache_ttl = cache_ttl,
+                                cache_max_bytes = cache_max_bytes,
+                                replay_only = replay_only)
     # turn the json format 
     solar_data = json.loads(data)
 
     return solar_data
+
+
+def PV_watts_request_parameters(api_key,
+    address,
+    system_capacity,
+    module_type,
+    losses,
+    array_type,
+    tilt,
+    azimuth,
+    timeframe,
+    lat = None,
+    lon = None):
+    """
+    Collect the query parameters of the PV watts API request.
+    The input arguments are the same as solar_PV_watts_API(), see the description over there.
+    The location is either the address or the lat / lon, the unused one is left out.
+
+    Output :
+        params : dict
+                the query parameters for requests.get()
+    """
+    params = {"api_key" : api_key}
+    if address is None:
+        params["lat"] = lat
+        params["lon"] = lon
+    else:
+        params["address"] = address
+    params.update({
+            # System loss (precent), range = (-5, 99)
+            "losses" : losses,
+            # Nameplates capacity(kW), range = (0.05, 500000)
+            "system_capacity" : system_capacity,
+            # 0 for Standard. 1 for Premium. 2 for Thin film
+            "module_type" : module_type,
+            # 0 Fixed - Open Rack, 1 Fixed - Roof Mounted, 2 1 - Axis, 3 1 - Axis Backtracking, 4 2 - Axis
+            "array_type" : array_type,
+            # tilt angle degrees, range = [0, 90]
+            "tilt" : tilt,
+            # azimuth angle, range = (0,360)
+            "azimuth" : azimuth,
+            # monthly or hourly
+            "timeframe" : timeframe})
+    return params
+
+def PV_watts_response_text(solar_api_url,
+    data_format,
+    params,
+    cache_dir = None,
+    cache_ttl = None,
+    cache_max_bytes = None,
+    replay_only = False):
+    """
+    Obtain the response text of one PV watts API request, through the on-disk cache when cache_dir is set.
+
+    Input Arguments:
+        solar_api_url, data_format : see solar_PV_watts_API()
+
+        params : dict
+                the query parameters obtained by PV_watts_request_parameters()
+
+        cache_dir, cache_ttl, cache_max_bytes, replay_only : see solar_PV_watts_API()
+
+    Output :
+        data : string (character)
+                the response text
+    """
+    key = None
+    if cache_dir is not None:
+        key = solar_API_cache.PV_watts_cache_key(solar_api_url, data_format, params)
+        data = solar_API_cache.read_cached_response(cache_dir, key, ttl = cache_ttl)
+        if data is not None:
+            return data
+    if replay_only:
+        raise LookupError("replay_only is set but the PV watts response for location "
+                        + str(params.get("address", (params.get("lat"), params.get("lon"))))
+                        + " is not in the cache " + str(cache_dir))
+    url = solar_api_url + data_format
+    solar_metrics.count("PV_watts_API_calls")
+    response = requests.get(url, params = params) # requests.get() is the function that obtain the data through API
+    data = response.text
+    # only keep the successful response, an error message should be asked again next time
+    if key is not None and response.status_code == 200 and not PV_watts_response_errors(data):
+        solar_API_cache.write_cached_response(cache_dir, key, data, max_bytes = cache_max_bytes)
+    return data
+
+def PV_watts_response_errors(data):
+    """
+    Return the "errors" list in the PV watts response text (empty list when the response is fine).
+    """
+    try:
+        errors = json.loads(data).get("errors", [])
+    except (ValueError, AttributeError):
+        return ["response is not a json object"]
+    return errors or []
+
 #  Read Json file into numpy array and download the data
 # function to extract element from Json file
 # Obtain the information from Json file
@@ -227,8 +323,81 @@ def extract_element_from_json(obj, path):
             outer_arr.append(extract(item, path, 0, []))
         return outer_arr
 
+# PV watts v6 output schema
+# (output name, data frame column, number of values)
+monthly_output_schema = [
+    # Monthly AC system output (kWhac)
+    # The array of values represents the value for each month, with the first element being for January and the last element being for December.
+    ("ac_monthly", "Monthly AC System Output (kWh)", 12),
+    # Monthly plane of array irradiance values (kWh/m^2)
+    ("poa_monthly", "Monthly Plane of Array Irradiance (W/m2)", 12),
+    # Monthly solar radiation values (kWh/m^2/day)
+    ("solrad_monthly", "Monthly Solar Radiation (kWh/m2/day)", 12),
+    # Monthly DC array output (kWhdc)
+    ("dc_monthly", "Monthly DC array Output (kWh)", 12)]
+
+# number of hours in the PV watts typical year
+hours_per_year = 8760
+
+hourly_output_schema = [
+    # Hourly AC system output (only when timeframe = hourly) (Wac)
+    ("ac", "Hourly AC System Output (W)", hours_per_year),
+    # Hourly plane of array irradiance (only when timeframe=hourly). (W/m2)
+    ("poa", "Hourly Plane of Array Irradiance (W/m2)", hours_per_year),
+    # Hourly beam normal irradiance (only when timeframe=hourly). (W/m2)
+    ("dn", "Hourly Beam irradiance (W/m^2)", hours_per_year),
+    # Hourly diffuse irradiance (only when timeframe=hourly). (W/m2)
+    ("df", "Hourly Diffuse Irradiance (W/m2)", hours_per_year),
+    # Hourly ambient temperature (only when timeframe=hourly). (C)
+    ("tamb", "Hourly Ambient Temperature (C)", hours_per_year),
+    # Hourly DC array output (only when timeframe=hourly). (Wdc)
+    ("dc", "Hourly DC Array output (Wdc)", hours_per_year),
+    # Hourly module temperature (only when timeframe=hourly) (C)
+    ("tcell", "Hourly Cell Temperature (C)", hours_per_year),
+    # Hourly windspeed (only when timeframe=hourly). (m/s)
+    ("wspd", "Hourly Wind Speed (m/s)", hours_per_year)]
+
+def extract_outputs_by_schema(input_data, schema, dtype = np.float64):
+    """
+    Obtain all the fields of the schema from the "outputs" of the PV watts response in one pass.
+
+    Input Arguments:
+        input_data : dict
+            the json data obtained by solar_PV_watts_API()
+
+        schema : list
+            monthly_output_schema or hourly_output_schema
+
+        dtype : numpy data type, default is np.float64
+
+    Output :
+        record : dict
+            data frame column -> np.array() with the number of values given by the schema
+
+    A ValueError is raised with all the missing fields and the fields with a wrong length,
+    instead of returning None columns.
+    """
+    outputs = input_data.get("outputs") if isinstance(input_data, dict) else None
+    if not isinstance(outputs, dict):
+        raise ValueError("the PV watts response has no outputs, errors : "
+                        + str(input_data.get("errors") if isinstance(input_data, dict) else input_data))
+    record = {}
+    problems = []
+    for name, column, length in schema:
+        values = outputs.get(name)
+        if values is None:
+            problems.append(name + " is missing")
+            continue
+        if len(values) != length:
+            problems.append(name + " has " + str(len(values)) + " values, expected " + str(length))
+            continue
+        record[column] = np.array(values, dtype = dtype)
+    if problems:
+        raise ValueError("PV watts outputs do not match the schema : " + "; ".join(problems))
+    return record
+
 # obtain the values from the Json file
-def solar_data_from_json(input_data, output_dir, time_switch = True):
+def solar_data_from_json(input_data, output_dir, time_switch = True, sink = None, address = None):
     """
     The function is developed to obtain the information from the .json file.
 
@@ -242,136 +411,28 @@ def solar_data_from_json(input_data, output_dir, time_switch = True):
         time_switch : Boolean, default is True
             When the default is True, it will return the monthly data
             If the time_switch is False, it will return the hourly data
-    """
-    input_data = input_data
 
+        sink : solar_result_sink, default is None
+            When the default is None, the data frame is saved as output_dir/Montly_solar_PV_watts.csv
+            Otherwise the data frame is given to sink.write(address, df_solar), see solar_result_sink.py
+
+        address : string (character), default is None
+            the address of the house, only used by the sink
+
+    The fields are described by monthly_output_schema and hourly_output_schema,
+    a ValueError is raised when one of them is missing or does not have 12 / 8760 values.
+    """
     if time_switch :
-        # the outputs for all the data from API
-        outputs = extract_element_from_json(input_data, ["outputs"]) 
-        # obtain the ac_monthly information from .json file
-        """
-        Monthly AC system output (kWhac)
-        The array of values represents the value for each month, with the first element being for January and the last element being for December.
-        "Monthly AC System Output (kWh)"
-        """
-        ac_monthly = extract_element_from_json(outputs, ["ac_monthly"])[0][0] 
-        # turn the list value into np.array()
-        ac_monthly = np.array(ac_monthly)
-        # obtain the poa_monthly information from .json file
-        """
-        Monthly plane of array irradiance values (kWh/m^2)
-        The array of values represents the value for each month, with the first element being for January and the element being for December.
-        Monthly Plane of Array Irradiance (W/m2)
-        """
-        poa_monthly = extract_element_from_json(outputs, ["poa_monthly"])[0][0] 
-        # turn the list value into np.array()
-        poa_monthly = np.array(poa_monthly)
-        # obtain the solrad_monthly information from .json file
-        """
-        Monthly solar radiation values (kWh/m^2/day)
-        The array of values represents the value for each month, with the first element being for January and the last element being for December.
-        Monthly Solar Radiation (kWh/m2/day)
-        """
-        solrad_monthly = extract_element_from_json(outputs, ["solrad_monthly"])[0][0] 
-        # turn the list value into np.array()
-        solrad_monthly = np.array(solrad_monthly)
-        # obtain the dc_monthly information from json file
-        """
-        Monthly DC array output (kWhdc)
-        The array of values represents the value for each month, with the first element being for January and the last element being for December.
-        Monthly DC array Output (kWh)
-        """
-        dc_monthly = extract_element_from_json(outputs, ["dc_monthly"])[0][0] 
-        # turn the list value into np.array()
-        dc_monthly = np.array(dc_monthly)
-
-        # save array into data frame
-        df_solar = pd.DataFrame({"Monthly AC System Output (kWh)": ac_monthly,
-                                "Monthly Plane of Array Irradiance (W/m2)": poa_monthly,
-                                "Monthly Solar Radiation (kWh/m2/day)": solrad_monthly,
-                                "Monthly DC array Output (kWh)": dc_monthly})
-        if not os.path.exists(output_dir):
-            os.mkdir(output_dir)
-        # save the df_solar file into local working directory
-        df_solar.to_csv(os.path.join(output_dir, "Montly_solar_PV_watts.csv"))
+        # Monthly AC system output, plane of array irradiance, solar radiation and DC array output
+        record = extract_outputs_by_schema(input_data, monthly_output_schema)
+    else:
+        # Hourly AC system output, irradiance, temperature, DC array output and wind speed
+        record = extract_outputs_by_schema(input_data, hourly_output_schema)
+    # save array into data frame
+    df_solar = pd.DataFrame(record)
+    if sink is not None:
+        sink.write(address, df_solar)
     else:
-        # the outputs for all the data from API
-        outputs = extract_element_from_json(input_data, ["outputs"]) 
-
-        # obtain the hourly AC system output (Wac)
-        """
-        Hourly AC system output (only when timeframe = hourly) (Wac)
-        Hourly AC System Output (W)
-        """
-        ac = extract_element_from_json(outputs, ["ac"])[0][0]
-        # turn the list value into np.array()
-        ac = np.array(ac)
-        # obtain the hourly plane of array irradiance
-        """
-        Hourly plane of array irradiance (only when timeframe=hourly). (W/m2)
-        Hourly Plane of Array Irradiance (W/m2)
-        """
-        poa = extract_element_from_json(outputs, ["poa"])[0][0]
-        # turn the value into np.array()
-        poa = np.array(poa)
-        # obtain the hourly beam normal irradiance
-        """
-        Hourly beam normal irradiance (only when timeframe=hourly). (W/m2)
-        Hourly Beam irradiance (W/m^2)
-        """
-        dn = extract_element_from_json(outputs, ["dn"])[0][0]
-        # turn the list value into np.array()
-        dn = np.array(dn)
-        # obtain the hourly DC array output
-        """
-        Hourly DC array output (only when timeframe=hourly). (Wdc)
-        Hourly DC Array output (Wdc)
-        """
-        dc = extract_element_from_json(outputs, ["dc"])[0][0]
-        # turn the list value into np.array()
-        dc = np.array(dc)
-        # obtain the hourly diffuse irradiance 
-        """
-        Hourly diffuse irradiance (only when timeframe=hourly). (W/m2)
-        Hourly Diffuse Irradiance (W/m2)
-        """
-        df = extract_element_from_json(outputs, ["df"])[0][0]
-        # turn the list value into np.array()
-        df = np.array(df)
-        # obtain the hourly ambient temeprature
-        """
-        Hourly ambient temperature (only when timeframe=hourly). (C)
-        Hourly Ambient Temperature (C)
-        """
-        tamb = extract_element_from_json(outputs, ["tamb"])[0][0]
-        # turn the list into np.array()
-        tamb = np.array(tamb)
-        # obtain hourly module temperature
-        """
-        Hourly module temperature (only when timeframe=hourly) (C)
-        Hourly Cell Temperature (C)
-        """
-        tcell = extract_element_from_json(outputs, ["tcell"])[0][0]
-        # turn the list value into np.array()
-        tcell = np.array(tcell)
-        # obtain the wind speed data
-        """
-        Hourly windspeed (only when timeframe=hourly). (m/s)
-        Hourly Wind Speed (m/s)
-        """
-        wspd = extract_element_from_json(outputs, ["wspd"])[0][0]
-        # turn the list into np.array() 
-        wspd = np.array(wspd)
-
-        # save array into data frame
-        df_solar = pd.DataFrame({"Hourly AC System Output (W)": ac,
-                                "Hourly Plane of Array Irradiance (W/m2)": poa,
-                                "Hourly Beam irradiance (W/m^2)": dn,
-                                "Hourly Diffuse Irradiance (W/m2)": df,
-                                "Hourly Ambient Temperature (C)": tamb,
-                                "Hourly DC Array output (Wdc)": dc,
-                                "Hourly Cell Temperature (C)": tcell,
-                                "Hourly Wind Speed (m/s)": wspd})
         if not os.path.exists(output_dir):
             os.mkdir(output_dir)
         # save the df_solar file into local working directory
@@ -379,4 +440,189 @@ def solar_data_from_json(input_data, output_dir, time_switch = True):
     """
     Use this function will return a data frame
     """
-    return df_solar
\ No newline at end of file
+    return df_solar
+
+# Streaming decoder for the hourly PV watts output
+"""
+For the hourly timeframe the response holds eight arrays of 8760 numbers.
+json.loads() turns every number into a python float inside a list, and
+solar_data_from_json() copies them again into numpy arrays and a data frame.
+The functions below read the response body chunk by chunk and write the numbers
+of every hourly output directly into a preallocated float32 array.
+The numbers are parsed by the C text reader of numpy (np.loadtxt()), and the body is scanned
+by offsets instead of slicing the remaining text after every array.
+"""
+# hourly output name -> column name of the data frame (the same as solar_data_from_json())
+hourly_output_columns = {name: column for name, column, _ in hourly_output_schema}
+
+# "ac":[ , the start of one hourly array ("ac_monthly" and "ac_annual" do not match)
+hourly_array_start = re.compile(rb'"(' + b"|".join(name.encode() for name in hourly_output_columns) + rb')"\s*:\s*\[')
+
+def decode_hourly_outputs(chunks, n_hours = hours_per_year):
+    """
+    Decode the hourly outputs from the PV watts response body.
+
+    Input Arguments:
+        chunks : iterable of bytes
+                The response body, for example response.iter_content(65536) or [text.encode()]
+
+        n_hours : numeric
+                Default is 8760. The length of every hourly array.
+
+    Output :
+        arrays : dict
+                hourly output name ("ac", "poa", "dn", "df", "dc", "tamb", "tcell", "wspd") -> float32 np.array()
+
+    A ValueError is raised when one of the arrays is missing or does not have n_hours values,
+    the message includes the beginning of the response, where PV watts reports the "errors".
+    """
+    arrays = {}
+    head = b""
+    buffer = b""
+    name = None # the array being decoded, None while searching the next array
+    out = None
+    filled = 0
+    for chunk in chunks:
+        if len(head) < 1000:
+            head += chunk[:1000 - len(head)]
+        buffer += chunk
+        position = 0 # the start of the text not decoded yet
+        while True:
+            if name is None:
+                match = hourly_array_start.search(buffer, position)
+                if match is None:
+                    # keep the tail, the next array name may be split between two chunks
+                    position = max(position, len(buffer) - 32)
+                    break
+                name = match.group(1).decode()
+                out = np.empty(n_hours, dtype = np.float32)
+                filled = 0
+                position = match.end()
+            end = buffer.find(b"]", position)
+            if end < 0:
+                # only decode the complete numbers, keep the last (maybe partial) one
+                cut = buffer.rfind(b",", position)
+                if cut >= 0:
+                    filled = fill_float32(out, filled, buffer[position:cut], name)
+                    position = cut + 1
+                break
+            filled = fill_float32(out, filled, buffer[position:end], name)
+            position = end + 1
+            if filled != n_hours:
+                raise ValueError("hourly output " + name + " has " + str(filled) + " values, expected " + str(n_hours))
+            arrays[name] = out
+            name = None
+        buffer = buffer[position:]
+    missing = [field for field in hourly_output_columns if field not in arrays]
+    if missing:
+        raise ValueError("hourly outputs " + ", ".join(missing) + " are missing from the PV watts response : "
+                        + head.decode("utf-8", "replace"))
+    return arrays
+
+def fill_float32(out, filled, text, name):
+    """
+    Write the comma separated numbers in text into out[filled:], and return the new filled length.
+    """
+    text = text.strip()
+    if not text:
+        return filled
+    if b"\n" in text:
+        # loadtxt reads one line, the array of a pretty printed response spans many
+        text = text.replace(b"\r", b" ").replace(b"\n", b" ")
+    values = np.loadtxt([text], delimiter = ",", dtype = np.float32, ndmin = 1, comments = None)
+    if filled + len(values) > len(out):
+        raise ValueError("hourly output " + name + " has more than " + str(len(out)) + " values")
+    out[filled:filled + len(values)] = values
+    return filled + len(values)
+
+def solar_PV_watts_hourly_arrays(api_key,
+    solar_api_url,
+    data_format,
+    address,
+    system_capacity,
+    module_type,
+    losses,
+    array_type,
+    tilt,
+    azimuth,
+    cache_dir = None,
+    cache_ttl = None,
+    cache_max_bytes = None,
+    replay_only = False,
+    lat = None,
+    lon = None,
+    chunk_size = 65536):
+    """
+    Obtain the hourly PV watts output as float32 arrays, without building the json object.
+    The input arguments are the same as solar_PV_watts_API() (the timeframe is always hourly and
+    data_format must be .json), chunk_size is the number of bytes read from the response at a time.
+
+    Output :
+        arrays : dict
+                see decode_hourly_outputs()
+    """
+    params = PV_watts_request_parameters(api_key = api_key,
+                                        address = address,
+                                        system_capacity = system_capacity,
+                                        module_type = module_type,
+                                        losses = losses,
+                                        array_type = array_type,
+                                        tilt = tilt,
+                                        azimuth = azimuth,
+                                        timeframe = "hourly",
+                                        lat = lat,
+                                        lon = lon)
+    key = None
+    if cache_dir is not None:
+        key = solar_API_cache.PV_watts_cache_key(solar_api_url, data_format, params)
+        data = solar_API_cache.read_cached_response(cache_dir, key, ttl = cache_ttl)
+        if data is not None:
+            return decode_hourly_outputs([data.encode("utf-8")])
+    if replay_only:
+        raise LookupError("replay_only is set but the PV watts response for location "
+                        + str(params.get("address", (params.get("lat"), params.get("lon"))))
+                        + " is not in the cache " + str(cache_dir))
+    url = solar_api_url + data_format
+    solar_metrics.count("PV_watts_API_calls")
+    with requests.get(url, params = params, stream = True) as response:
+        if key is None or response.status_code != 200:
+            return decode_hourly_outputs(response.iter_content(chunk_size))
+        # save the body into the cache while it is decoded
+        tmp_path = solar_API_cache.cache_tmp_path(cache_dir, key)
+        try:
+            with open(tmp_path, "wb") as f:
+                def tee(chunks):
+                    for chunk in chunks:
+                        f.write(chunk)
+                        yield chunk
+                arrays = decode_hourly_outputs(tee(response.iter_content(chunk_size)))
+        except BaseException:
+            solar_API_cache.remove_cache_file(tmp_path)
+            raise
+    # all the hourly outputs are there, so it is not an error response
+    solar_API_cache.commit_cache_file(cache_dir, key, tmp_path, max_bytes = cache_max_bytes)
+    return arrays
+
+def solar_data_from_arrays(arrays, output_dir = None, sink = None, address = None):
+    """
+    Build the same hourly data frame as solar_data_from_json(time_switch = False) from the float32 arrays
+    obtained by solar_PV_watts_hourly_arrays().
+
+    Input Arguments:
+        arrays : dict
+                the hourly output arrays
+
+        output_dir : string (character)
+                Default is None. When it is given, the data frame is also saved as Montly_solar_PV_watts.csv,
+                the same as solar_data_from_json()
+
+        sink, address : see solar_data_from_json()
+    """
+    df_solar = pd.DataFrame({column: arrays[name] for name, column in hourly_output_columns.items()}, copy = False)
+    if sink is not None:
+        sink.write(address, df_solar)
+    elif output_dir is not None:
+        if not os.path.exists(output_dir):
+            os.mkdir(output_dir)
+        df_solar.to_csv(os.path.join(output_dir, "Montly_solar_PV_watts.csv"))
+    return df_solar
@@ -0,0 +1,245 @@
+## This is the batch version of the PV watts API access
+# Author : Qiancheng Sun
+"""
+The solar_PV_watts_API() function obtains the data for one address at a time,
+and every call opens a new connection. For a whole county the run time is
+limited by the latency of every single request.
+
+The functions in here fetch a list of addresses (or parameter sets) concurrently
+with a thread pool. All the threads share one requests.Session, so the
+connections are kept alive and reused, and one token bucket, so the total
+request rate never goes over the NREL quota.
+When the API answers 429 (too many requests) or 5xx, the request is retried with
+exponential backoff, and the whole batch is paused for the Retry-After time.
+
+The API web link is an input argument, so the batch can be tested against a local
+stub HTTP server, for example http.server on http://127.0.0.1:8000/api/pvwatts/v6
+"""
+#%%
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import solar_API
+import solar_API_cache
+import solar_metrics
+
+# NREL developer API default quota
+# https://developer.nrel.gov/docs/rate-limits/
+NREL_requests_per_hour = 1000
+
+# the http status code that will be retried
+retry_status_codes = (429, 500, 502, 503, 504)
+
+
+class token_bucket:
+    """
+    Token bucket rate limiter shared by all the worker threads.
+
+    Input Arguments:
+        rate : numeric (unit : requests / second)
+                the average request rate
+
+        capacity : numeric
+                the burst size, the maximum number of requests that can be sent at once
+    """
+    def __init__(self, rate, capacity = 1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        # no request before this time, used when the API asked us to slow down
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until one request is allowed.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Stop all the requests for the next seconds, and drop the saved burst.
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+def PV_watts_session(pool_size):
+    """
+    Create a requests.Session that keeps pool_size connections alive.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections = pool_size, pool_maxsize = pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_with_backoff(session, url, params, bucket, max_retries = 5, backoff_base = 1.0, timeout = 60):
+    """
+    Send one GET request through the token bucket and retry on 429 / 5xx / connection errors.
+
+    Input Arguments:
+        session : requests.Session
+        url : string (character)
+        params : dict
+        bucket : token_bucket
+        max_retries : numeric, number of retries after the first request
+        backoff_base : numeric (unit : seconds), the first backoff delay, doubled on every retry
+        timeout : numeric (unit : seconds), the request timeout
+
+    Output :
+        response : requests.Response
+                the last response (it may still be a 429 / 5xx after max_retries)
+    """
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        solar_metrics.count("PV_watts_API_calls")
+        if attempt > 0:
+            solar_metrics.count("PV_watts_API_retries")
+        try:
+            response = session.get(url, params = params, timeout = timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff_base * 2 ** attempt * (1 + random.random()))
+            continue
+        if response.status_code not in retry_status_codes or attempt == max_retries:
+            return response
+        delay = backoff_base * 2 ** attempt * (1 + random.random())
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        if response.status_code == 429:
+            # the quota is shared, so every thread has to wait
+            bucket.pause(delay)
+        else:
+            time.sleep(delay)
+    return response
+
+
+def solar_PV_watts_API_batch(api_key,
+    solar_api_url,
+    data_format,
+    parameter_list,
+    default_parameters = None,
+    max_workers = 8,
+    requests_per_hour = NREL_requests_per_hour,
+    burst = 1,
+    max_retries = 5,
+    backoff_base = 1.0,
+    cache_dir = None,
+    cache_ttl = None,
+    cache_max_bytes = None,
+    replay_only = False,
+    keep_results = True):
+    """
+    Obtain the PV watts data for a list of addresses concurrently.
+
+    Input Arguments:
+        api_key, solar_api_url, data_format : see solar_API.solar_PV_watts_API()
+
+        parameter_list : list
+                Every item is either an address (string), or a dict with the keys of
+                solar_API.PV_watts_request_parameters() (address or lat / lon, system_capacity, module_type,
+                losses, array_type, tilt, azimuth, timeframe). Missing keys are taken from default_parameters.
+
+        default_parameters : dict
+                Default is None.
+                The PV parameters shared by every item, for example {"system_capacity": "1", "tilt": "20", ...}
+
+        max_workers : numeric
+                Default is 8. Number of threads, and also the size of the connection pool.
+
+        requests_per_hour : numeric
+                Default is 1000 (NREL quota). The request rate of the token bucket.
+
+        burst : numeric
+                Default is 1. The number of requests that can be sent at once.
+
+        max_retries, backoff_base : see get_with_backoff()
+
+        cache_dir, cache_ttl, cache_max_bytes, replay_only : see solar_API.solar_PV_watts_API()
+
+        keep_results : Boolean
+                Default is True.
+                When the value is False the responses are only saved into cache_dir and not returned,
+                which is used to warm up the cache for a whole county without holding all the data in memory.
+
+    Output :
+        results : list
+                The json data of every item, in the same order as parameter_list.
+                When one item failed, its result is {"errors": [message]}, the same as a PV watts error response.
+                When keep_results is False, the list only holds the "errors" of every item.
+    """
+    if default_parameters is None:
+        default_parameters = {}
+    url = solar_api_url + data_format
+    bucket = token_bucket(rate = requests_per_hour / 3600.0, capacity = burst)
+    session = PV_watts_session(max_workers)
+
+    def fetch(item):
+        if isinstance(item, dict):
+            arguments = dict(default_parameters, **item)
+        else:
+            arguments = dict(default_parameters, address = item)
+        # a lat / lon item does not have an address
+        arguments.setdefault("address", None)
+        params = solar_API.PV_watts_request_parameters(api_key = api_key, **arguments)
+        key = None
+        data = None
+        try:
+            if cache_dir is not None:
+                key = solar_API_cache.PV_watts_cache_key(solar_api_url, data_format, params)
+                data = solar_API_cache.read_cached_response(cache_dir, key, ttl = cache_ttl)
+            if data is None:
+                if replay_only:
+                    return {"errors": ["not in the cache " + str(cache_dir) + " : "
+                                    + str(params.get("address", (params.get("lat"), params.get("lon"))))]}
+                response = get_with_backoff(session, url, params, bucket,
+                                            max_retries = max_retries,
+                                            backoff_base = backoff_base)
+                data = response.text
+                if response.status_code != 200:
+                    return {"errors": ["http status " + str(response.status_code) + " : " + data[:200]]}
+                if key is not None and not solar_API.PV_watts_response_errors(data):
+                    solar_API_cache.write_cached_response(cache_dir, key, data, max_bytes = cache_max_bytes)
+            solar_data = json.loads(data)
+        except (requests.RequestException, ValueError) as error:
+            return {"errors": [repr(error)]}
+        if not isinstance(solar_data, dict):
+            return {"errors": ["the response is not a json object : " + str(data)[:200]]}
+        if keep_results:
+            return solar_data
+        return {"errors": solar_data.get("errors", [])}
+
+    try:
+        with ThreadPoolExecutor(max_workers = max_workers) as executor:
+            # executor.map keeps the input order
+            results = list(executor.map(fetch, parameter_list))
+    finally:
+        session.close()
+    return results
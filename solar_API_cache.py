@@ -0,0 +1,239 @@
+## This is the on-disk cache for the PV watts API responses
+# Author : Qiancheng Sun
+"""
+Every residential house in the county file calls the PV watts API with the same
+PV parameters, and the hourly payload for a given request never changes.
+The functions in here save the raw response text on disk, keyed by a hash of
+the request parameters, so that re-running the pipeline does not need to
+download the same 8760-hour dataset again.
+
+Layout of the cache directory:
+    cache_dir/ab/abcdef....json
+
+The modification time of a file is the time it was downloaded (used for the TTL),
+and the access time is the last time it was used (used for the LRU eviction).
+
+The size of the cache is kept as a running total for every cache directory, so a write only
+walks the directory when the total crosses max_bytes (and once at the first write of the process).
+The eviction then goes down to eviction_ratio x max_bytes, so the next walk is many writes later.
+The total only counts the writes of this process, the walk corrects it for the other processes
+(shards) sharing the directory.
+"""
+#%%
+import hashlib
+import json
+import os
+import threading
+import time
+
+import solar_metrics
+
+# the request parameters that are never part of the cache key
+excluded_cache_parameters = ("api_key",)
+
+# the eviction removes entries until the cache is not larger than eviction_ratio x max_bytes
+eviction_ratio = 0.9
+
+# cache directory -> running total of the size of the entries (bytes)
+cache_sizes = {}
+cache_sizes_lock = threading.Lock()
+
+
+def PV_watts_cache_key(solar_api_url, data_format, params):
+    """
+    Build the cache key for one PV watts API request.
+
+    Input Arguments:
+        solar_api_url : string (character)
+                The PV watts API web link, for example https://developer.nrel.gov/api/pvwatts/v6
+
+        data_format : string (character)
+                The data format of the request, .json or .xml
+
+        params : dict
+                The query parameters of the request.
+                The API key is left out, so changing the key does not invalidate the cache.
+
+    Output :
+        key : string (character)
+                sha256 hex digest of the canonical request parameters
+    """
+    canonical = {str(name): str(value).strip()
+                    for name, value in params.items()
+                        if name not in excluded_cache_parameters and value is not None}
+    canonical["solar_api_url"] = str(solar_api_url).rstrip("/")
+    canonical["data_format"] = str(data_format)
+    # sort_keys makes the same parameters always produce the same text
+    text = json.dumps(canonical, sort_keys = True, separators = (",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def cache_file_path(cache_dir, key):
+    """
+    Return the file path of a cache entry. The first two characters of the key
+    are used as a sub directory, so one directory never holds millions of files.
+    """
+    return os.path.join(cache_dir, key[:2], key + ".json")
+
+
+def read_cached_response(cache_dir, key, ttl = None):
+    """
+    Read the response text of a cache entry.
+
+    Input Arguments:
+        cache_dir : string (character)
+                The working directory of the cache.
+
+        key : string (character)
+                The cache key obtained by PV_watts_cache_key()
+
+        ttl : numeric (unit : seconds)
+                Default is None, which means the entry never expires.
+                An entry older than ttl is treated as missing and removed.
+
+    Output :
+        The cached response text, or None when there is no valid entry.
+    """
+    path = cache_file_path(cache_dir, key)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        solar_metrics.count("PV_watts_cache_misses")
+        return None
+    now = time.time()
+    if ttl is not None and now - stat.st_mtime > ttl:
+        # expired entry
+        remove_cache_file(path)
+        solar_metrics.count("PV_watts_cache_misses")
+        return None
+    try:
+        with open(path, "r", encoding = "utf-8") as f:
+            text = f.read()
+    except FileNotFoundError:
+        # removed by another process in the meantime
+        solar_metrics.count("PV_watts_cache_misses")
+        return None
+    # mark the entry as recently used, keep the download time as mtime
+    os.utime(path, (now, stat.st_mtime))
+    solar_metrics.count("PV_watts_cache_hits")
+    return text
+
+
+def write_cached_response(cache_dir, key, text, max_bytes = None):
+    """
+    Save the response text as a cache entry.
+
+    Input Arguments:
+        cache_dir : string (character)
+                The working directory of the cache.
+
+        key : string (character)
+                The cache key obtained by PV_watts_cache_key()
+
+        text : string (character)
+                The response text from the PV watts API
+
+        max_bytes : numeric
+                Default is None, which means the cache size is not bounded.
+                When the cache is larger than max_bytes, the least recently used entries are removed.
+    """
+    tmp_path = cache_tmp_path(cache_dir, key)
+    # write into a temporary file first, so a crash never leaves a half written entry
+    with open(tmp_path, "w", encoding = "utf-8") as f:
+        f.write(text)
+    commit_cache_file(cache_dir, key, tmp_path, max_bytes = max_bytes)
+
+
+def cache_tmp_path(cache_dir, key):
+    """
+    Return the temporary file path used while a cache entry is written,
+    the sub directory is created when it does not exist.
+    """
+    path = cache_file_path(cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    return path + ".%d.%d.tmp" % (os.getpid(), threading.get_ident())
+
+
+def commit_cache_file(cache_dir, key, tmp_path, max_bytes = None):
+    """
+    Move the completely written temporary file into the cache entry,
+    and remove the least recently used entries when the cache is larger than max_bytes.
+    """
+    path = cache_file_path(cache_dir, key)
+    try:
+        # an entry written again replaces the old size
+        old_size = os.path.getsize(path)
+    except FileNotFoundError:
+        old_size = 0
+    os.replace(tmp_path, path)
+    if max_bytes is None:
+        return
+    new_size = os.path.getsize(path)
+    directory = os.path.abspath(cache_dir)
+    with cache_sizes_lock:
+        if directory not in cache_sizes:
+            cache_sizes[directory] = cache_size(cache_dir)
+        else:
+            cache_sizes[directory] += new_size - old_size
+        over = cache_sizes[directory] > max_bytes
+    if over:
+        evict_cache(cache_dir, max_bytes)
+
+
+def cache_entries(cache_dir):
+    """
+    Every entry of the cache as (access time, size, path).
+    """
+    entries = []
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+    return entries
+
+
+def cache_size(cache_dir):
+    """
+    Total size of the entries of the cache (bytes), walks the whole directory.
+    """
+    return sum(size for _, size, _ in cache_entries(cache_dir))
+
+
+def evict_cache(cache_dir, max_bytes):
+    """
+    When the total size of the cache is larger than max_bytes, remove the least recently used entries
+    until it is not larger than eviction_ratio x max_bytes. The running total of the directory is set
+    to the size after the eviction.
+
+    Output :
+        n_removed : numeric
+                number of the removed entries
+    """
+    entries = cache_entries(cache_dir)
+    total_bytes = sum(size for _, size, _ in entries)
+    n_removed = 0
+    if total_bytes > max_bytes:
+        target_bytes = max_bytes * eviction_ratio
+        # oldest access time first
+        for _, size, path in sorted(entries):
+            if total_bytes <= target_bytes:
+                break
+            remove_cache_file(path)
+            total_bytes -= size
+            n_removed += 1
+    with cache_sizes_lock:
+        cache_sizes[os.path.abspath(cache_dir)] = total_bytes
+    return n_removed
+
+
+def remove_cache_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
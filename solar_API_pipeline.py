@@ -12,6 +12,14 @@ from geneticalgorithm import geneticalgorithm as ga
 solar_API_path = os.path.join(__file__)
 sys.path.append(solar_API_path)
 import solar_API
+import solar_optimization
+import solar_house_optimization
+import solar_load_profile
+import solar_batch_job
+import solar_input_stream
+import solar_objective_cache
+import solar_pv_performance
+import solar_battery
 
 def obtain_PV_AC_output(data):
     """
@@ -33,15 +41,22 @@ def obtain_PV_AC_output(data):
 
     return (solar_PV_kW_per_kW_capacity)
  
-def obtain_typical_consumption(file, NREL_file):
+def obtain_typical_consumption(load_library, consumption_type, scale_factor):
     """
     Description:
     This function is used for obtain the typical electric consumption for different residential house.
     For each residential house, based on the energy consumption type will have the "high", "base", and "low" with different scale factor.
     Therefore, this will dynamically obtain the typical consumption for different house with the input data
+
+    Arguments:
+
+        Input:
+            load_library: the NREL load profiles, solar_load_profile.load_profile_library
+            consumption_type: consumption type of the house ("High", "Base", "Low")
+            scale_factor: scale factor of the house
     """
     
-    typical_electric_consumption = NREL_file["Electricity:Facility [kW](Hourly)"] / file["scale_factor"][i]
+    typical_electric_consumption = load_library.house_load(consumption_type, scale_factor)
 
 
     return (typical_electric_consumption)
@@ -49,7 +64,7 @@ def obtain_typical_consumption(file, NREL_file):
 
 # Final version of simple payback for residential house calculation
 
-def calculate_simple_payback(solar_capacity_kW):
+def calculate_simple_payback(solar_capacity_kW, solar_PV_kW_per_kW_capacity = None, load_energy_consumption = None):
     """
     Description
     ------------
@@ -76,71 +91,21 @@ def calculate_simple_payback(solar_capacity_kW):
 
     # solar_capacity_kW is the input for number of solar capacity that need for the residential house
 
-    solar_PV_kW_per_kW_capacity = obtain_PV_AC_output(solar_data) # create a function about obtaining solar data value
+    # the AC output per kW and the consumption of the current house, computed once per house (see the example below)
+    if solar_PV_kW_per_kW_capacity is None:
+        solar_PV_kW_per_kW_capacity = house_PV_kW_per_kW_capacity
+    if load_energy_consumption is None:
+        load_energy_consumption = typical_electric_consumption
 
-    load_energy_consumption = obtain_typical_consumption(file, NREL_file) # create a function about obtaining the electric consumption 
-    
-    cost_capital_solar_PV_per_kW = 1.77 * 1000
-
-    tax_incentive_solar_PV = 0.26
-
-    cost_solar_pv_system_OM_per_kW_per_year = 12
-
-    # calculate hourly generation, kW
-    solar_PV_hourly_kW = solar_PV_kW_per_kW_capacity * solar_capacity_kW
-    solar_PV_hourly_kW = np.array(solar_PV_hourly_kW).reshape(8760,1)
-    # energy consumption (load)
-    load_hourly_kW = load_energy_consumption 
-    load_hourly_kW = np.array(load_hourly_kW).reshape(8760,1)
-    # create NA values
-    solar_excess_hr_kW_list = []
-    solar_behind_meter_hr_kW_list = []
-
-    for i in range(0, len(load_hourly_kW)):
-        if(solar_PV_hourly_kW[i] >= load_hourly_kW[i]):
-            solar_excess_hr_kW = solar_PV_hourly_kW[i] - load_hourly_kW[i]
-            solar_behind_meter_hr_kW = load_hourly_kW[i]
-        else:
-            solar_excess_hr_kW = 0
-            solar_behind_meter_hr_kW = solar_PV_hourly_kW[i]
-        # append into list
-        solar_excess_hr_kW_list.append(solar_excess_hr_kW)
-        solar_behind_meter_hr_kW_list.append(solar_behind_meter_hr_kW)
-
-
-    # Annual solar excess
-    annual_solar_excess_kW = sum(solar_excess_hr_kW_list)
-  
-    # cost saved behind meter solar 
-    behind_meter_price = 0.2
-    cost_saved_behind_meter_solar_hr = np.array(solar_behind_meter_hr_kW_list, dtype = object) * behind_meter_price
-  
-    # annual cost saved behind meter solar 
-    annual_cost_saved_behind_meter_solar = sum(cost_saved_behind_meter_solar_hr)
-  
-    # Income excess solar 
-    generation_rate = 0.1
-    income_excess_solar_hr = np.array(solar_excess_hr_kW_list, dtype=object) * generation_rate
-
-    # annual income excess solar 
-    annual_income_excess_solar = sum(income_excess_solar_hr)
-
-    # annual total income
-    annual_total_income = annual_income_excess_solar + annual_cost_saved_behind_meter_solar
-    
-    # solar install cost
-    solar_install_cost = solar_capacity_kW * cost_capital_solar_PV_per_kW * (1 - tax_incentive_solar_PV)
-    
-    # solar maintenance cost annual 
-    solar_maintenance_cost_annual = cost_solar_pv_system_OM_per_kW_per_year * solar_capacity_kW
-    
-    # simple payback 
-    simple_payback = solar_install_cost / (annual_total_income - solar_maintenance_cost_annual)
+    # the hourly behind meter / excess split runs on whole arrays, see solar_optimization.py
+    simple_payback = solar_optimization.simple_payback(solar_PV_kW_per_kW_capacity,
+                                                    load_energy_consumption,
+                                                    solar_capacity_kW)
     
     return(simple_payback)
 
 
-def calculate_cost_per_kWh(solar_capacity_kW):
+def calculate_cost_per_kWh(solar_capacity_kW, solar_PV_kW_per_kW_capacity = None, load_energy_consumption = None):
     """
     Description
     ------------
@@ -154,6 +119,9 @@ def calculate_cost_per_kWh(solar_capacity_kW):
 
     solar_capacity_kW: the solar capacity for the solar system
 
+    solar_PV_kW_per_kW_capacity, load_energy_consumption: the hourly AC output per kW and the consumption,
+    default is None (house_PV_kW_per_kW_capacity and typical_electric_consumption of the current house)
+
 
 
 
@@ -167,110 +135,72 @@ def calculate_cost_per_kWh(solar_capacity_kW):
 
     # solar_capacity_kW is the input for number of solar capacity that need for the residential house
 
-    solar_PV_kW_per_kW_capacity = obtain_PV_AC_output(solar_data) # create a function about obtaining solar data value
+    if solar_PV_kW_per_kW_capacity is None:
+        solar_PV_kW_per_kW_capacity = house_PV_kW_per_kW_capacity
+    if load_energy_consumption is None:
+        load_energy_consumption = typical_electric_consumption
 
-    load_energy_consumption = obtain_typical_consumption(file, NREL_file) # create a function about obtaining the electric consumption 
-
-    
-    cost_capital_solar_PV_per_kW = 1.77 * 1000
-
-    tax_incentive_solar_PV = 0.26
-
-    cost_solar_pv_system_OM_per_kW_per_year = 12
-
-    # calculate hourly generation, kW
-    solar_PV_hourly_kW = solar_PV_kW_per_kW_capacity * solar_capacity_kW
-    solar_PV_hourly_kW = np.array(solar_PV_hourly_kW).reshape(8760,1)
-    # energy consumption (load)
-    load_hourly_kW = load_energy_consumption 
-    load_hourly_kW = np.array(load_hourly_kW).reshape(8760,1)
-    # create NA values
-    solar_excess_hr_kW_list = []
-    solar_behind_meter_hr_kW_list = []
-
-    for i in range(0, len(load_hourly_kW)):
-        if(solar_PV_hourly_kW[i] >= load_hourly_kW[i]):
-            solar_excess_hr_kW = solar_PV_hourly_kW[i] - load_hourly_kW[i]
-            solar_behind_meter_hr_kW = load_hourly_kW[i]
-        else:
-            solar_excess_hr_kW = 0
-            solar_behind_meter_hr_kW = solar_PV_hourly_kW[i]
-        # append into list
-        solar_excess_hr_kW_list.append(solar_excess_hr_kW)
-        solar_behind_meter_hr_kW_list.append(solar_behind_meter_hr_kW)
-
-
-    # Annual solar excess
-    annual_solar_excess_kW = sum(solar_excess_hr_kW_list)
-  
-    # cost saved behind meter solar 
-    behind_meter_price = 0.2
-    cost_saved_behind_meter_solar_hr = np.array(solar_behind_meter_hr_kW_list, dtype = object) * behind_meter_price
-  
-    # annual cost saved behind meter solar 
-    annual_cost_saved_behind_meter_solar = sum(cost_saved_behind_meter_solar_hr)
-  
-    # Income excess solar 
-    generation_rate = 0.1
-    income_excess_solar_hr = np.array(solar_excess_hr_kW_list, dtype=object) * generation_rate
-
-    # annual income excess solar 
-    annual_income_excess_solar = sum(income_excess_solar_hr)
-
-    # annual total income
-    annual_total_income = annual_income_excess_solar + annual_cost_saved_behind_meter_solar
-    
-    # solar install cost
-    solar_install_cost = solar_capacity_kW * cost_capital_solar_PV_per_kW * (1 - tax_incentive_solar_PV)
-    
-    # solar maintenance cost annual 
-    solar_maintenance_cost_annual = cost_solar_pv_system_OM_per_kW_per_year * solar_capacity_kW
+    # the hourly behind meter / excess split runs on whole arrays, see solar_optimization.py
+    cost_per_kWh = solar_optimization.cost_per_kWh(solar_PV_kW_per_kW_capacity,
+                                                load_energy_consumption,
+                                                solar_capacity_kW)
     
-    # simple payback 
-    simple_payback = solar_install_cost / (annual_total_income - solar_maintenance_cost_annual)
+    return(cost_per_kWh)
 
-    # calculate the cost per kWh
-    cost_per_hr = load_energy_consumption * behind_meter_price - income_excess_solar_hr - cost_saved_behind_meter_solar_hr.reshape(8760)
 
-    cost_per_hr[cost_per_hr < 0] = 0
+def calculate_solar_economics(solar_capacity_kW, solar_PV_kW_per_kW_capacity = None, load_energy_consumption = None):
+    """
+    The simple payback, cost per kWh, annual excess, behind meter savings and export income of the current house
+    for the solar capacity, from one hourly split instead of calculate_simple_payback() and calculate_cost_per_kWh()
+    one after the other, see solar_optimization.solar_economics().
+    The PV output and the consumption are the same as calculate_simple_payback().
+    """
+    if solar_PV_kW_per_kW_capacity is None:
+        solar_PV_kW_per_kW_capacity = house_PV_kW_per_kW_capacity
+    if load_energy_consumption is None:
+        load_energy_consumption = typical_electric_consumption
 
-    # cost per kWh 
-    cost_per_kWh = np.mean(cost_per_hr / load_hourly_kW.reshape(8760))
-    
-    return(cost_per_kWh)
+    return solar_optimization.solar_economics(solar_PV_kW_per_kW_capacity,
+                                            load_energy_consumption,
+                                            solar_capacity_kW)
 
 
 #%%
 """
 Solar optimization pipeline
 """
+# the input files and the output of the run are in the SOLAR_DATA_DIR directory,
+# default is the data directory next to this file
+data_dir = os.environ.get("SOLAR_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
 # read target file
-file_path = r"/Users/qianchengsun/Desktop/Empowersaves/Code_package/Test_solar_API/hamilton_county.csv"
-file = pd.read_csv(file_path)
-# In here, only need to obtain the address as the solar API input
-target_address = file["Address"]
-actual_annual_electric_consumption = file["typical_annual_electric_consumption"]
+file_path = os.path.join(data_dir, "hamilton_county.csv")
+# the target file is read in chunks of checkpoint_block_size houses by solar_batch_job.run_shard(),
+# only the Address, consumption_type, scale_factor and typical_annual_electric_consumption columns,
+# see solar_input_stream.py
 
 
 # NREL file path (Only for Cincinnati area ---- Hamilton County)
 
 # High NREL electric consumption
-NREL_path_1 = r"/Users/qianchengsun/Desktop/Empowersaves/Code_package/NREL_consumption/HIGH/USA_OH_Cincinnati.Muni.AP-Lunken.Field.724297_TMY3_HIGH.csv"
+NREL_path_1 = os.path.join(data_dir, "NREL_consumption", "HIGH", "USA_OH_Cincinnati.Muni.AP-Lunken.Field.724297_TMY3_HIGH.csv")
 
 # Base NREL electric consumption
-NREL_path_2 = r"/Users/qianchengsun/Desktop/Empowersaves/Code_package/NREL_consumption/BASE/USA_OH_Cincinnati.Muni.AP-Lunken.Field.724297_TMY3_BASE.csv"
+NREL_path_2 = os.path.join(data_dir, "NREL_consumption", "BASE", "USA_OH_Cincinnati.Muni.AP-Lunken.Field.724297_TMY3_BASE.csv")
 
 # Low NREL electric consumption
-NREL_path_3 = r"/Users/qianchengsun/Desktop/Empowersaves/Code_package/NREL_consumption/LOW/USA_OH_Cincinnati.Muni.AP-Lunken.Field.724297_TMY3_LOW.csv"
-
+NREL_path_3 = os.path.join(data_dir, "NREL_consumption", "LOW", "USA_OH_Cincinnati.Muni.AP-Lunken.Field.724297_TMY3_LOW.csv")
 
-NREL_file_high = pd.read_csv(NREL_path_1) # High consumption
-NREL_file_base = pd.read_csv(NREL_path_2) # Base consumption
-NREL_file_low = pd.read_csv(NREL_path_3) # Low consumption
+NREL_paths = {"High": NREL_path_1, # High consumption
+            "Base": NREL_path_2, # Base consumption
+            "Low": NREL_path_3} # Low consumption
+# every NREL file is read once, the consumption types which are not listed use the Low profile
+NREL_load_library = solar_load_profile.load_profile_library(NREL_paths, default_consumption_type = "Low")
 
 
 # solar API setup
-api_key = "OmLmJHgTudxD6hHchGkPc30zvBTFGNf2Q2Idt8AB"
+# the API key is read from the NREL_API_KEY environment variable, it is never written in this file
+api_key = os.environ.get("NREL_API_KEY")
 # url for obtain PV watts dataset
 pv_watts_url = "https://developer.nrel.gov/api/pvwatts/v6"
 # data format
@@ -293,125 +223,70 @@ azimuth = "180" # data type = decimal, range = (0,360)
 # time frame 
 timeframe = "hourly"
 # path for save the data
-output_path = r"/Users/qianchengsun/Desktop/Empowersaves/Code_package/Test_solar_API"
-
-optimized_solar_capacity_list = []
-optimized_payback_year_list = [] 
-optimized_cost_per_kWh_list = []
-
-# len(target_address)
-for i in range(0, len(target_address)):
-    print(file["consumption_type"][i])
-    if file["consumption_type"][i] == "High":
-            NREL_file = NREL_file_high
-            # NREL high need to remove duplicate rows
-            NREL_file = NREL_file.drop(range(0, 24))
-    elif file["consumption_type"][i] == "Base":
-            NREL_file = NREL_file_base
-
-    else:
-            NREL_file = NREL_file_low
-            # NREL high need to remove duplicate rows
-            NREL_file = NREL_file.drop(range(0, 24))
-    
-    typical_electric_consumption =  NREL_file["Electricity:Facility [kW](Hourly)"] / file["scale_factor"][i]
-
-    address = file["Address"][i]
-
-    print(address)
-
-    solar_data_json = solar_API.solar_PV_watts_API(api_key= api_key,
-                                    solar_api_url= pv_watts_url,
-                                    data_format= data_format, 
-                                    address = address,
-                                    system_capacity= system_capacity, 
-                                    module_type= module_type,
-                                    losses= losses,
-                                    array_type= array_type,
-                                    tilt= tilt,
-                                    azimuth= azimuth,
-                                    timeframe= timeframe,
-                                    output_dir = output_path)
-
-    # Obtain the hourly solar PV data
-    solar_data = solar_API.solar_data_from_json(input_data= solar_data_json,
-                                output_dir= output_path,
-                                time_switch= False) # data include the solar PV data
-
-    boundary = np.array([[np.max(typical_electric_consumption),10]])
-    if boundary[:, 0] >= boundary[:,1]:
-        boundary = np.array([[0, 10]])
-
-    # set up algorithm parameters
-    algorithm_parameters={'max_num_iteration':100,\
-                        "population_size":150,\
-                        'mutation_probability':0.01,\
-                        'elit_ratio':0,\
-                        'crossover_probability':0.8,\
-                        'parents_portion':0.3,\
-                        # the option is uniform, one_point, two_point
-                        'crossover_type': 'uniform',\
-                        'max_iteration_without_improv': 10}
-
-    # run GA optimization
-    payback_optimization_model = ga(function= calculate_simple_payback,
-                                dimension= 1,
-                                variable_type= "real",
-                                variable_boundaries= boundary,
-                                algorithm_parameters=algorithm_parameters,
-                                convergence_curve= True, # plot the convergence curve or not 
-                                progress_bar= True) # show the progress bar or not
-
-
-    # Best solution is the x input
-    # objective function is the y output
-
-    payback_optimization_model.run()
-    convergence = payback_optimization_model.report
-    solution = payback_optimization_model.output_dict
-
-    
-
-    # set up boundary for the fixed solar capacity
-    boundary_2 = np.array([[np.min(convergence), np.max(convergence) + 0.001 ]])
-
-    cost_optimization_model = ga(function = calculate_cost_per_kWh,
-                                            dimension = 1, 
-                                            variable_type = "real", 
-                                            variable_boundaries= boundary_2,
-                                            algorithm_parameters= algorithm_parameters,
-                                            convergence_curve= True,
-                                            progress_bar= True)
-
-    cost_optimization_model.run()
-    cost_convergence = cost_optimization_model.report
-    cost_solution = cost_optimization_model.output_dict
-
-    optimized_solar_capacity = cost_solution["variable"]
-    optimized_payback_year = solution["function"]
-    optimized_cost_per_kWh = cost_solution["function"]
-    
-    optimized_solar_capacity_list.append(optimized_solar_capacity)
-    optimized_payback_year_list.append(optimized_payback_year)
-    optimized_cost_per_kWh_list.append(optimized_cost_per_kWh)
+output_path = os.path.join(data_dir, "Test_solar_API")
+# on-disk cache of the PV watts responses, re-running the pipeline will not call the API again
+cache_dir = os.path.join(output_path, "PV_watts_cache")
+# 30 days time to live, and at most 2 GB of cached responses
+cache_ttl = 30 * 24 * 3600
+cache_max_bytes = 2 * 1024 ** 3
+# set replay_only = True to rerun the pipeline from the cache without network
+replay_only = False
+
+# optimizer of the two solar capacity stages
+# "ga" : batched genetic algorithm
+# "exact" : deterministic minimum on the sorted hourly breakpoints, see solar_capacity_curve.py,
+#           solved for every group of houses sharing one PV profile and one load profile at once
+# "pareto" : payback and cost per kWh of the breakpoints inside the stage 1 boundary, the non-dominated capacities
+#            of every house (thinned to 1 % steps) are saved in pareto_fronts, see solar_pareto.py
+# "battery" : the solar capacity and a home battery sized together on a grid of pairs, the battery capacity
+#             is saved in battery_capacity, see solar_battery.py
+optimizer_backend = "exact"
+
+# monthly screening before the hourly runs, see solar_screening.py:
+# the houses whose payback lower bound (from the monthly PV watts output and the monthly load) is above
+# screening_max_payback_year are not fetched hourly nor optimized, None to run every house
+screening_max_payback_year = None
+
+# local geocode table (Address, latitude, longitude) for sharing one PV watts profile inside a weather tile,
+# without geocode table every address obtains its own profile
+geocode_path = os.path.join(data_dir, "hamilton_county_geocode.csv")
+
+# the result of every house is appended to the journal, set resume = False to start the run again,
+# see solar_checkpoint.py
+resume = True
+checkpoint_block_size = 1000
+
+# the run is solar_batch_job.run_shard() with one shard, it writes into output_path/shard_0_of_1:
+# the result csv file, the journal, the hourly solar data (npz archives written on a background thread),
+# the houses x 8760 hours profile store, the capacity curves or the pareto fronts, and the metrics
+config = solar_batch_job.build_config({"file_path": file_path,
+                                    "NREL_paths": NREL_paths,
+                                    "default_consumption_type": "Low",
+                                    "output_dir": output_path,
+                                    "geocode_path": geocode_path,
+                                    "api_key": api_key,
+                                    "pv_watts_url": pv_watts_url,
+                                    "data_format": data_format,
+                                    "system_capacity": system_capacity,
+                                    "module_type": module_type,
+                                    "losses": losses,
+                                    "array_type": array_type,
+                                    "tilt": tilt,
+                                    "azimuth": azimuth,
+                                    "timeframe": timeframe,
+                                    "cache_dir": cache_dir,
+                                    "cache_ttl": cache_ttl,
+                                    "cache_max_bytes": cache_max_bytes,
+                                    "replay_only": replay_only,
+                                    "optimizer_backend": optimizer_backend,
+                                    "chunk_size": checkpoint_block_size,
+                                    "resume": resume,
+                                    "screening_max_payback_year": screening_max_payback_year})
+solar_batch_job.run_shard(config)
+# the houses with the solar capacity, optimized payback year and optimized cost per kWh
+output_file_path = solar_batch_job.merge_shards(config, 1, os.path.join(output_path, "solar_capacity_demo.csv"))
+print("the houses are saved in", output_file_path)
 #%%
-# save as csv file
-# add solar capacity to the dataset
-file["solar_capacity"] = ""
-file["solar_capacity"].iloc[:len(optimized_solar_capacity_list)] = optimized_solar_capacity_list
-
-
-
-# add optimized payback year to the dataset
-file["optimized_payback_year"] = ""
-file["optimized_payback_year"].iloc[:len(optimized_payback_year_list)] = optimized_payback_year_list
-
-# add optimized cost per kWh
-file["optimized_cost_per_kWh"] = ""
-file["optimized_cost_per_kWh"].iloc[:len(optimized_cost_per_kWh_list)] = optimized_cost_per_kWh_list
-
-output_path = r"/Users/qianchengsun/Desktop/Empowersaves/Code_package/Test_solar_API/solar_capacity_demo.csv"
-file.to_csv(output_path)
 
 """
 Impact of Net Energy Cost is developed in R
@@ -436,20 +311,12 @@ Here is the example to show the solar optimization for several houses from the d
 
 """
 
+# the first houses of the target file
+file = next(solar_input_stream.read_input_chunks(file_path, chunk_size = 100))
 i = 30
-if file["consumption_type"][i] == "High":
-        NREL_file = NREL_file_high
-        # NREL high need to remove duplicate rows
-        NREL_file = NREL_file.drop(range(0, 24))
-elif file["consumption_type"][i] == "Base":
-        NREL_file = NREL_file_base
-
-else:
-        NREL_file = NREL_file_low
-        # NREL high need to remove duplicate rows
-        NREL_file = NREL_file.drop(range(0, 24))
-
-typical_electric_consumption = NREL_file["Electricity:Facility [kW](Hourly)"] / file["scale_factor"][i]
+typical_electric_consumption = obtain_typical_consumption(NREL_load_library,
+                                                        file["consumption_type"][i],
+                                                        file["scale_factor"][i])
 
 address = file["Address"][i]
 
@@ -465,12 +332,16 @@ solar_data_json = solar_API.solar_PV_watts_API(api_key= api_key,
                                 tilt= tilt,
                                 azimuth= azimuth,
                                 timeframe= timeframe,
-                                output_dir = output_path)
+                                output_dir = output_path,
+                                cache_dir = cache_dir,
+                                replay_only = replay_only)
 
     # Obtain the hourly solar PV data
 solar_data = solar_API.solar_data_from_json(input_data= solar_data_json,
                             output_dir= output_path,
                             time_switch= False) # data include the solar PV data
+# the AC output per kW of the example house, computed once and used by every evaluation of both stages
+house_PV_kW_per_kW_capacity = obtain_PV_AC_output(solar_data).to_numpy(dtype = np.float64)
 
 
 boundary = np.array([[np.max(typical_electric_consumption),10]])
@@ -488,7 +359,11 @@ algorithm_parameters={'max_num_iteration':100,\
                     'max_iteration_without_improv': 10}
 
 # run GA optimization
-payback_optimization_model = ga(function= calculate_simple_payback,
+# the capacities on the same 10 W step of the boundary are scored once, see solar_objective_cache.py
+payback_optimization_model = ga(function= solar_objective_cache.memoized_objective(calculate_simple_payback,
+                                                                            resolution_kW = 0.01,
+                                                                            batched = False,
+                                                                            variable_boundaries = boundary),
                             dimension= 1,
                             variable_type= "real",
                             variable_boundaries= boundary,
@@ -510,28 +385,83 @@ optimized_solar_capacity = solution["variable"]
 optimized_payback_year = solution["function"]
 #%%
 # # set up boundary for the fixed solar capacity
-boundary_2 = np.array([[np.min(convergence), np.max(convergence) + 0.001 ]])
+# the capacities within cost_window_kW of the stage 1 capacity, the same as the house and county optimization,
+# with the default window of 0 the cost per kWh is evaluated at the stage 1 capacity
+cost_window_kW = solar_house_optimization.cost_window_kW
+boundary_2 = solar_house_optimization.cost_boundary(optimized_solar_capacity[0], boundary, cost_window_kW)
+
+if cost_window_kW == 0:
+    cost_convergence = None
+    cost_solution = {"variable": optimized_solar_capacity,
+                    "function": calculate_cost_per_kWh(optimized_solar_capacity[0])}
+else:
+    cost_optimization_model = ga(function = solar_objective_cache.memoized_objective(calculate_cost_per_kWh,
+                                                                                resolution_kW = 0.01,
+                                                                                batched = False,
+                                                                                variable_boundaries = boundary_2),
+                                                dimension = 1, 
+                                                variable_type = "real", 
+                                                variable_boundaries= boundary_2,
+                                                algorithm_parameters= algorithm_parameters,
+                                                convergence_curve= True,
+                                                progress_bar= True)
+
+    cost_optimization_model.run()
+    cost_convergence = cost_optimization_model.report
+    cost_solution = cost_optimization_model.output_dict
 
-cost_optimization_model = ga(function = calculate_cost_per_kWh,
-                                            dimension = 1, 
-                                            variable_type = "real", 
-                                            variable_boundaries= boundary_2,
-                                            algorithm_parameters= algorithm_parameters,
-                                            convergence_curve= True,
-                                            progress_bar= True)
+# payback, cost per kWh, excess, savings and export income of the optimized capacity in one evaluation
+optimized_economics = calculate_solar_economics(cost_solution["variable"], house_PV_kW_per_kW_capacity,
+                                                typical_electric_consumption)
 
-cost_optimization_model.run()
-cost_convergence = cost_optimization_model.report
-cost_solution = cost_optimization_model.output_dict
+#%%
+"""
+System design sweep without the API: the hourly AC output of the example house for other losses
+and DC/AC ratios is recomputed from the cached response, see solar_pv_performance.py
+"""
+solar_data_arrays = solar_API.solar_PV_watts_hourly_arrays(api_key= api_key,
+                                solar_api_url= pv_watts_url,
+                                data_format= data_format,
+                                address = address,
+                                system_capacity= system_capacity,
+                                module_type= module_type,
+                                losses= losses,
+                                array_type= array_type,
+                                tilt= tilt,
+                                azimuth= azimuth,
+                                cache_dir = cache_dir,
+                                replay_only = replay_only)
+design_losses = np.array([6, 8, 10, 12, 14])
+design_PV_kW_per_kW_capacity = solar_pv_performance.PV_AC_output_per_kW(solar_data_arrays,
+                                            {"system_capacity": system_capacity, "module_type": module_type, "losses": losses},
+                                            losses = design_losses,
+                                            dc_ac_ratio = 1.2)
+design_results = [solar_house_optimization.optimize_house_capacity(design_PV_kW_per_kW_capacity[j],
+                                                                    typical_electric_consumption)
+                    for j in range(len(design_losses))]
+
+#%%
+"""
+Battery mode: the excess solar charges a home battery instead of being exported,
+the solar capacity and the battery capacity are sized together, see solar_battery.py
+"""
+PV_battery_result = solar_battery.optimize_PV_battery(house_PV_kW_per_kW_capacity,
+                                            typical_electric_consumption,
+                                            solar_capacities_kW = np.arange(0.5, 10.001, 0.25),
+                                            battery_capacities_kWh = np.arange(0, 20.001, 2.5),
+                                            objective = "payback",
+                                            round_trip_efficiency = 0.9)
+print("solar capacity", PV_battery_result["solar_capacity"], "kW, battery", PV_battery_result["battery_capacity"],
+    "kWh, payback", PV_battery_result["simple_payback"], "years")
 
 #%%
 """
 Step by step validating.
 """
 solar_capacity_kW = 5
-solar_PV_kW_per_kW_capacity = obtain_PV_AC_output(solar_data) # create a function about obtaining solar data value
+solar_PV_kW_per_kW_capacity = house_PV_kW_per_kW_capacity
 
-load_energy_consumption = obtain_typical_consumption(file, NREL_file) # create a function about obtaining the electric consumption 
+load_energy_consumption = typical_electric_consumption # the electric consumption of the example house
 
 electric_price = 0.14
 
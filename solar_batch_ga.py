@@ -0,0 +1,246 @@
+## This is the genetic algorithm with population-batched fitness evaluation
+# Author : Qiancheng Sun
+"""
+The geneticalgorithm package calls the objective function once for every individual,
+so every generation of the solar capacity optimization is about 100 separate python calls,
+and every call repeats the whole 8760-hour calculation.
+
+batch_geneticalgorithm in here follows the same algorithm and the same interface as
+geneticalgorithm (algorithm_parameters, run(), report, output_dict), but the objective
+function receives all the new individuals of one generation at once:
+
+    function(X) -> y
+        X : np.array() with shape (number of individuals, dimension)
+        y : np.array() with shape (number of individuals,)
+
+so the solar objectives in solar_optimization.py score a whole generation in one call
+(a few individuals x 8760 at a time, see solar_optimization.capacity_chunk_size).
+"""
+#%%
+import sys
+
+import numpy as np
+
+default_algorithm_parameters = {'max_num_iteration': None,
+                                'population_size': 100,
+                                'mutation_probability': 0.1,
+                                'elit_ratio': 0.01,
+                                'crossover_probability': 0.5,
+                                'parents_portion': 0.3,
+                                'crossover_type': 'uniform',
+                                'max_iteration_without_improv': None}
+
+
+class batch_geneticalgorithm:
+    """
+    Genetic algorithm for minimizing a population-batched objective function.
+
+    Input Arguments:
+        function : the batched objective function, see the description at the top of this file
+
+        dimension : numeric, number of variables
+
+        variable_type : string (character), "real" or "int"
+
+        variable_boundaries : np.array() with shape (dimension, 2), the [lower, upper] boundary of every variable
+
+        algorithm_parameters : dict, the same keys as geneticalgorithm
+                max_num_iteration, population_size, mutation_probability, elit_ratio,
+                crossover_probability, parents_portion, crossover_type (uniform, one_point, two_point),
+                max_iteration_without_improv
+
+        convergence_curve : Boolean, plot the convergence curve or not (needs matplotlib)
+
+        progress_bar : Boolean, show the progress bar and the best solution or not
+
+        random_state : numeric or np.random.Generator, default is None
+                the seed of the random numbers, for repeatable runs
+
+    Output (after run()) :
+        report : list, the best objective value of every generation
+        output_dict : dict, {"variable": best solution, "function": best objective value}
+    """
+    def __init__(self, function, dimension, variable_type = "real", variable_boundaries = None,
+                algorithm_parameters = default_algorithm_parameters,
+                convergence_curve = True, progress_bar = True, random_state = None):
+        self.f = function
+        self.dim = int(dimension)
+        if variable_type not in ("real", "int"):
+            raise ValueError("variable_type must be 'real' or 'int'")
+        self.var_type = variable_type
+        if variable_boundaries is None:
+            raise ValueError("variable_boundaries must be given")
+        self.var_bound = np.array(variable_boundaries, dtype = np.float64).reshape(self.dim, 2)
+        self.convergence_curve = convergence_curve
+        self.progress_bar = progress_bar
+        self.random = np.random.default_rng(random_state)
+
+        self.param = dict(default_algorithm_parameters, **algorithm_parameters)
+        self.pop_s = int(self.param['population_size'])
+        self.par_s = int(self.param['parents_portion'] * self.pop_s)
+        # the children are made in pairs
+        if (self.pop_s - self.par_s) % 2 != 0:
+            self.par_s += 1
+        self.prob_mut = self.param['mutation_probability']
+        self.prob_cross = self.param['crossover_probability']
+        trl = self.pop_s * self.param['elit_ratio']
+        if trl < 1 and self.param['elit_ratio'] > 0:
+            self.num_elit = 1
+        else:
+            self.num_elit = int(trl)
+        if self.param['max_num_iteration'] is None:
+            self.iterate = int(self.pop_s * self.dim * 10)
+        else:
+            self.iterate = int(self.param['max_num_iteration'])
+        self.c_type = self.param['crossover_type']
+        if self.param['max_iteration_without_improv'] is None:
+            self.mniwi = self.iterate + 1
+        else:
+            self.mniwi = int(self.param['max_iteration_without_improv'])
+        self.stop_mniwi = False
+
+    def evaluate(self, X):
+        """
+        Score a batch of individuals with one call of the objective function.
+        """
+        y = np.asarray(self.f(X), dtype = np.float64).reshape(-1)
+        if len(y) != len(X):
+            raise ValueError("the objective function returned " + str(len(y)) + " values for "
+                            + str(len(X)) + " individuals")
+        return y
+
+    def random_variables(self, n):
+        low = self.var_bound[:, 0]
+        high = self.var_bound[:, 1]
+        if self.var_type == "int":
+            return self.random.integers(low.astype(int), high.astype(int) + 1, size = (n, self.dim)).astype(np.float64)
+        return low + self.random.random((n, self.dim)) * (high - low)
+
+    def crossover(self, x, y):
+        """
+        Crossover of the parent pairs x and y (both with shape (pairs, dimension)).
+        """
+        if self.c_type == "one_point":
+            ran = self.random.integers(0, self.dim, size = (len(x), 1))
+            swap = np.arange(self.dim) < ran
+        elif self.c_type == "two_point":
+            ran1 = self.random.integers(0, self.dim, size = (len(x), 1))
+            ran2 = ran1 + (self.random.random((len(x), 1)) * (self.dim - ran1)).astype(int)
+            columns = np.arange(self.dim)
+            swap = (columns >= ran1) & (columns < ran2)
+        else:
+            swap = self.random.random(x.shape) < 0.5
+        ofs1 = np.where(swap, y, x)
+        ofs2 = np.where(swap, x, y)
+        return ofs1, ofs2
+
+    def mutate(self, x):
+        """
+        Replace the mutated genes with a random value inside the boundary.
+        """
+        mutated = self.random.random(x.shape) < self.prob_mut
+        return np.where(mutated, self.random_variables(len(x)), x)
+
+    def mutate_middle(self, x, p1, p2):
+        """
+        Replace the mutated genes with a random value between the two parents
+        (inside the boundary when the two parents are the same).
+        """
+        mutated = self.random.random(x.shape) < self.prob_mut
+        low = np.minimum(p1, p2)
+        high = np.maximum(p1, p2)
+        if self.var_type == "int":
+            between = np.floor(low + self.random.random(x.shape) * (high - low))
+        else:
+            between = low + self.random.random(x.shape) * (high - low)
+        between = np.where(low == high, self.random_variables(len(x)), between)
+        return np.where(mutated, between, x)
+
+    def progress(self, count, total, status = ""):
+        bar_len = 50
+        filled_len = int(round(bar_len * count / float(total)))
+        percents = round(100.0 * count / float(total), 1)
+        bar = "|" * filled_len + "_" * (bar_len - filled_len)
+        sys.stdout.write("\r%s %s%s %s" % (bar, percents, "%", status))
+        sys.stdout.flush()
+
+    def run(self):
+        # Initial Population, scored as one batch
+        variables = self.random_variables(self.pop_s)
+        pop = np.column_stack([variables, self.evaluate(variables)])
+        self.report = []
+        self.best_variable = pop[-1, :self.dim].copy()
+        self.best_function = pop[-1, self.dim]
+        t = 1
+        counter = 0
+        while t <= self.iterate:
+            if self.progress_bar:
+                self.progress(t, self.iterate, status = "GA is running...")
+            # Sort
+            pop = pop[pop[:, self.dim].argsort()]
+            if pop[0, self.dim] < self.best_function:
+                counter = 0
+                self.best_function = pop[0, self.dim]
+                self.best_variable = pop[0, :self.dim].copy()
+            else:
+                counter += 1
+            # Report
+            self.report.append(pop[0, self.dim])
+            # Normalizing objective function, the smaller objective obtains the larger probability
+            normobj = pop[:, self.dim] + abs(pop[0, self.dim]) if pop[0, self.dim] < 0 else pop[:, self.dim].copy()
+            normobj = np.amax(normobj) - normobj + 1
+            cumprob = np.cumsum(normobj / np.sum(normobj))
+            # Select parents, the elites first and then by roulette wheel
+            index = np.searchsorted(cumprob, self.random.random(self.par_s - self.num_elit))
+            index = np.minimum(index, self.pop_s - 1)
+            par = np.vstack([pop[:self.num_elit], pop[index]])
+            # the parents taking part in the crossover, at least one
+            ef_par_list = self.random.random(self.par_s) <= self.prob_cross
+            while not ef_par_list.any():
+                ef_par_list = self.random.random(self.par_s) <= self.prob_cross
+            ef_par = par[ef_par_list]
+            # New generation: the parents are kept, the children are made in pairs and scored as one batch
+            n_pairs = (self.pop_s - self.par_s) // 2
+            r1 = self.random.integers(0, len(ef_par), size = n_pairs)
+            r2 = self.random.integers(0, len(ef_par), size = n_pairs)
+            pvar1 = ef_par[r1, :self.dim]
+            pvar2 = ef_par[r2, :self.dim]
+            ch1, ch2 = self.crossover(pvar1, pvar2)
+            ch1 = self.mutate(ch1)
+            ch2 = self.mutate_middle(ch2, pvar1, pvar2)
+            # keep the same order as geneticalgorithm, ch1 and ch2 of one pair next to each other
+            children = np.empty((2 * n_pairs, self.dim))
+            children[0::2] = ch1
+            children[1::2] = ch2
+            pop = np.vstack([par, np.column_stack([children, self.evaluate(children)])])
+            t += 1
+            if counter > self.mniwi:
+                pop = pop[pop[:, self.dim].argsort()]
+                if pop[0, self.dim] >= self.best_function:
+                    t = self.iterate + 1
+                    if self.progress_bar:
+                        self.progress(self.iterate, self.iterate, status = "GA is running...")
+                    self.stop_mniwi = True
+        # Sort
+        pop = pop[pop[:, self.dim].argsort()]
+        if pop[0, self.dim] < self.best_function:
+            self.best_function = pop[0, self.dim]
+            self.best_variable = pop[0, :self.dim].copy()
+        # Report
+        self.report.append(pop[0, self.dim])
+        self.output_dict = {"variable": self.best_variable, "function": self.best_function}
+        # the report is printed with the progress bar only, a worker of the process pool runs many GAs
+        if self.progress_bar:
+            sys.stdout.write("\r%s" % (" " * 100))
+            sys.stdout.write("\r The best solution found:\n %s" % (self.best_variable))
+            sys.stdout.write("\n\n Objective function:\n %s\n" % (self.best_function))
+            sys.stdout.flush()
+        if self.convergence_curve:
+            import matplotlib.pyplot as plt
+            plt.plot(np.array(self.report))
+            plt.xlabel("Iteration")
+            plt.ylabel("Objective function")
+            plt.title("Genetic Algorithm")
+            plt.show()
+        if self.stop_mniwi and self.progress_bar:
+            sys.stdout.write("\nWarning: GA is terminated due to the maximum number of iterations without improvement was met!\n")
@@ -0,0 +1,567 @@
+## This is the batch job entry point of the solar capacity optimization for multi-node runs
+# Author : Qiancheng Sun
+"""
+This file runs the pipeline (fetch, optimization, journal and output of the houses chunk by chunk)
+from a json config file, and splits the residences into N shards by a stable hash (md5) of the address,
+so N machines can run one statewide file at the same time:
+
+    python solar_batch_job.py run --config statewide.json --shard 0/4     (on machine 1)
+    python solar_batch_job.py run --config statewide.json --shard 1/4     (on machine 2)
+    ...
+    python solar_batch_job.py merge --config statewide.json --shards 4
+
+Every shard writes into its own directory output_dir/shard_k_of_N (result csv file, checkpoint journal,
+capacity curves, hourly profiles, metrics), so the shards never write the same file, and a shard that
+stopped resumes from its journal. A resumed run continues the numbering of the archive files and writes
+its own metrics file. The houses are journaled every journal_batch_size houses, and a house whose
+PV watts response can not be fetched or decoded is journaled with its error and empty results, so the
+run goes on and a resumed run only tries the failed houses again. The merge step combines the result
+files of all the shards in the row order of the input file into output_dir/solar_capacity.csv.
+
+The config file is a json object with the keys of default_config. The API key is taken from
+"api_key" in the config file, or from the NREL_API_KEY environment variable.
+solar_API_pipeline.py builds the same config in python and runs it as one shard (0/1).
+"""
+#%%
+import argparse
+import csv
+import hashlib
+import heapq
+import json
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+
+import solar_API
+import solar_API_batch
+import solar_battery
+import solar_capacity_curve
+import solar_checkpoint
+import solar_county_engine
+import solar_house_optimization
+import solar_input_stream
+import solar_load_profile
+import solar_metrics
+import solar_parallel
+import solar_pareto
+import solar_profile_store
+import solar_result_sink
+import solar_screening
+import solar_weather_tile
+
+# the keys of the config file and their default values, None must be given in the config file
+default_config = {"file_path": None, # the residence csv file (Address, consumption_type, scale_factor, ...)
+                "NREL_paths": None, # {"High": path, "Base": path, "Low": path} of the NREL load profiles
+                "default_consumption_type": "Low",
+                "output_dir": None,
+                "geocode_path": None, # local geocode table (Address, latitude, longitude), optional
+                "api_key": None,
+                "pv_watts_url": "https://developer.nrel.gov/api/pvwatts/v6",
+                "data_format": ".json",
+                "system_capacity": "1",
+                "module_type": "0",
+                "losses": "10",
+                "array_type": "0",
+                "tilt": "20",
+                "azimuth": "180",
+                "timeframe": "hourly",
+                "cache_dir": None, # default is output_dir/PV_watts_cache, which can be shared by the shards
+                "cache_ttl": 30 * 24 * 3600,
+                "cache_max_bytes": 2 * 1024 ** 3,
+                "replay_only": False,
+                "max_api_workers": 8,
+                "requests_per_hour": solar_API_batch.NREL_requests_per_hour,
+                "optimizer_backend": "exact", # "exact", "ga", "pareto" or "battery"
+                # battery capacities of the "battery" backend (kWh), None for 0 to 20 kWh every 2.5 kWh,
+                # see solar_battery.optimize_PV_battery()
+                "battery_capacities_kWh": None,
+                "max_workers": None, # process pool of the "ga" backend
+                "objective_resolution_kW": 0.01, # memoization step of the "ga" objectives, None to turn it off
+                # stage 2 capacity window around the payback optimum (kW), 0 reports the payback optimum,
+                # see solar_house_optimization.py
+                "cost_window_kW": solar_house_optimization.cost_window_kW,
+                "chunk_size": 1000, # houses read from the input file and written to the result file at a time
+                # houses fetched, optimized and journaled at a time, a crash loses at most this many houses,
+                # a smaller batch means more journal fsyncs and capacity curve files and smaller groups
+                # for the "exact" engine (one process pool for every batch with the "ga" backend)
+                "journal_batch_size": 100,
+                "resume": True,
+                # houses whose monthly payback lower bound is above it are skipped, None to run every house
+                "screening_max_payback_year": None,
+                "save_hourly_solar_data": True,
+                "save_hourly_profiles": True,
+                "save_capacity_curves": True,
+                "metrics_report_every": 60} # seconds between two throughput summaries, see solar_metrics.py
+
+# the columns of the shard result files and of the merged file
+result_columns = solar_input_stream.input_columns + solar_county_engine.optimization_columns \
+                    + solar_battery.battery_columns + solar_screening.screening_columns
+
+
+def load_config(config_path, require_api_key = True):
+    """
+    Read the json config file, see build_config().
+    """
+    with open(config_path, "r", encoding = "utf-8") as f:
+        config = json.load(f)
+    return build_config(config, require_api_key = require_api_key)
+
+
+def build_config(config, require_api_key = True):
+    """
+    Check the config dict (from the json config file or from solar_API_pipeline.py),
+    the missing keys obtain the value of default_config.
+    The API key is not needed by the merge step (require_api_key = False) or with replay_only.
+    """
+    unknown = sorted(set(config) - set(default_config))
+    if unknown:
+        raise ValueError("unknown config keys: " + ", ".join(unknown))
+    config = dict(default_config, **config)
+    for key in ("file_path", "NREL_paths", "output_dir"):
+        if config[key] is None:
+            raise ValueError("the config file must give " + key)
+    if config["api_key"] is None:
+        config["api_key"] = os.environ.get("NREL_API_KEY")
+    if config["api_key"] is None and require_api_key and not config["replay_only"]:
+        raise ValueError("the API key must be given as api_key in the config file or as NREL_API_KEY")
+    if config["cache_dir"] is None:
+        config["cache_dir"] = os.path.join(config["output_dir"], "PV_watts_cache")
+    return config
+
+
+def parse_shard(text):
+    """
+    Parse the --shard option "k/N", k is from 0 to N - 1.
+    """
+    try:
+        shard_index, n_shards = (int(value) for value in text.split("/"))
+    except ValueError:
+        raise ValueError("the shard must be written as k/N, for example 0/4")
+    if n_shards < 1 or not 0 <= shard_index < n_shards:
+        raise ValueError("the shard " + text + " is not between 0/N and (N-1)/N")
+    return shard_index, n_shards
+
+
+def shard_of_address(address, n_shards):
+    """
+    Shard of the address, from a md5 hash of the address, so every machine obtains the same shards
+    (the python hash() of a string changes from one process to another).
+    """
+    digest = hashlib.md5(str(address).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % n_shards
+
+
+def shard_directory(config, shard_index, n_shards):
+    return os.path.join(config["output_dir"], "shard_%d_of_%d" % (shard_index, n_shards))
+
+
+def shard_result_path(config, shard_index, n_shards):
+    return os.path.join(shard_directory(config, shard_index, n_shards), "solar_capacity.csv")
+
+
+def fetch_PV_profiles(config, file, rows, geocode_table, load_library, solar_data_sink, profile_store):
+    """
+    Fetch the PV watts profile of every house of the batch, one request for every PV profile.
+    The profiles are fetched into the cache through the rate limiter of solar_API_batch and decoded
+    from the cache. A house whose response can not be fetched or decoded (or is not in the cache with
+    replay_only) fails alone, the other houses of the batch go on.
+
+    Output :
+        PV_profiles : array (number of PV profiles x 8760), the hourly AC output per kW capacity
+        fetched_rows : list, the rows whose profile was fetched
+        house_PV_rows, house_load_rows : list, the PV profile row and the load profile row of every fetched row
+        fetch_errors : dict, row -> error message of the rows which failed
+    """
+    PV_parameters = {name: config[name] for name in ("module_type", "losses", "array_type", "tilt",
+                                                    "azimuth", "timeframe")}
+    cache_arguments = {name: config[name] for name in ("cache_dir", "cache_ttl", "cache_max_bytes", "replay_only")}
+    PV_profile_groups = solar_weather_tile.group_addresses_by_PV_profile(addresses = file["Address"][rows],
+                                                                geocode_table = geocode_table,
+                                                                PV_parameters = PV_parameters)
+    # fetch one PV watts profile for every group concurrently into the cache
+    prefetch_results = solar_API_batch.solar_PV_watts_API_batch(api_key = config["api_key"],
+                                solar_api_url = config["pv_watts_url"],
+                                data_format = config["data_format"],
+                                parameter_list = [group["arguments"] for group in PV_profile_groups.values()],
+                                default_parameters = {"system_capacity": config["system_capacity"]},
+                                max_workers = config["max_api_workers"],
+                                requests_per_hour = config["requests_per_hour"],
+                                keep_results = False,
+                                **cache_arguments)
+    # the houses of a group whose fetch failed are not requested again outside the rate limiter
+    prefetch_errors = {}
+    for group, result in zip(PV_profile_groups.values(), prefetch_results):
+        if result["errors"]:
+            for position in group["rows"]:
+                prefetch_errors[rows[position]] = "PV watts fetch failed : %s" % "; ".join(map(str, result["errors"]))
+    # every fetched profile is in the cache now, it is only read back from it
+    cache_arguments["replay_only"] = True
+    PV_profiles = []
+    PV_profile_rows = {}
+    # the error of a location, the other houses of the location are not fetched again
+    location_errors = {}
+    fetched_rows = []
+    house_PV_rows = []
+    house_load_rows = []
+    fetch_errors = {}
+    for i in rows:
+        address = file["Address"][i]
+        location = solar_weather_tile.PV_location_arguments(address, geocode_table)
+        location_key = (location["address"], location.get("lat"), location.get("lon"))
+        if i in prefetch_errors:
+            fetch_errors[i] = prefetch_errors[i]
+            continue
+        if location_key in location_errors:
+            fetch_errors[i] = location_errors[location_key]
+            continue
+        try:
+            if location_key not in PV_profile_rows:
+                solar_data_arrays = solar_API.solar_PV_watts_hourly_arrays(api_key = config["api_key"],
+                                                solar_api_url = config["pv_watts_url"],
+                                                data_format = config["data_format"],
+                                                address = location["address"],
+                                                lat = location.get("lat"),
+                                                lon = location.get("lon"),
+                                                system_capacity = config["system_capacity"],
+                                                module_type = config["module_type"],
+                                                losses = config["losses"],
+                                                array_type = config["array_type"],
+                                                tilt = config["tilt"],
+                                                azimuth = config["azimuth"],
+                                                **cache_arguments)
+                PV_profile_rows[location_key] = len(PV_profiles)
+                PV_profiles.append(solar_data_arrays)
+            solar_data_arrays = PV_profiles[PV_profile_rows[location_key]]
+            if solar_data_sink is not None:
+                solar_API.solar_data_from_arrays(arrays = solar_data_arrays, sink = solar_data_sink, address = address)
+            load_row = load_library.row(file["consumption_type"][i])
+            if profile_store is not None:
+                profile_store.append(address, solar_data_arrays["ac"] / 1000,
+                                    load_library.house_load(file["consumption_type"][i], file["scale_factor"][i]))
+        except Exception as error:
+            fetch_errors[i] = "PV watts fetch failed : %r" % (error,)
+            if location_key not in PV_profile_rows:
+                location_errors[location_key] = fetch_errors[i]
+            continue
+        fetched_rows.append(i)
+        house_PV_rows.append(PV_profile_rows[location_key])
+        house_load_rows.append(load_row)
+    solar_metrics.count("PV_watts_failed_houses", len(fetch_errors))
+    # the AC output per kW capacity, the same as obtain_PV_AC_output()
+    PV_profiles = np.vstack([np.asarray(arrays["ac"], dtype = np.float64) / 1000 for arrays in PV_profiles]
+                            + [np.zeros((0, solar_API.hours_per_year))])
+    return PV_profiles, fetched_rows, house_PV_rows, house_load_rows, fetch_errors
+
+
+def screen_rows(config, file, rows, geocode_table, load_library):
+    """
+    Monthly screening of the houses of the chunk, see solar_screening.py.
+
+    Output :
+        candidate_rows : list, the rows that need the hourly run
+        screened_rows : list, the rows that are screened out
+        payback_lower_bound : array, the payback lower bound of every screened out row
+    """
+    PV_parameters = {name: config[name] for name in ("module_type", "losses", "array_type", "tilt", "azimuth")}
+    PV_monthly_kWh_per_kW = solar_screening.monthly_PV_output(api_key = config["api_key"],
+                                            solar_api_url = config["pv_watts_url"],
+                                            data_format = config["data_format"],
+                                            addresses = file["Address"][rows],
+                                            geocode_table = geocode_table,
+                                            PV_parameters = PV_parameters,
+                                            system_capacity = config["system_capacity"],
+                                            max_workers = config["max_api_workers"],
+                                            requests_per_hour = config["requests_per_hour"],
+                                            cache_dir = config["cache_dir"],
+                                            cache_ttl = config["cache_ttl"],
+                                            cache_max_bytes = config["cache_max_bytes"],
+                                            replay_only = config["replay_only"])
+    screening = solar_screening.screen_houses(PV_monthly_kWh_per_kW,
+                                            load_profiles = load_library.profiles,
+                                            house_load_rows = load_library.house_rows(file["consumption_type"][rows]),
+                                            scale_factors = file["scale_factor"][rows].to_numpy(dtype = np.float64),
+                                            max_payback_year = config["screening_max_payback_year"])
+    candidate_rows = [row for row, candidate in zip(rows, screening["candidate"]) if candidate]
+    screened_rows = [row for row, candidate in zip(rows, screening["candidate"]) if not candidate]
+    return candidate_rows, screened_rows, screening["payback_lower_bound"][~screening["candidate"]]
+
+
+def optimize_rows(config, PV_profiles, load_profiles, house_PV_rows, house_load_rows, scale_factors):
+    """
+    Two optimization stages of the houses of one chunk with the optimizer_backend of the config.
+
+    Output :
+        optimization_result : dict, column -> array with one value for every house,
+                and "fronts", the Pareto front of every house, for the "pareto" backend,
+                and battery_capacity for the "battery" backend
+        house_curves : (group curves, curve index of every house) for the "exact" backend, None otherwise,
+                see solar_county_engine.optimize_county()
+        house_errors : list, the error message of every house (None when the house did not fail)
+    """
+    n_houses = len(scale_factors)
+    if config["optimizer_backend"] == "exact":
+        optimization_result = solar_county_engine.optimize_county(PV_profiles = PV_profiles,
+                                            load_profiles = load_profiles,
+                                            house_PV_rows = house_PV_rows,
+                                            house_load_rows = house_load_rows,
+                                            scale_factors = scale_factors,
+                                            return_curves = config["save_capacity_curves"],
+                                            cost_window_kW = config["cost_window_kW"])
+        house_curves = None
+        if config["save_capacity_curves"]:
+            house_curves = (optimization_result.pop("group_curves"), optimization_result.pop("curve_index"))
+        return optimization_result, house_curves, [None] * n_houses
+    if config["optimizer_backend"] == "pareto":
+        optimization_result = solar_pareto.pareto_county(PV_profiles = PV_profiles,
+                                            load_profiles = load_profiles,
+                                            house_PV_rows = house_PV_rows,
+                                            house_load_rows = house_load_rows,
+                                            scale_factors = scale_factors)
+        return optimization_result, None, [None] * n_houses
+    if config["optimizer_backend"] == "battery":
+        optimization_result, house_errors = solar_battery.battery_county(PV_profiles = PV_profiles,
+                                            load_profiles = load_profiles,
+                                            house_PV_rows = house_PV_rows,
+                                            house_load_rows = house_load_rows,
+                                            scale_factors = scale_factors,
+                                            battery_capacities_kWh = config["battery_capacities_kWh"])
+        return optimization_result, None, house_errors
+    if "fork" in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context("fork")
+    else:
+        mp_context = None
+    results = solar_parallel.optimize_houses_parallel(PV_profiles = PV_profiles,
+                                            load_profiles = load_profiles,
+                                            house_PV_rows = house_PV_rows,
+                                            house_load_rows = house_load_rows,
+                                            scale_factors = scale_factors,
+                                            max_workers = config["max_workers"],
+                                            optimizer_backend = config["optimizer_backend"],
+                                            objective_resolution_kW = config["objective_resolution_kW"],
+                                            cost_window_kW = config["cost_window_kW"],
+                                            mp_context = mp_context)
+    optimization_result = {column: np.full(n_houses, np.nan) for column in solar_county_engine.optimization_columns}
+    house_errors = [None] * n_houses
+    for j, result in enumerate(results):
+        if "error" in result:
+            house_errors[j] = result["error"]
+            continue
+        optimization_result["solar_capacity"][j] = result["solar_capacity"][0]
+        optimization_result["optimized_payback_year"][j] = result["optimized_payback_year"]
+        optimization_result["optimized_cost_per_kWh"][j] = result["optimized_cost_per_kWh"]
+    return optimization_result, None, house_errors
+
+
+def pending_houses(config, shard_index, n_shards, result_journal):
+    """
+    Number of the houses of the shard which are not completed in the journal, used for the ETA of the metrics.
+    Only the Address column of the input file is read.
+    """
+    n_pending = 0
+    for file in solar_input_stream.read_input_chunks(config["file_path"], chunk_size = config["chunk_size"],
+                                                    columns = ["Address"]):
+        for i, address in zip(file.index, file["Address"]):
+            if shard_of_address(address, n_shards) == shard_index and not result_journal.is_completed(i, address):
+                n_pending += 1
+    return n_pending
+
+
+def run_shard(config, shard_index = 0, n_shards = 1):
+    """
+    Run the pipeline for the houses of one shard.
+
+    Input Arguments:
+        config : dict, obtained by load_config() or build_config()
+
+        shard_index, n_shards : numeric, the shard k of N (k from 0 to N - 1)
+
+    Output :
+        result_path : string (character), the result csv file of the shard
+    """
+    shard_dir = shard_directory(config, shard_index, n_shards)
+    os.makedirs(shard_dir, exist_ok = True)
+    load_library = solar_load_profile.load_profile_library(config["NREL_paths"],
+                                                        default_consumption_type = config["default_consumption_type"])
+    if config["geocode_path"] is not None and os.path.exists(config["geocode_path"]):
+        geocode_table = solar_weather_tile.load_geocode_table(config["geocode_path"])
+    else:
+        geocode_table = {}
+    if config["save_hourly_solar_data"]:
+        solar_data_sink = solar_result_sink.background_sink(
+                            solar_result_sink.npz_archive_sink(os.path.join(shard_dir, "hourly_solar_data"),
+                                                            batch_size = 1000),
+                            max_queue = 64)
+    else:
+        solar_data_sink = None
+    if config["save_hourly_profiles"]:
+        profile_store = solar_profile_store.profile_store(os.path.join(shard_dir, "hourly_profiles"))
+    else:
+        profile_store = None
+    capacity_curve_dir = os.path.join(shard_dir, "capacity_curves")
+    os.makedirs(capacity_curve_dir, exist_ok = True)
+    n_capacity_curve_files = len([name for name in os.listdir(capacity_curve_dir) if name.startswith("capacity_curves_")])
+    pareto_front_dir = os.path.join(shard_dir, "pareto_fronts")
+    n_pareto_front_files = len(os.listdir(pareto_front_dir)) if os.path.isdir(pareto_front_dir) else 0
+
+    result_journal = solar_checkpoint.result_journal(os.path.join(shard_dir, "optimization_journal.jsonl"),
+                                                resume = config["resume"])
+    result_path = shard_result_path(config, shard_index, n_shards)
+    result_output = solar_input_stream.output_stream(result_path, columns = result_columns)
+    # the ETA of the throughput summary counts the houses this run still has to do
+    solar_metrics.registry.reset(n_houses = pending_houses(config, shard_index, n_shards, result_journal),
+                                report_every = config["metrics_report_every"])
+    try:
+        for file in solar_input_stream.read_input_chunks(config["file_path"], chunk_size = config["chunk_size"]):
+            # the houses of this shard
+            file = file[[shard_of_address(address, n_shards) == shard_index for address in file["Address"]]].copy()
+            rows = [i for i in file.index if not result_journal.is_completed(i, file["Address"][i])]
+            if config["screening_max_payback_year"] is not None and len(rows) > 0:
+                with solar_metrics.stage("monthly_screening"):
+                    rows, screened_rows, payback_lower_bound = screen_rows(config, file, rows, geocode_table,
+                                                                        load_library)
+                if screened_rows:
+                    # journaled without a result, a resumed run does not screen them again
+                    screened_results = {column: np.full(len(screened_rows), np.nan)
+                                        for column in solar_county_engine.optimization_columns}
+                    screened_results["payback_lower_bound"] = payback_lower_bound
+                    screened_results["screened_out"] = [True] * len(screened_rows)
+                    result_journal.write_results(screened_rows, file["Address"][screened_rows].tolist(),
+                                                screened_results)
+                    solar_metrics.registry.house_done(len(screened_rows))
+            # the houses are journaled batch by batch, see journal_batch_size in default_config
+            for batch_start in range(0, len(rows), config["journal_batch_size"]):
+                batch_rows = rows[batch_start:batch_start + config["journal_batch_size"]]
+                with solar_metrics.stage("PV_watts_fetch"):
+                    PV_profiles, fetched_rows, house_PV_rows, house_load_rows, fetch_errors = fetch_PV_profiles(
+                                                                                config, file, batch_rows, geocode_table,
+                                                                                load_library, solar_data_sink,
+                                                                                profile_store)
+                # the failed houses are journaled with an error and nan results, a resumed run tries them again
+                journal_results = {column: np.full(len(batch_rows), np.nan)
+                                    for column in solar_county_engine.optimization_columns
+                                                + solar_battery.battery_columns}
+                journal_results["screened_out"] = [False] * len(batch_rows)
+                journal_results["error"] = [fetch_errors.get(i) for i in batch_rows]
+                addresses = file["Address"][fetched_rows].tolist()
+                scale_factors = file["scale_factor"][fetched_rows].to_numpy(dtype = np.float64)
+                house_curves = None
+                house_fronts = []
+                if fetched_rows:
+                    with solar_metrics.stage("optimization"):
+                        optimization_result, house_curves, house_errors = optimize_rows(config, PV_profiles,
+                                                                                    load_library.profiles,
+                                                                                    house_PV_rows, house_load_rows,
+                                                                                    scale_factors)
+                    house_fronts = optimization_result.pop("fronts", [None] * len(fetched_rows))
+                    batch_positions = {row: j for j, row in enumerate(batch_rows)}
+                    positions = [batch_positions[i] for i in fetched_rows]
+                    for column, values in optimization_result.items():
+                        journal_results[column][positions] = values
+                    for position, error in zip(positions, house_errors):
+                        journal_results["error"][position] = error
+                for i, error in zip(batch_rows, journal_results["error"]):
+                    if error is not None:
+                        print(file["Address"][i], error, file = sys.stderr)
+                with solar_metrics.stage("journal"):
+                    result_journal.write_results(batch_rows, file["Address"][batch_rows].tolist(), journal_results)
+                solar_metrics.registry.house_done(len(batch_rows))
+                if house_curves is not None:
+                    # the group curves are scaled for every house when they are saved
+                    capacity_curves = solar_capacity_curve.scaled_capacity_curves(addresses, *house_curves,
+                                                                                scale_factors)
+                else:
+                    capacity_curves = {}
+                if capacity_curves:
+                    solar_capacity_curve.save_capacity_curves(os.path.join(capacity_curve_dir,
+                                                            "capacity_curves_%05d.npz" % n_capacity_curve_files),
+                                                            capacity_curves)
+                    n_capacity_curve_files += 1
+                pareto_fronts = {address: front for address, front in zip(addresses, house_fronts) if front is not None}
+                if pareto_fronts:
+                    os.makedirs(pareto_front_dir, exist_ok = True)
+                    solar_pareto.save_pareto_fronts(os.path.join(pareto_front_dir,
+                                                    "pareto_fronts_%05d.npz" % n_pareto_front_files),
+                                                    pareto_fronts)
+                    n_pareto_front_files += 1
+            chunk_results = result_journal.results(file.index, file["Address"],
+                                                columns = solar_county_engine.optimization_columns
+                                                        + solar_battery.battery_columns
+                                                        + solar_screening.screening_columns)
+            for column in solar_county_engine.optimization_columns + solar_battery.battery_columns \
+                            + ["payback_lower_bound"]:
+                file[column] = chunk_results[column]
+            # the houses which are not screened out (or not screened at all) are False
+            file["screened_out"] = chunk_results["screened_out"] == 1
+            with solar_metrics.stage("csv_write"):
+                result_output.write(file)
+            result_journal.forget(file.index)
+            print("shard", str(shard_index) + "/" + str(n_shards), ":", result_output.n_rows, "houses")
+    finally:
+        if solar_data_sink is not None:
+            solar_data_sink.close()
+        result_journal.close()
+        # one metrics file for every run of the shard, a resumed run does not replace the earlier runs
+        n_metrics_files = len([name for name in os.listdir(shard_dir) if name.startswith("pipeline_metrics_")])
+        solar_metrics.registry.write_metrics(os.path.join(shard_dir, "pipeline_metrics_%05d.jsonl" % n_metrics_files))
+    return result_path
+
+
+def merge_shards(config, n_shards, output_file = None):
+    """
+    Combine the result files of the N shards into one csv file in the row order of the input file.
+    Every shard file is already in the row order, so the files are merged line by line
+    without reading them into memory.
+
+    Output :
+        output_file : string (character), default is output_dir/solar_capacity.csv
+    """
+    if output_file is None:
+        output_file = os.path.join(config["output_dir"], "solar_capacity.csv")
+    paths = [shard_result_path(config, shard_index, n_shards) for shard_index in range(n_shards)]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError("the result files of these shards are missing: " + ", ".join(missing))
+    files = [open(path, "r", newline = "", encoding = "utf-8") for path in paths]
+    try:
+        readers = [csv.reader(f) for f in files]
+        headers = [next(reader, None) for reader in readers]
+        header = next(h for h in headers if h is not None) if any(headers) else None
+        if header is None:
+            raise ValueError("the shard result files are empty")
+        if any(h is not None and h != header for h in headers):
+            raise ValueError("the shard result files do not have the same columns")
+        rows = heapq.merge(*readers, key = lambda line: int(line[0]))
+        with open(output_file, "w", newline = "", encoding = "utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+    finally:
+        for f in files:
+            f.close()
+    return output_file
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Solar capacity optimization batch job")
+    commands = parser.add_subparsers(dest = "command", required = True)
+    run_parser = commands.add_parser("run", help = "run the houses of one shard")
+    run_parser.add_argument("--config", required = True, help = "json config file")
+    run_parser.add_argument("--shard", default = "0/1", help = "k/N, run shard k (0 to N - 1) of N, default is 0/1")
+    merge_parser = commands.add_parser("merge", help = "merge the result files of the shards")
+    merge_parser.add_argument("--config", required = True, help = "json config file")
+    merge_parser.add_argument("--shards", type = int, required = True, help = "number of shards N")
+    merge_parser.add_argument("--output", default = None, help = "merged csv file, default is output_dir/solar_capacity.csv")
+    arguments = parser.parse_args(argv)
+
+    config = load_config(arguments.config, require_api_key = (arguments.command == "run"))
+    if arguments.command == "run":
+        shard_index, n_shards = parse_shard(arguments.shard)
+        print(run_shard(config, shard_index, n_shards))
+    else:
+        print(merge_shards(config, arguments.shards, arguments.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+## This is the home battery dispatch simulation for the joint sizing of the solar PV and the battery
+# Author : Qiancheng Sun
+"""
+Without a battery, the solar that is not used behind the meter is exported at generation_rate.
+With a battery, the excess solar of one hour charges the battery and the battery discharges into
+the load of the later hours, which saves behind_meter_price instead of earning generation_rate.
+
+simulate_battery() in here dispatches the battery over the 8760 hours for many candidate
+(solar capacity, battery capacity) pairs at once. The state of charge of one hour depends on the
+hour before, so the hours are a loop, but every hour is one numpy step over all the pairs, so the
+run time hardly changes between 1 and 1000 pairs:
+
+    charge = min(excess solar, power, (capacity - state of charge) / charge efficiency)
+    discharge = min(load not covered by the solar, power, state of charge * discharge efficiency)
+
+the round-trip efficiency is split evenly between the charge and the discharge, and the battery
+starts the year empty and is only charged by the solar (self-consumption, no grid charging).
+
+battery_economics() adds the battery cost to the simple payback, and optimize_PV_battery() sizes
+the solar PV and the battery together on a grid of pairs. A battery capacity of 0 obtains the same
+payback and cost per kWh as solar_optimization.py. battery_county() sizes every house of a county,
+it is the "battery" optimizer_backend of solar_batch_job.py.
+"""
+#%%
+import numpy as np
+
+import solar_county_engine
+import solar_metrics
+import solar_optimization
+
+# cost assumptions of the battery
+cost_capital_battery_per_kWh = 1.0 * 1000 # USD / kWh
+# the battery charged by the solar obtains the same tax incentive as the solar PV
+tax_incentive_battery = solar_optimization.tax_incentive_solar_PV
+cost_battery_OM_per_kWh_per_year = 0 # USD / kWh / year
+
+# battery performance
+battery_round_trip_efficiency = 0.9
+# maximum charge and discharge power per kWh capacity (kW / kWh), used when the power is not given
+battery_power_per_kWh = 0.5
+
+# the column of the battery sizing in the output file
+battery_columns = ["battery_capacity"]
+
+
+def pair_arrays(solar_capacity_kW, battery_capacity_kWh, battery_power_kW):
+    """
+    Broadcast the candidate pairs into three 1-d arrays of the same length.
+    """
+    if battery_power_kW is None:
+        battery_power_kW = np.asarray(battery_capacity_kWh, dtype = np.float64) * battery_power_per_kWh
+    solar_capacity_kW, battery_capacity_kWh, battery_power_kW = np.broadcast_arrays(
+                                                np.asarray(solar_capacity_kW, dtype = np.float64),
+                                                np.asarray(battery_capacity_kWh, dtype = np.float64),
+                                                np.asarray(battery_power_kW, dtype = np.float64))
+    return solar_capacity_kW.reshape(-1), battery_capacity_kWh.reshape(-1), battery_power_kW.reshape(-1)
+
+
+def simulate_battery(solar_PV_kW_per_kW_capacity,
+    load_hourly_kW,
+    solar_capacity_kW,
+    battery_capacity_kWh,
+    battery_power_kW = None,
+    round_trip_efficiency = battery_round_trip_efficiency,
+    behind_meter_price = solar_optimization.behind_meter_price,
+    generation_rate = solar_optimization.generation_rate):
+    """
+    Hourly battery dispatch of many (solar capacity, battery capacity) pairs.
+
+    Input Arguments:
+        solar_PV_kW_per_kW_capacity : array of 8760 values (unit : kW), the hourly AC output per kW capacity
+
+        load_hourly_kW : array of 8760 values (unit : kW), the hourly electric consumption
+
+        solar_capacity_kW, battery_capacity_kWh : numeric or arrays broadcast into the candidate pairs
+
+        battery_power_kW : numeric or array, default is None (battery_power_per_kWh x battery capacity),
+                the maximum charge and discharge power
+
+        round_trip_efficiency : numeric, default is 0.9
+
+        behind_meter_price, generation_rate : numeric (unit : USD / kWh), used for the cost per kWh
+
+    Output :
+        result : dict of arrays with one value for every pair
+                "solar_capacity", "battery_capacity", "battery_power" : the pairs
+                "annual_solar_behind_meter_kWh" : the solar used by the load, directly or through the battery
+                "annual_solar_excess_kWh" : the solar exported to the grid
+                "annual_battery_discharge_kWh" : the part of the behind meter solar that went through the battery
+                "cost_per_kWh" : see solar_optimization.cost_per_kWh()
+    """
+    solar_PV_kW_per_kW_capacity = np.asarray(solar_PV_kW_per_kW_capacity, dtype = np.float64).reshape(-1)
+    load_hourly_kW = np.asarray(load_hourly_kW, dtype = np.float64).reshape(-1)
+    solar_capacity_kW, battery_capacity_kWh, battery_power_kW = pair_arrays(solar_capacity_kW,
+                                                                            battery_capacity_kWh,
+                                                                            battery_power_kW)
+    solar_metrics.count("battery_simulations", len(solar_capacity_kW))
+    charge_efficiency = discharge_efficiency = np.sqrt(round_trip_efficiency)
+    n_pairs = len(solar_capacity_kW)
+    state_of_charge = np.zeros(n_pairs)
+    behind_meter = np.zeros(n_pairs)
+    exported = np.zeros(n_pairs)
+    discharged = np.zeros(n_pairs)
+    cost_ratio = np.zeros(n_pairs)
+    # buffers of one hour, reused for every hour
+    solar = np.empty(n_pairs)
+    direct = np.empty(n_pairs)
+    surplus = np.empty(n_pairs)
+    deficit = np.empty(n_pairs)
+    flow = np.empty(n_pairs)
+    room = np.empty(n_pairs)
+    hour_cost = np.empty(n_pairs)
+    for pv, load in zip(solar_PV_kW_per_kW_capacity.tolist(), load_hourly_kW.tolist()):
+        np.multiply(solar_capacity_kW, pv, out = solar)
+        np.minimum(solar, load, out = direct)
+        np.subtract(solar, direct, out = surplus)
+        np.subtract(load, direct, out = deficit)
+        # charge the battery with the excess solar
+        np.subtract(battery_capacity_kWh, state_of_charge, out = room)
+        np.divide(room, charge_efficiency, out = room)
+        np.minimum(surplus, battery_power_kW, out = flow)
+        np.minimum(flow, room, out = flow)
+        np.subtract(surplus, flow, out = surplus)
+        state_of_charge += flow * charge_efficiency
+        exported += surplus
+        # discharge the battery into the load the solar did not cover
+        np.minimum(deficit, battery_power_kW, out = flow)
+        np.minimum(flow, state_of_charge * discharge_efficiency, out = flow)
+        state_of_charge -= flow / discharge_efficiency
+        discharged += flow
+        direct += flow
+        behind_meter += direct
+        # the electricity bill of the hour, the income can not make it negative
+        np.multiply(surplus, -generation_rate, out = hour_cost)
+        hour_cost += (load - direct) * behind_meter_price
+        np.maximum(hour_cost, 0, out = hour_cost)
+        cost_ratio += hour_cost / load
+    return {"solar_capacity": solar_capacity_kW,
+            "battery_capacity": battery_capacity_kWh,
+            "battery_power": battery_power_kW,
+            "annual_solar_behind_meter_kWh": behind_meter,
+            "annual_solar_excess_kWh": exported,
+            "annual_battery_discharge_kWh": discharged,
+            "cost_per_kWh": cost_ratio / len(load_hourly_kW)}
+
+
+def battery_economics(solar_PV_kW_per_kW_capacity,
+    load_hourly_kW,
+    solar_capacity_kW,
+    battery_capacity_kWh,
+    battery_power_kW = None,
+    round_trip_efficiency = battery_round_trip_efficiency,
+    behind_meter_price = solar_optimization.behind_meter_price,
+    generation_rate = solar_optimization.generation_rate,
+    cost_capital_solar_PV_per_kW = solar_optimization.cost_capital_solar_PV_per_kW,
+    tax_incentive_solar_PV = solar_optimization.tax_incentive_solar_PV,
+    cost_solar_pv_system_OM_per_kW_per_year = solar_optimization.cost_solar_pv_system_OM_per_kW_per_year,
+    cost_capital_battery_per_kWh = cost_capital_battery_per_kWh,
+    tax_incentive_battery = tax_incentive_battery,
+    cost_battery_OM_per_kWh_per_year = cost_battery_OM_per_kWh_per_year):
+    """
+    Simple payback and cost per kWh of many (solar capacity, battery capacity) pairs, the battery cost included.
+
+    Input Arguments:
+        see simulate_battery() and solar_optimization.simple_payback(),
+        the battery cost assumptions default to the values at the top of this file
+
+    Output :
+        economics : the dict of simulate_battery(), and
+                "behind_meter_savings", "export_income", "annual_total_income" (unit : USD / year),
+                "solar_install_cost", "battery_install_cost" (unit : USD),
+                "maintenance_cost_annual" (unit : USD / year) and "simple_payback" (unit : year, inf for the
+                pairs that never pay back)
+    """
+    economics = simulate_battery(solar_PV_kW_per_kW_capacity, load_hourly_kW,
+                                solar_capacity_kW, battery_capacity_kWh,
+                                battery_power_kW = battery_power_kW,
+                                round_trip_efficiency = round_trip_efficiency,
+                                behind_meter_price = behind_meter_price,
+                                generation_rate = generation_rate)
+    solar_capacity_kW = economics["solar_capacity"]
+    battery_capacity_kWh = economics["battery_capacity"]
+    economics.update(solar_optimization.payback_from_annual_split(economics["annual_solar_behind_meter_kWh"],
+                                                                economics["annual_solar_excess_kWh"],
+                                                                solar_capacity_kW,
+                                                                behind_meter_price, generation_rate,
+                                                                cost_capital_solar_PV_per_kW, tax_incentive_solar_PV,
+                                                                cost_solar_pv_system_OM_per_kW_per_year))
+    # the battery adds its install and maintenance cost
+    economics["battery_install_cost"] = battery_capacity_kWh * cost_capital_battery_per_kWh * (1 - tax_incentive_battery)
+    economics["maintenance_cost_annual"] = economics.pop("solar_maintenance_cost_annual") \
+                                            + cost_battery_OM_per_kWh_per_year * battery_capacity_kWh
+    annual_net_income = economics["annual_total_income"] - economics["maintenance_cost_annual"]
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        economics["simple_payback"] = np.where(annual_net_income > 0,
+                                            (economics["solar_install_cost"] + economics["battery_install_cost"])
+                                                / annual_net_income,
+                                            np.inf)
+    return economics
+
+
+def optimize_PV_battery(solar_PV_kW_per_kW_capacity,
+    load_hourly_kW,
+    solar_capacities_kW = None,
+    battery_capacities_kWh = None,
+    objective = "payback",
+    **parameters):
+    """
+    Joint sizing of the solar PV and the battery on a grid of pairs, all the pairs in one simulation.
+
+    Input Arguments:
+        solar_PV_kW_per_kW_capacity, load_hourly_kW : see simulate_battery()
+
+        solar_capacities_kW : array, default is None (0.5 to 10 kW every 0.25 kW)
+
+        battery_capacities_kWh : array, default is None (0 to 20 kWh every 2.5 kWh), 0 is the solar PV alone
+
+        objective : string (character), "payback" (default) or "cost_per_kWh"
+
+        parameters : the other arguments of battery_economics()
+
+    Output :
+        result : dict, "solar_capacity", "battery_capacity", "simple_payback" and "cost_per_kWh" of the best pair
+                (the pairs that never pay back are not chosen by the payback), and "economics" of every pair
+    """
+    if solar_capacities_kW is None:
+        solar_capacities_kW = np.arange(0.5, 10.001, 0.25)
+    if battery_capacities_kWh is None:
+        battery_capacities_kWh = np.arange(0, 20.001, 2.5)
+    solar_grid, battery_grid = np.meshgrid(np.asarray(solar_capacities_kW, dtype = np.float64),
+                                        np.asarray(battery_capacities_kWh, dtype = np.float64),
+                                        indexing = "ij")
+    economics = battery_economics(solar_PV_kW_per_kW_capacity, load_hourly_kW,
+                                solar_grid.reshape(-1), battery_grid.reshape(-1), **parameters)
+    if objective == "payback":
+        values = economics["simple_payback"]
+    elif objective == "cost_per_kWh":
+        values = economics["cost_per_kWh"]
+    else:
+        raise ValueError("objective must be 'payback' or 'cost_per_kWh'")
+    best = int(np.argmin(values))
+    return {"solar_capacity": economics["solar_capacity"][best],
+            "battery_capacity": economics["battery_capacity"][best],
+            "simple_payback": economics["simple_payback"][best],
+            "cost_per_kWh": economics["cost_per_kWh"][best],
+            "economics": economics}
+
+
+def battery_county(PV_profiles,
+    load_profiles,
+    house_PV_rows,
+    house_load_rows,
+    scale_factors,
+    solar_capacities_kW = None,
+    battery_capacities_kWh = None,
+    **parameters):
+    """
+    Joint sizing of the solar PV and the battery of every house of a county, house by house.
+
+    Input Arguments:
+        PV_profiles, load_profiles, house_PV_rows, house_load_rows, scale_factors :
+                see solar_county_engine.optimize_county()
+
+        solar_capacities_kW, battery_capacities_kWh : see optimize_PV_battery()
+
+        parameters : the other arguments of optimize_PV_battery()
+
+    Output :
+        result : dict, the keys of solar_county_engine.optimization_columns (the simple payback and the cost
+                per kWh of the best pair) and battery_columns, every value is an array with one value for every
+                house in the input order. The houses with a scale factor which is not positive obtain nan.
+        house_errors : list, the error message of every house (None when the house did not fail)
+    """
+    scale_factors = np.asarray(scale_factors, dtype = np.float64).reshape(-1)
+    n_houses = len(scale_factors)
+    result = {column: np.full(n_houses, np.nan)
+                for column in solar_county_engine.optimization_columns + battery_columns}
+    house_errors = [None] * n_houses
+    for j, (PV_row, load_row, scale_factor) in enumerate(zip(house_PV_rows, house_load_rows, scale_factors)):
+        if not (np.isfinite(scale_factor) and scale_factor > 0):
+            continue
+        try:
+            with solar_metrics.stage("battery_sizing"):
+                best = optimize_PV_battery(PV_profiles[PV_row], load_profiles[load_row] / scale_factor,
+                                        solar_capacities_kW = solar_capacities_kW,
+                                        battery_capacities_kWh = battery_capacities_kWh,
+                                        **parameters)
+        except Exception as error:
+            house_errors[j] = repr(error)
+            continue
+        result["solar_capacity"][j] = best["solar_capacity"]
+        result["optimized_payback_year"][j] = best["simple_payback"]
+        result["optimized_cost_per_kWh"][j] = best["cost_per_kWh"]
+        result["battery_capacity"][j] = best["battery_capacity"]
+    return result, house_errors
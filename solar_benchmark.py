@@ -0,0 +1,469 @@
+## This is the offline benchmark and reference check of the solar optimization path
+# Author : Qiancheng Sun
+"""
+Benchmark of the steps of the solar optimization path, on synthetic PV watts responses and
+NREL-like load profiles, so it runs without the API and without the NREL files:
+
+    python solar_benchmark.py            (all the benchmarks and checks)
+    python solar_benchmark.py --quick    (fewer repeats, without the reference GA loop timing)
+
+For every step the per-call latency (median and minimum), the evaluations per second and the
+peak python memory (tracemalloc) are reported.
+
+The golden checks compare the current implementation with the reference implementation,
+the hourly python loop of the original calculate_simple_payback() / calculate_cost_per_kWh()
+and the original extract_element_from_json() extraction, within a relative tolerance.
+The script exits with status 1 when a check fails, so it can guard a faster implementation.
+
+The synthetic responses follow the PVWatts model (solar_pv_performance.py), so the checks of the
+local recomputation are only as good as that model. Check it on the real responses of a cache
+before a losses or DC/AC ratio sweep relies on it:
+
+    python solar_benchmark.py --quick --cache-dir output_dir/PV_watts_cache
+"""
+#%%
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import solar_API
+import solar_API_cache
+import solar_battery
+import solar_capacity_curve
+import solar_county_engine
+import solar_house_optimization
+import solar_optimization
+import solar_pareto
+import solar_pv_performance
+import solar_screening
+
+hours_per_year = 8760
+
+# largest hourly difference between the inverter model and the "ac" of a real PV watts response,
+# relative to the AC nameplate (system_capacity / dc_ac_ratio), the rounding of the response and the
+# small differences of the PVWatts versions are far below it, a wrong inverter model is far above it
+inverter_tolerance = 0.005
+
+
+def synthetic_PV_arrays(seed = 0, module_type = 0, losses = 10, system_capacity = 1):
+    """
+    Hourly arrays of a PV watts v6 response with a daily sun curve, a seasonal amplitude and random clouds.
+    The plane of array irradiance and the cell temperature only depend on the seed, the DC output follows
+    the PVWatts DC model of the module type and the losses (%), and the AC output is
+    solar_pv_performance.inverter_ac() of the DC output, so the arrays are the PVWatts model of one system.
+    """
+    random = np.random.default_rng(seed)
+    hour = np.arange(hours_per_year)
+    day = np.clip(np.sin((hour % 24 - 6) / 12 * np.pi), 0, None)
+    season = 0.75 + 0.25 * np.cos((hour / hours_per_year - 0.47) * 2 * np.pi)
+    poa = 1000 * day * season * random.uniform(0.3, 1.0, hours_per_year)
+    tamb = 10 + 15 * season + random.normal(0, 3, hours_per_year)
+    # the cell is warmer than the air by about 30 degree C at 1000 W / m2
+    tcell = tamb + 0.03 * poa
+    gamma = solar_pv_performance.temperature_coefficient(module_type)
+    dc = float(system_capacity) * poa * (1 + gamma * (tcell - solar_pv_performance.reference_cell_temperature)) \
+            * (1 - losses / 100)
+    return {"ac": solar_pv_performance.inverter_ac(dc, system_capacity),
+            "poa": poa,
+            "dn": day * random.uniform(0, 900, hours_per_year),
+            "df": day * random.uniform(0, 200, hours_per_year),
+            "dc": np.where(dc > 0, dc, 0.0),
+            "tamb": tamb,
+            "tcell": tcell,
+            "wspd": random.uniform(0, 8, hours_per_year)}
+
+
+def synthetic_PV_watts_response(seed = 0, hourly = True):
+    """
+    Json text with the same structure as a PV watts v6 response for a 1 kW system (standard module, 10 % losses),
+    the hourly outputs are synthetic_PV_arrays() rounded like the API, the monthly outputs are their sums.
+    """
+    arrays = synthetic_PV_arrays(seed)
+    arrays = {name: np.round(values, 1 if name in ("tamb", "wspd") else 3) for name, values in arrays.items()}
+    def monthly(name):
+        return np.round(np.add.reduceat(arrays[name], solar_screening.month_start_hours) / 1000, 3)
+    outputs = {"ac_monthly": list(monthly("ac")),
+            "poa_monthly": list(np.round(monthly("poa") / solar_screening.days_per_month, 3)),
+            "solrad_monthly": list(np.round(monthly("poa") / solar_screening.days_per_month, 3)),
+            "dc_monthly": list(monthly("dc")),
+            "ac_annual": float(np.sum(arrays["ac"]) / 1000)}
+    if hourly:
+        outputs.update({name: values.tolist() for name, values in arrays.items()})
+    return json.dumps({"inputs": {"system_capacity": "1", "module_type": "0", "losses": "10",
+                                "timeframe": "hourly" if hourly else "monthly"},
+                    "errors": [], "warnings": [], "version": "1.0.0",
+                    "station_info": {"lat": 39.1, "lon": -84.5, "location": "724297"},
+                    "outputs": outputs})
+
+
+def cached_PV_watts_responses(cache_dir, limit = 3):
+    """
+    Up to limit hourly PV watts responses of the on-disk cache (solar_API_cache.py), the most recently used first.
+
+    Output :
+        responses : list of (cache file name, parsed json response)
+    """
+    responses = []
+    for _, _, path in sorted(solar_API_cache.cache_entries(cache_dir), reverse = True):
+        try:
+            with open(path, "r", encoding = "utf-8") as f:
+                data = json.load(f)
+            outputs = data["outputs"]
+            if len(outputs["ac"]) == hours_per_year and len(outputs["dc"]) == hours_per_year:
+                float(data["inputs"]["system_capacity"])
+                responses.append((os.path.basename(path), data))
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+        if len(responses) >= limit:
+            break
+    return responses
+
+
+def synthetic_load_profile(seed = 0, scale_factor = 1.0):
+    """
+    NREL-like hourly residential load (kW): a base load, a morning and an evening peak,
+    and more consumption in winter and summer.
+    """
+    random = np.random.default_rng(seed + 1000)
+    hour = np.arange(hours_per_year)
+    daily = 0.35 * np.exp(-((hour % 24 - 7) / 1.5) ** 2) + 0.8 * np.exp(-((hour % 24 - 19) / 2.5) ** 2)
+    season = 1 + 0.35 * np.cos(hour / hours_per_year * 4 * np.pi)
+    load = (0.45 + daily) * season * random.uniform(0.8, 1.2, hours_per_year)
+    return load / scale_factor
+
+
+def reference_solar_data_from_json(input_data):
+    """
+    The hourly data frame built with extract_element_from_json(), the original extraction.
+    """
+    return pd.DataFrame({column: np.array(solar_API.extract_element_from_json(input_data, ["outputs", name]),
+                                        dtype = np.float64).reshape(-1)
+                        for name, column, _ in solar_API.hourly_output_schema})
+
+
+def reference_hourly_split(solar_PV_kW_per_kW_capacity, load_hourly_kW, solar_capacity_kW):
+    """
+    The hourly loop of the original calculate_simple_payback() / calculate_cost_per_kWh().
+    """
+    solar_PV_hourly_kW = np.array(solar_PV_kW_per_kW_capacity * solar_capacity_kW).reshape(hours_per_year, 1)
+    load_hourly_kW = np.array(load_hourly_kW).reshape(hours_per_year, 1)
+    solar_excess_hr_kW_list = []
+    solar_behind_meter_hr_kW_list = []
+    for i in range(0, len(load_hourly_kW)):
+        if(solar_PV_hourly_kW[i] >= load_hourly_kW[i]):
+            solar_excess_hr_kW = solar_PV_hourly_kW[i] - load_hourly_kW[i]
+            solar_behind_meter_hr_kW = load_hourly_kW[i]
+        else:
+            solar_excess_hr_kW = 0
+            solar_behind_meter_hr_kW = solar_PV_hourly_kW[i]
+        solar_excess_hr_kW_list.append(solar_excess_hr_kW)
+        solar_behind_meter_hr_kW_list.append(solar_behind_meter_hr_kW)
+    return solar_behind_meter_hr_kW_list, solar_excess_hr_kW_list
+
+
+def reference_simple_payback(solar_PV_kW_per_kW_capacity, load_hourly_kW, solar_capacity_kW):
+    """
+    The original calculate_simple_payback().
+    """
+    solar_behind_meter_hr_kW_list, solar_excess_hr_kW_list = reference_hourly_split(solar_PV_kW_per_kW_capacity,
+                                                                                load_hourly_kW,
+                                                                                solar_capacity_kW)
+    annual_cost_saved_behind_meter_solar = sum(np.array(solar_behind_meter_hr_kW_list, dtype = object) * 0.2)
+    annual_income_excess_solar = sum(np.array(solar_excess_hr_kW_list, dtype = object) * 0.1)
+    annual_total_income = annual_income_excess_solar + annual_cost_saved_behind_meter_solar
+    solar_install_cost = solar_capacity_kW * 1.77 * 1000 * (1 - 0.26)
+    solar_maintenance_cost_annual = 12 * solar_capacity_kW
+    return float(np.squeeze(solar_install_cost / (annual_total_income - solar_maintenance_cost_annual)))
+
+
+def reference_cost_per_kWh(solar_PV_kW_per_kW_capacity, load_hourly_kW, solar_capacity_kW):
+    """
+    The original calculate_cost_per_kWh().
+    """
+    solar_behind_meter_hr_kW_list, solar_excess_hr_kW_list = reference_hourly_split(solar_PV_kW_per_kW_capacity,
+                                                                                load_hourly_kW,
+                                                                                solar_capacity_kW)
+    cost_saved_behind_meter_solar_hr = np.array(solar_behind_meter_hr_kW_list, dtype = object) * 0.2
+    income_excess_solar_hr = np.array(solar_excess_hr_kW_list, dtype = object) * 0.1
+    load_hourly_kW = np.array(load_hourly_kW)
+    cost_per_hr = load_hourly_kW * 0.2 - income_excess_solar_hr - cost_saved_behind_meter_solar_hr.reshape(hours_per_year)
+    cost_per_hr[cost_per_hr < 0] = 0
+    return float(np.mean((cost_per_hr / load_hourly_kW).astype(np.float64)))
+
+
+def measure(function, repeat = 5, n_evaluations = 1):
+    """
+    Run the function repeat times.
+
+    Output :
+        dict with the median and the minimum latency (seconds), the evaluations per second
+        (n_evaluations per call) and the peak python memory of one call (bytes)
+    """
+    # the first call is a warm-up, and is traced for the peak memory
+    tracemalloc.start()
+    function()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    latency = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        latency.append(time.perf_counter() - start)
+    median = float(np.median(latency))
+    return {"median_s": median,
+            "min_s": float(np.min(latency)),
+            "evaluations_per_s": n_evaluations / median if median > 0 else np.inf,
+            "peak_memory_MB": peak_memory / 1024 ** 2}
+
+
+def golden_checks(n_houses = 3, rtol = 1e-9, cache_dir = None):
+    """
+    Compare the current implementation with the reference implementation.
+    With cache_dir, the inverter model is also checked on the hourly PV watts responses of the cache.
+
+    Output :
+        checks : list of (name, passed, maximum relative difference)
+    """
+    checks = []
+    def check(name, current, reference, tolerance = rtol):
+        current = np.asarray(current, dtype = np.float64)
+        reference = np.asarray(reference, dtype = np.float64)
+        difference = np.abs(current - reference) / np.maximum(np.abs(reference), 1e-12)
+        difference = float(np.max(difference)) if difference.size else 0.0
+        checks.append((name, difference <= tolerance, difference))
+    def check_nameplate(name, current, reference, system_capacity, tolerance,
+        dc_ac_ratio = solar_pv_performance.default_dc_ac_ratio):
+        # hourly power differences relative to the AC nameplate (W), the relative difference of every hour
+        # means nothing at dawn and dusk
+        ac_nameplate = float(system_capacity) * 1000 / float(dc_ac_ratio)
+        difference = float(np.max(np.abs(np.asarray(current, dtype = np.float64)
+                                        - np.asarray(reference, dtype = np.float64)))) / ac_nameplate
+        checks.append((name, difference <= tolerance, difference))
+
+    # the inverter model on the real responses of the cache, the losses sweep of the pipeline relies on it
+    for file_name, data in ([] if cache_dir is None else cached_PV_watts_responses(cache_dir)):
+        inputs = data["inputs"]
+        dc_ac_ratio = float(inputs.get("dc_ac_ratio", solar_pv_performance.default_dc_ac_ratio))
+        check_nameplate("inverter_ac, cached response " + file_name[:12],
+                        solar_pv_performance.inverter_ac(data["outputs"]["dc"], inputs["system_capacity"],
+                                                        dc_ac_ratio = dc_ac_ratio,
+                                                        inv_eff = float(inputs.get("inv_eff",
+                                                                        solar_pv_performance.default_inv_eff))),
+                        data["outputs"]["ac"], inputs["system_capacity"], inverter_tolerance, dc_ac_ratio)
+
+    for seed in range(n_houses):
+        text = synthetic_PV_watts_response(seed)
+        data = json.loads(text)
+        with tempfile.TemporaryDirectory() as output_dir:
+            current = solar_API.solar_data_from_json(data, output_dir, time_switch = False)
+        reference = reference_solar_data_from_json(data)
+        check("solar_data_from_json (house %d)" % seed, current.to_numpy(), reference.to_numpy())
+        # the streaming decoder keeps float32
+        arrays = solar_API.decode_hourly_outputs([text.encode("utf-8")])
+        check("decode_hourly_outputs (house %d)" % seed, arrays["ac"], reference["Hourly AC System Output (W)"], 1e-6)
+        # the inverter model gives the AC output of the response, and another module type and other losses
+        # recomputed from the response give the response of that system (the rounding of the response is 0.5 mW)
+        check_nameplate("inverter_ac (house %d)" % seed,
+                        solar_pv_performance.inverter_ac(arrays["dc"], 1), arrays["ac"], 1, 1e-5)
+        design = solar_pv_performance.recompute_PV_output(arrays, data["inputs"], module_type = 1, losses = 14)
+        design_reference = synthetic_PV_arrays(seed, module_type = 1, losses = 14)
+        check_nameplate("recompute_PV_output, premium module and 14 %% losses (house %d)" % seed,
+                        np.concatenate([design["dc"], design["ac"]]),
+                        np.concatenate([design_reference["dc"], design_reference["ac"]]), 1, 1e-5)
+
+        solar_PV_kW_per_kW_capacity = reference["Hourly AC System Output (W)"].to_numpy() / 1000
+        load_hourly_kW = synthetic_load_profile(seed, scale_factor = 1 + seed * 0.4)
+        capacities = np.array([0.5, 2.0, 4.5, 7.25, 10.0])
+        curve = solar_capacity_curve.capacity_breakpoints(solar_PV_kW_per_kW_capacity, load_hourly_kW)
+        payback = [reference_simple_payback(solar_PV_kW_per_kW_capacity, load_hourly_kW, c) for c in capacities]
+        cost = [reference_cost_per_kWh(solar_PV_kW_per_kW_capacity, load_hourly_kW, c) for c in capacities]
+        check("simple_payback (house %d)" % seed,
+            solar_optimization.simple_payback(solar_PV_kW_per_kW_capacity, load_hourly_kW, capacities), payback)
+        check("cost_per_kWh (house %d)" % seed,
+            solar_optimization.cost_per_kWh(solar_PV_kW_per_kW_capacity, load_hourly_kW, capacities), cost)
+        # more capacities than one chunk of the batched evaluation, against one capacity at a time
+        many_capacities = np.linspace(0.5, 10, 3 * solar_optimization.capacity_chunk_size + 5)
+        check("simple_payback, chunked (house %d)" % seed,
+            solar_optimization.simple_payback(solar_PV_kW_per_kW_capacity, load_hourly_kW, many_capacities),
+            [solar_optimization.simple_payback(solar_PV_kW_per_kW_capacity, load_hourly_kW, c) for c in many_capacities])
+        check("cost_per_kWh, chunked (house %d)" % seed,
+            solar_optimization.cost_per_kWh(solar_PV_kW_per_kW_capacity, load_hourly_kW, many_capacities),
+            [solar_optimization.cost_per_kWh(solar_PV_kW_per_kW_capacity, load_hourly_kW, c) for c in many_capacities])
+        check("curve simple_payback (house %d)" % seed, solar_capacity_curve.simple_payback(curve, capacities), payback)
+        check("curve cost_per_kWh (house %d)" % seed, solar_capacity_curve.cost_per_kWh(curve, capacities), cost)
+        economics = solar_optimization.solar_economics(solar_PV_kW_per_kW_capacity, load_hourly_kW, capacities)
+        check("solar_economics (house %d)" % seed,
+            np.concatenate([economics["simple_payback"], economics["cost_per_kWh"]]), payback + cost)
+        # without a battery the dispatch simulation is the solar PV alone
+        battery = solar_battery.battery_economics(solar_PV_kW_per_kW_capacity, load_hourly_kW, capacities, 0.0)
+        check("battery_economics, no battery (house %d)" % seed,
+            np.concatenate([battery["simple_payback"], battery["cost_per_kWh"]]), payback + cost, 1e-7)
+
+        # the exact optimizer is not worse than any capacity of a grid inside the stage 1 boundary,
+        # and its value is the reference value at its capacity
+        result = solar_house_optimization.optimize_house_capacity(solar_PV_kW_per_kW_capacity, load_hourly_kW)
+        boundary = solar_house_optimization.payback_boundary(load_hourly_kW)
+        grid = np.linspace(boundary[0, 0], boundary[0, 1], 201)
+        grid_payback = solar_optimization.simple_payback(solar_PV_kW_per_kW_capacity, load_hourly_kW, grid)
+        checks.append(("optimized payback <= grid minimum (house %d)" % seed,
+                    result["optimized_payback_year"] <= np.min(grid_payback) * (1 + rtol),
+                    float(max(result["optimized_payback_year"] / np.min(grid_payback) - 1, 0))))
+        check("optimized cost_per_kWh (house %d)" % seed, result["optimized_cost_per_kWh"],
+            reference_cost_per_kWh(solar_PV_kW_per_kW_capacity, load_hourly_kW, result["solar_capacity"][0]))
+        # with the default window the reported capacity is the stage 1 capacity
+        payback_capacity = solar_capacity_curve.minimize_on_curve(curve, "payback", *boundary[0])[0]
+        check("stage 2 capacity is the stage 1 capacity (house %d)" % seed, result["solar_capacity"][0],
+            payback_capacity, 1e-9)
+        # with a window the stage 2 capacity is the minimum cost per kWh of a grid around the stage 1 capacity
+        window_result = solar_house_optimization.optimize_house_capacity(solar_PV_kW_per_kW_capacity, load_hourly_kW,
+                                                                        cost_window_kW = 0.5)
+        boundary_2 = solar_house_optimization.cost_boundary(payback_capacity, boundary, 0.5)
+        grid_2 = np.linspace(boundary_2[0, 0], boundary_2[0, 1], 201)
+        grid_cost = solar_optimization.cost_per_kWh(solar_PV_kW_per_kW_capacity, load_hourly_kW, grid_2)
+        checks.append(("stage 2 inside the cost boundary, cost <= grid minimum (house %d)" % seed,
+                    bool(boundary_2[0, 0] <= window_result["solar_capacity"][0] <= boundary_2[0, 1])
+                        and window_result["optimized_cost_per_kWh"] <= np.min(grid_cost) * (1 + rtol),
+                    float(max(window_result["optimized_cost_per_kWh"] / np.min(grid_cost) - 1, 0))))
+
+        # the group engine obtains the same result as the single house optimization
+        county = solar_county_engine.optimize_county(solar_PV_kW_per_kW_capacity[np.newaxis],
+                                                    (load_hourly_kW * (1 + seed * 0.4))[np.newaxis],
+                                                    [0], [0], [1 + seed * 0.4])
+        check("optimize_county (house %d)" % seed,
+            [county[column][0] for column in solar_county_engine.optimization_columns],
+            [result["solar_capacity"][0], result["optimized_payback_year"], result["optimized_cost_per_kWh"]], 1e-7)
+        # the front starts at the stage 1 payback and every capacity is inside the stage 1 boundary
+        pareto = solar_pareto.pareto_county(solar_PV_kW_per_kW_capacity[np.newaxis],
+                                            (load_hourly_kW * (1 + seed * 0.4))[np.newaxis],
+                                            [0], [0], [1 + seed * 0.4])
+        front = pareto["fronts"][0]
+        check("pareto minimum payback (house %d)" % seed, pareto["optimized_payback_year"][0],
+            result["optimized_payback_year"], 1e-7)
+        checks.append(("pareto front inside the stage 1 boundary, at most 200 points (house %d)" % seed,
+                    bool(np.all(front["solar_capacity"] >= boundary[0, 0] * (1 - 1e-6))
+                        and np.all(front["solar_capacity"] <= boundary[0, 1] * (1 + 1e-6))
+                        and len(front["payback"]) <= 200),
+                    float(len(front["payback"]))))
+    return checks
+
+
+def benchmarks(repeat = 5, quick = False):
+    """
+    Output :
+        results : list of (name, measure() result)
+    """
+    text = synthetic_PV_watts_response(0)
+    data = json.loads(text)
+    solar_PV_kW_per_kW_capacity = np.array(data["outputs"]["ac"]) / 1000
+    load_hourly_kW = synthetic_load_profile(0)
+    population = np.linspace(0.5, 10, 150)
+    curve = solar_capacity_curve.capacity_breakpoints(solar_PV_kW_per_kW_capacity, load_hourly_kW)
+
+    results = []
+    results.append(("json.loads (hourly response)", measure(lambda: json.loads(text), repeat)))
+    results.append(("extract_element_from_json (8 hourly outputs)",
+                    measure(lambda: reference_solar_data_from_json(data), repeat)))
+    # including the csv file written by solar_data_from_json()
+    with tempfile.TemporaryDirectory() as output_dir:
+        results.append(("solar_data_from_json (hourly, with csv)",
+                        measure(lambda: solar_API.solar_data_from_json(data, output_dir, time_switch = False), repeat)))
+    results.append(("decode_hourly_outputs (hourly)",
+                    measure(lambda: solar_API.decode_hourly_outputs([text.encode("utf-8")]), repeat)))
+    body = text.encode("utf-8")
+    # the chunks of response.iter_content(65536)
+    chunks = [body[i:i + 65536] for i in range(0, len(body), 65536)]
+    results.append(("decode_hourly_outputs (64 KiB chunks)",
+                    measure(lambda: solar_API.decode_hourly_outputs(chunks), repeat)))
+    if not quick:
+        results.append(("reference calculate_simple_payback (loop)",
+                        measure(lambda: reference_simple_payback(solar_PV_kW_per_kW_capacity, load_hourly_kW, 5.0),
+                                max(1, repeat // 5))))
+        results.append(("reference calculate_cost_per_kWh (loop)",
+                        measure(lambda: reference_cost_per_kWh(solar_PV_kW_per_kW_capacity, load_hourly_kW, 5.0),
+                                max(1, repeat // 5))))
+    results.append(("simple_payback (1 capacity)",
+                    measure(lambda: solar_optimization.simple_payback(solar_PV_kW_per_kW_capacity, load_hourly_kW, 5.0),
+                            repeat)))
+    results.append(("simple_payback (150 capacities)",
+                    measure(lambda: solar_optimization.simple_payback(solar_PV_kW_per_kW_capacity, load_hourly_kW,
+                                                                    population), repeat, len(population))))
+    results.append(("cost_per_kWh (150 capacities)",
+                    measure(lambda: solar_optimization.cost_per_kWh(solar_PV_kW_per_kW_capacity, load_hourly_kW,
+                                                                    population), repeat, len(population))))
+    # the same 150 capacities one call at a time, the batched calls above must be faster
+    results.append(("simple_payback (150 capacities, loop)",
+                    measure(lambda: [solar_optimization.simple_payback(solar_PV_kW_per_kW_capacity, load_hourly_kW,
+                                                                    capacity) for capacity in population],
+                            repeat, len(population))))
+    results.append(("cost_per_kWh (150 capacities, loop)",
+                    measure(lambda: [solar_optimization.cost_per_kWh(solar_PV_kW_per_kW_capacity, load_hourly_kW,
+                                                                    capacity) for capacity in population],
+                            repeat, len(population))))
+    results.append(("solar_economics (150 capacities)",
+                    measure(lambda: solar_optimization.solar_economics(solar_PV_kW_per_kW_capacity, load_hourly_kW,
+                                                                    population), repeat, len(population))))
+    results.append(("simulate_battery (150 PV x battery pairs)",
+                    measure(lambda: solar_battery.simulate_battery(solar_PV_kW_per_kW_capacity, load_hourly_kW,
+                                                                population, 10.0), repeat, len(population))))
+    results.append(("capacity_breakpoints",
+                    measure(lambda: solar_capacity_curve.capacity_breakpoints(solar_PV_kW_per_kW_capacity,
+                                                                            load_hourly_kW), repeat)))
+    results.append(("curve simple_payback (150 capacities)",
+                    measure(lambda: solar_capacity_curve.simple_payback(curve, population), repeat, len(population))))
+    results.append(("optimize_house_capacity (exact)",
+                    measure(lambda: solar_house_optimization.optimize_house_capacity(solar_PV_kW_per_kW_capacity,
+                                                                                    load_hourly_kW), repeat)))
+    n_houses = 1000
+    scale_factors = np.random.default_rng(0).uniform(0.5, 2.5, n_houses)
+    results.append(("optimize_county (exact, 1000 houses)",
+                    measure(lambda: solar_county_engine.optimize_county(solar_PV_kW_per_kW_capacity[np.newaxis],
+                                                                        load_hourly_kW[np.newaxis],
+                                                                        np.zeros(n_houses, dtype = int),
+                                                                        np.zeros(n_houses, dtype = int),
+                                                                        scale_factors),
+                            max(1, repeat // 2), n_houses)))
+    if not quick:
+        results.append(("optimize_house_capacity (ga)",
+                        measure(lambda: solar_house_optimization.optimize_house_capacity(solar_PV_kW_per_kW_capacity,
+                                                                                        load_hourly_kW,
+                                                                                        optimizer_backend = "ga"),
+                                1)))
+    return results
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Offline benchmark of the solar optimization path")
+    parser.add_argument("--repeat", type = int, default = 5, help = "number of timed calls of every step")
+    parser.add_argument("--quick", action = "store_true", help = "skip the slow reference loop and GA timings")
+    parser.add_argument("--houses", type = int, default = 3, help = "number of synthetic houses of the golden checks")
+    parser.add_argument("--cache-dir", default = None,
+                        help = "PV watts cache directory, the inverter model is checked on its hourly responses")
+    arguments = parser.parse_args(argv)
+
+    print("%-48s %12s %12s %14s %10s" % ("step", "median (ms)", "min (ms)", "evals / s", "peak (MB)"))
+    for name, result in benchmarks(arguments.repeat, arguments.quick):
+        print("%-48s %12.3f %12.3f %14.1f %10.2f" % (name, result["median_s"] * 1000, result["min_s"] * 1000,
+                                                    result["evaluations_per_s"], result["peak_memory_MB"]))
+    print()
+    failed = 0
+    if arguments.cache_dir is not None and not cached_PV_watts_responses(arguments.cache_dir, 1):
+        print("no hourly PV watts response in", arguments.cache_dir + ", the inverter model is only checked",
+            "on the synthetic responses")
+    for name, passed, difference in golden_checks(arguments.houses, cache_dir = arguments.cache_dir):
+        print("%-6s %-48s max relative difference %.3g" % ("ok" if passed else "FAILED", name, difference))
+        failed += not passed
+    if failed:
+        print(failed, "golden checks failed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,410 @@
+## This is the exact optimizer of the solar capacity based on the sorted hourly breakpoints
+# Author : Qiancheng Sun
+"""
+For one house, with the hourly solar PV output per kW pv_h and the hourly load L_h,
+the solar used behind the meter for the capacity c is
+
+    behind_meter(c) = sum( min(c * pv_h, L_h) )
+
+Every hour changes from "all the solar is used" to "the load is fully covered" at the
+breakpoint t_h = L_h / pv_h. After sorting the hours by t_h once (O(n log n)):
+
+    behind_meter(c) = sum(L_h for t_h <= c) + c * sum(pv_h for t_h > c)
+    excess(c) = c * sum(pv_h) - behind_meter(c)
+    cost_per_kWh(c) = behind_meter_price / n * sum(1 - c * pv_h / L_h for t_h > c)
+
+so both objectives of the pipeline can be evaluated for any capacity with prefix sums.
+The curve only depends on the hourly PV and load of the house, not on the prices or the cost
+assumptions, so it is built once per house, saved with save_capacity_curves(), and any
+what-if query (capacity, behind_meter_price, generation_rate, cost_capital_solar_PV_per_kW,
+tax_incentive_solar_PV, ...) is answered from it without the 8760 hourly arrays.
+The houses sharing one PV profile and one load profile save one curve and their scale factors.
+Between two breakpoints the simple payback is monotone and the cost per kWh is linear,
+so the exact minimum inside the boundary is at one of the breakpoints or at the boundary.
+The hours without solar (pv_h <= 0) never reach their breakpoint, t_h = inf.
+
+A capacity whose annual income does not cover the maintenance cost never pays back,
+its simple payback is inf (the GA would see a negative payback over there).
+"""
+#%%
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+import solar_metrics
+import solar_optimization
+
+
+def capacity_breakpoints(solar_PV_kW_per_kW_capacity, load_hourly_kW):
+    """
+    Sort the hours of one house by their breakpoint and build the prefix sums.
+
+    Input Arguments:
+        solar_PV_kW_per_kW_capacity : array of 8760 values (unit : kW), the hourly AC output per kW capacity
+        load_hourly_kW : array of 8760 values (unit : kW), the hourly electric consumption (must be positive)
+
+    Output :
+        curve : dict
+            "breakpoint" : sorted L_h / pv_h of the m hours with solar (pv_h > 0)
+            "load_prefix" : m + 1 values, load_prefix[k] = sum of L_h of the first k sorted hours
+            "PV_suffix" : m + 1 values, PV_suffix[k] = sum of pv_h of the sorted hours from k
+                          and of the hours without solar
+            "ratio_suffix" : m + 1 values, ratio_suffix[k] = sum of pv_h / L_h of the sorted hours from k
+                          and of the hours without solar
+            "PV_total" : sum of pv_h
+            "n_hours" : number of hours
+
+    Only the hours with solar are kept (about half of the year), the hours without solar
+    never reach their breakpoint and are summed into the last value of the suffix sums.
+    """
+    solar_PV_kW_per_kW_capacity = np.asarray(solar_PV_kW_per_kW_capacity, dtype = np.float64).reshape(-1)
+    load_hourly_kW = np.asarray(load_hourly_kW, dtype = np.float64).reshape(-1)
+    if len(solar_PV_kW_per_kW_capacity) != len(load_hourly_kW):
+        raise ValueError("the solar PV output and the load must have the same number of hours")
+    if np.any(load_hourly_kW <= 0):
+        raise ValueError("the hourly load must be positive")
+    with_solar = solar_PV_kW_per_kW_capacity > 0
+    # the hours without solar, which are always below their breakpoint
+    PV_night = solar_PV_kW_per_kW_capacity[~with_solar]
+    tail = np.array([np.sum(PV_night), np.sum(PV_night / load_hourly_kW[~with_solar])])
+    PV_day = solar_PV_kW_per_kW_capacity[with_solar]
+    load_day = load_hourly_kW[with_solar]
+    breakpoints = load_day / PV_day
+    order = np.argsort(breakpoints, kind = "stable")
+    load_sorted = load_day[order]
+    PV_sorted = PV_day[order]
+    ratio_sorted = PV_sorted / load_sorted
+    curve = {"breakpoint": breakpoints[order],
+            "load_prefix": np.concatenate([[0.0], np.cumsum(load_sorted)]),
+            "PV_suffix": np.concatenate([np.cumsum(PV_sorted[::-1])[::-1], [0.0]]) + tail[0],
+            "ratio_suffix": np.concatenate([np.cumsum(ratio_sorted[::-1])[::-1], [0.0]]) + tail[1],
+            "PV_total": float(np.sum(solar_PV_kW_per_kW_capacity)),
+            "n_hours": len(load_hourly_kW)}
+    return curve
+
+
+def scale_capacity_curve(curve, scale_factor):
+    """
+    The curve of the load load_hourly_kW / scale_factor, from the curve of load_hourly_kW.
+
+    Dividing the load by the scale factor divides every breakpoint and the load prefix sums
+    by the scale factor and multiplies the pv_h / L_h suffix sums by it, so the houses
+    sharing one load profile and one PV profile do not need to sort the hours again.
+    """
+    return {"breakpoint": curve["breakpoint"] / scale_factor,
+            "load_prefix": curve["load_prefix"] / scale_factor,
+            "PV_suffix": curve["PV_suffix"],
+            "ratio_suffix": curve["ratio_suffix"] * scale_factor,
+            "PV_total": curve["PV_total"],
+            "n_hours": curve["n_hours"]}
+
+
+class scaled_capacity_curves(Mapping):
+    """
+    The curves of many houses as a dict address -> curve, from the curves of their groups
+    (the houses sharing one PV profile and one load profile, see solar_county_engine.py).
+    The curve of a house is scale_capacity_curve() of its group curve, built only when it is read,
+    so the houses of one group share the arrays of one curve.
+
+    Input Arguments:
+        addresses : list, the key of every house
+
+        group_curves : list of the curves obtained by capacity_breakpoints()
+
+        curve_index : array with one value for every house, the position of its curve in group_curves,
+                the houses with a negative value have no curve and are left out
+
+        scale_factors : array with one value for every house
+    """
+    def __init__(self, addresses, group_curves, curve_index, scale_factors):
+        curve_index = np.asarray(curve_index, dtype = np.int64).reshape(-1)
+        scale_factors = np.asarray(scale_factors, dtype = np.float64).reshape(-1)
+        with_curve = curve_index >= 0
+        self.addresses = [address for address, keep in zip(addresses, with_curve) if keep]
+        self.group_curves = list(group_curves)
+        self.curve_index = curve_index[with_curve]
+        self.scale_factors = scale_factors[with_curve]
+        self.positions = {address: j for j, address in enumerate(self.addresses)}
+
+    def __getitem__(self, address):
+        j = self.positions[address]
+        if self.scale_factors[j] == 1:
+            return self.group_curves[self.curve_index[j]]
+        return scale_capacity_curve(self.group_curves[self.curve_index[j]], self.scale_factors[j])
+
+    def __iter__(self):
+        return iter(self.addresses)
+
+    def __len__(self):
+        return len(self.addresses)
+
+
+def annual_solar_split(curve, solar_capacity_kW):
+    """
+    Annual solar behind the meter and annual solar excess (unit : kWh) from the curve,
+    the same result as solar_optimization.annual_solar_split() in O(log n) for every capacity.
+
+    Input Arguments:
+        curve : dict, obtained by capacity_breakpoints()
+        solar_capacity_kW : numeric or array of capacities (unit : kW)
+    """
+    solar_capacity_kW = np.asarray(solar_capacity_kW, dtype = np.float64)
+    # number of hours whose load is fully covered
+    k = np.searchsorted(curve["breakpoint"], solar_capacity_kW, side = "right")
+    annual_solar_behind_meter_kW = curve["load_prefix"][k] + solar_capacity_kW * curve["PV_suffix"][k]
+    annual_solar_excess_kW = solar_capacity_kW * curve["PV_total"] - annual_solar_behind_meter_kW
+    return annual_solar_behind_meter_kW, annual_solar_excess_kW
+
+
+def simple_payback(curve, solar_capacity_kW,
+    behind_meter_price = solar_optimization.behind_meter_price,
+    generation_rate = solar_optimization.generation_rate,
+    cost_capital_solar_PV_per_kW = solar_optimization.cost_capital_solar_PV_per_kW,
+    tax_incentive_solar_PV = solar_optimization.tax_incentive_solar_PV,
+    cost_solar_pv_system_OM_per_kW_per_year = solar_optimization.cost_solar_pv_system_OM_per_kW_per_year):
+    """
+    Simple payback (unit : year) from the curve, see solar_optimization.simple_payback() for the arguments.
+    The capacities that never pay back (annual income <= maintenance cost) obtain inf.
+    """
+    solar_capacity_kW = np.asarray(solar_capacity_kW, dtype = np.float64)
+    solar_metrics.count("objective_evaluations", solar_capacity_kW.size)
+    annual_solar_behind_meter_kW, annual_solar_excess_kW = annual_solar_split(curve, solar_capacity_kW)
+    annual_net_income = annual_solar_behind_meter_kW * behind_meter_price \
+                        + annual_solar_excess_kW * generation_rate \
+                            - cost_solar_pv_system_OM_per_kW_per_year * solar_capacity_kW
+    solar_install_cost = solar_capacity_kW * cost_capital_solar_PV_per_kW * (1 - tax_incentive_solar_PV)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        payback = np.where(annual_net_income > 0, solar_install_cost / annual_net_income, np.inf)
+    return payback
+
+
+def cost_per_kWh(curve, solar_capacity_kW,
+    behind_meter_price = solar_optimization.behind_meter_price,
+    generation_rate = solar_optimization.generation_rate):
+    """
+    Cost per kWh from the curve, see solar_optimization.cost_per_kWh() for the arguments.
+    When the solar covers the load of one hour, the excess income makes the cost of that hour negative,
+    which is cut to 0, so generation_rate does not change the result (it must not be negative).
+    """
+    solar_capacity_kW = np.asarray(solar_capacity_kW, dtype = np.float64)
+    solar_metrics.count("objective_evaluations", solar_capacity_kW.size)
+    k = np.searchsorted(curve["breakpoint"], solar_capacity_kW, side = "right")
+    n_hours = curve["n_hours"]
+    return behind_meter_price / n_hours * ((n_hours - k) - solar_capacity_kW * curve["ratio_suffix"][k])
+
+
+def solar_economics(curve, solar_capacity_kW,
+    behind_meter_price = solar_optimization.behind_meter_price,
+    generation_rate = solar_optimization.generation_rate,
+    cost_capital_solar_PV_per_kW = solar_optimization.cost_capital_solar_PV_per_kW,
+    tax_incentive_solar_PV = solar_optimization.tax_incentive_solar_PV,
+    cost_solar_pv_system_OM_per_kW_per_year = solar_optimization.cost_solar_pv_system_OM_per_kW_per_year):
+    """
+    Every value of solar_optimization.solar_economics() from the curve, with one search of the breakpoints
+    for the simple payback and the cost per kWh. The capacities that never pay back obtain inf, as simple_payback().
+    """
+    solar_capacity_kW = np.asarray(solar_capacity_kW, dtype = np.float64)
+    solar_metrics.count("objective_evaluations", solar_capacity_kW.size)
+    k = np.searchsorted(curve["breakpoint"], solar_capacity_kW, side = "right")
+    annual_solar_behind_meter_kW = curve["load_prefix"][k] + solar_capacity_kW * curve["PV_suffix"][k]
+    annual_solar_excess_kW = solar_capacity_kW * curve["PV_total"] - annual_solar_behind_meter_kW
+    economics = {"solar_capacity": solar_capacity_kW,
+                "annual_solar_behind_meter_kWh": annual_solar_behind_meter_kW,
+                "annual_solar_excess_kWh": annual_solar_excess_kW}
+    economics.update(solar_optimization.payback_from_annual_split(annual_solar_behind_meter_kW,
+                                                                annual_solar_excess_kW, solar_capacity_kW,
+                                                                behind_meter_price, generation_rate,
+                                                                cost_capital_solar_PV_per_kW, tax_incentive_solar_PV,
+                                                                cost_solar_pv_system_OM_per_kW_per_year))
+    n_hours = curve["n_hours"]
+    economics["cost_per_kWh"] = behind_meter_price / n_hours * ((n_hours - k) - solar_capacity_kW * curve["ratio_suffix"][k])
+    return economics
+
+
+def candidate_capacities(curve, lower, upper):
+    """
+    The capacities where the exact minimum can be: the boundary and the breakpoints inside it.
+    """
+    breakpoints = curve["breakpoint"]
+    inside = breakpoints[(breakpoints > lower) & (breakpoints < upper)]
+    return np.unique(np.concatenate([[lower], inside, [upper]]))
+
+
+def minimize_on_curve(curve, objective, lower, upper, **prices):
+    """
+    Exact minimum of the objective between lower and upper.
+
+    Input Arguments:
+        curve : dict, obtained by capacity_breakpoints()
+        objective : string (character), "payback" or "cost_per_kWh"
+        lower, upper : numeric (unit : kW), the boundary of the solar capacity
+        prices : the price and cost arguments of simple_payback() / cost_per_kWh()
+
+    Output :
+        solar_capacity_kW : numeric, the smallest capacity that obtains the minimum
+        value : numeric, the minimum objective value
+    """
+    if objective == "payback":
+        function = simple_payback
+    elif objective == "cost_per_kWh":
+        function = cost_per_kWh
+    else:
+        raise ValueError("objective must be 'payback' or 'cost_per_kWh'")
+    capacities = candidate_capacities(curve, float(lower), float(upper))
+    values = function(curve, capacities, **prices)
+    # np.argmin returns the first minimum, which is the smallest capacity
+    best = int(np.argmin(values))
+    return float(capacities[best]), float(values[best])
+
+
+class breakpoint_optimizer:
+    """
+    Exact and deterministic replacement of the geneticalgorithm for one solar capacity stage,
+    with the same interface as the GA (run(), report, output_dict).
+
+    Input Arguments:
+        objective : string (character), "payback" or "cost_per_kWh"
+
+        solar_PV_kW_per_kW_capacity, load_hourly_kW : see capacity_breakpoints()
+
+        variable_boundaries : np.array([[lower, upper]]), the boundary of the solar capacity
+
+        curve : dict, default is None
+                the curve obtained by capacity_breakpoints(), to reuse it between the two stages
+
+        prices : the price and cost arguments of simple_payback() / cost_per_kWh()
+
+    Output (after run()) :
+        report : list, the minimum objective value (one value, the optimizer has no iterations)
+        output_dict : dict, {"variable": np.array([best capacity]), "function": minimum objective value}
+    """
+    def __init__(self, objective, solar_PV_kW_per_kW_capacity, load_hourly_kW, variable_boundaries,
+                curve = None, **prices):
+        self.objective = objective
+        if curve is None:
+            curve = capacity_breakpoints(solar_PV_kW_per_kW_capacity, load_hourly_kW)
+        self.curve = curve
+        self.var_bound = np.array(variable_boundaries, dtype = np.float64).reshape(2)
+        self.prices = prices
+
+    def run(self):
+        solar_capacity_kW, value = minimize_on_curve(self.curve, self.objective,
+                                                    self.var_bound[0], self.var_bound[1], **self.prices)
+        self.report = [value]
+        self.output_dict = {"variable": np.array([solar_capacity_kW]), "function": value}
+
+
+def save_capacity_curves(file_path, curves):
+    """
+    Save the curves of many houses into one compressed numpy archive.
+
+    Input Arguments:
+        file_path : string (character), the .npz file
+        curves : dict, address -> curve obtained by capacity_breakpoints(), or scaled_capacity_curves
+
+    Every group curve is saved once, and every house only saves the position of its group curve
+    ("curve_index") and its scale factor, so a house costs 16 bytes instead of 4 arrays of about
+    4400 float64 values. The curves of a dict are groups of their own with the scale factor 1
+    (the houses holding the same curve object share it).
+    The arrays of all the group curves are concatenated, "offsets" tells where every group starts.
+    """
+    if isinstance(curves, scaled_capacity_curves):
+        addresses = curves.addresses
+        group_curves = curves.group_curves
+        curve_index = curves.curve_index
+        scale_factors = curves.scale_factors
+    else:
+        addresses = list(curves)
+        group_curves = []
+        group_positions = {}
+        curve_index = np.zeros(len(addresses), dtype = np.int64)
+        for j, address in enumerate(addresses):
+            curve = curves[address]
+            if id(curve) not in group_positions:
+                group_positions[id(curve)] = len(group_curves)
+                group_curves.append(curve)
+            curve_index[j] = group_positions[id(curve)]
+        scale_factors = np.ones(len(addresses))
+    sizes = np.array([len(curve["breakpoint"]) for curve in group_curves], dtype = np.int64)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    def concatenate(name):
+        if not group_curves:
+            return np.zeros(0)
+        return np.concatenate([curve[name] for curve in group_curves])
+    np.savez_compressed(file_path,
+                        Address = np.array(addresses, dtype = str),
+                        curve_index = np.asarray(curve_index, dtype = np.int64),
+                        scale_factor = np.asarray(scale_factors, dtype = np.float64),
+                        offsets = offsets,
+                        breakpoint = concatenate("breakpoint"),
+                        load_prefix = concatenate("load_prefix"),
+                        PV_suffix = concatenate("PV_suffix"),
+                        ratio_suffix = concatenate("ratio_suffix"),
+                        PV_total = np.array([curve["PV_total"] for curve in group_curves]),
+                        n_hours = np.array([curve["n_hours"] for curve in group_curves], dtype = np.int64))
+
+
+def load_capacity_curves(file_paths):
+    """
+    Read the curves saved by save_capacity_curves().
+
+    Input Arguments:
+        file_paths : string (character) or list of the .npz files
+
+    Output :
+        curves : scaled_capacity_curves, address -> curve, the arrays of every group curve
+                are views of the saved arrays, the curve of a house is scaled when it is read
+    """
+    if isinstance(file_paths, str):
+        file_paths = [file_paths]
+    addresses = []
+    group_curves = []
+    curve_index = []
+    scale_factors = []
+    for file_path in file_paths:
+        with np.load(file_path) as archive:
+            data = {name: archive[name] for name in archive.files}
+        offsets = data["offsets"]
+        first_group = len(group_curves)
+        for i in range(len(offsets) - 1):
+            start, end = offsets[i], offsets[i + 1]
+            # the prefix / suffix sums have one more value than the breakpoints for every group
+            group_curves.append({"breakpoint": data["breakpoint"][start:end],
+                                "load_prefix": data["load_prefix"][start + i:end + i + 1],
+                                "PV_suffix": data["PV_suffix"][start + i:end + i + 1],
+                                "ratio_suffix": data["ratio_suffix"][start + i:end + i + 1],
+                                "PV_total": float(data["PV_total"][i]),
+                                "n_hours": int(data["n_hours"][i])})
+        addresses.extend(str(address) for address in data["Address"])
+        curve_index.append(data["curve_index"] + first_group)
+        scale_factors.append(data["scale_factor"])
+    if not addresses:
+        return scaled_capacity_curves([], group_curves, np.zeros(0), np.zeros(0))
+    return scaled_capacity_curves(addresses, group_curves, np.concatenate(curve_index), np.concatenate(scale_factors))
+
+
+def query_capacity_curves(curves, solar_capacity_kW, **prices):
+    """
+    What-if query for many houses from their curves, without the hourly arrays.
+
+    Input Arguments:
+        curves : dict, address -> curve, or scaled_capacity_curves (every curve is scaled when it is queried)
+        solar_capacity_kW : numeric, or dict address -> capacity (unit : kW)
+        prices : the price and cost arguments of simple_payback() (cost_per_kWh() uses
+                 behind_meter_price and generation_rate only)
+
+    Output :
+        result : pd.DataFrame with the columns Address, solar_capacity, annual_solar_behind_meter_kWh,
+                 annual_solar_excess_kWh, simple_payback, cost_per_kWh
+    """
+    rows = []
+    for address, curve in curves.items():
+        capacity = solar_capacity_kW[address] if isinstance(solar_capacity_kW, dict) else solar_capacity_kW
+        economics = solar_economics(curve, capacity, **prices)
+        rows.append((address, capacity, float(economics["annual_solar_behind_meter_kWh"]),
+                    float(economics["annual_solar_excess_kWh"]),
+                    float(economics["simple_payback"]),
+                    float(economics["cost_per_kWh"])))
+    return pd.DataFrame(rows, columns = ["Address", "solar_capacity", "annual_solar_behind_meter_kWh",
+                                        "annual_solar_excess_kWh", "simple_payback", "cost_per_kWh"])
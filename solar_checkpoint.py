@@ -0,0 +1,225 @@
+## This is the checkpoint journal of the per-house optimization results
+# Author : Qiancheng Sun
+"""
+The optimization results of a county run only exist in memory until file.to_csv() at the end,
+so a crash or an API failure in the middle of the run loses every house before it.
+
+result_journal in here appends the result of every house to a json lines file as soon as it
+is available, one line per house, keyed by the row number and the address:
+
+    {"row": 12, "Address": "...", "solar_capacity": 5.08, "optimized_payback_year": 4.86, ...}
+
+The file is flushed and fsync'ed after every write_results() call. A resumed run indexes the
+journal (the byte offset of every row, not the records), skips the houses already in it (except
+the houses whose record has an "error"), and the output file is rebuilt from the journal with
+rebuild_output(), or chunk by chunk with results(), which reads only the records of the chunk.
+When the same house is written twice the last line wins, and a last line cut by a crash is removed.
+"""
+#%%
+import json
+import math
+import os
+
+import numpy as np
+
+
+def json_value(value):
+    """
+    Convert a numpy value into a value json can save, nan and inf are saved as None.
+    """
+    if isinstance(value, np.ndarray):
+        value = value.reshape(-1)[0] if value.size == 1 else value.tolist()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+class result_journal:
+    """
+    Json lines journal of the per-house results.
+
+    Input Arguments:
+        path : string (character), the journal file, created when it does not exist
+
+        resume : Boolean, default is True
+                When the value is False, the existing journal is removed and the run starts again
+
+    Example:
+        journal = result_journal(os.path.join(output_path, "optimization_journal.jsonl"))
+        pending = [i for i in range(len(file)) if not journal.is_completed(i, file["Address"][i])]
+        ...
+        journal.write_results(rows, addresses, {"solar_capacity": ..., ...})
+        journal.close()
+        file = rebuild_output(file, journal.path)
+    """
+    def __init__(self, path, resume = True):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok = True)
+        if not resume and os.path.exists(path):
+            os.remove(path)
+        remove_partial_line(path)
+        # only the position of the last record of every row is kept, the records are read per chunk
+        self.index = journal_index(path)
+        self.size = os.path.getsize(path) if os.path.exists(path) else 0
+        self.f = open(path, "ab")
+
+    def __len__(self):
+        return len(self.index)
+
+    def is_completed(self, row, address):
+        """
+        The house of this row is in the journal (with the same address) without an "error".
+        """
+        entry = self.index.get(int(row))
+        return entry is not None and entry[1] == str(address) and entry[2]
+
+    def write_results(self, rows, addresses, results):
+        """
+        Append the results of many houses and make them durable.
+
+        Input Arguments:
+            rows : list, the row number of every house in the target file
+
+            addresses : list, the address of every house
+
+            results : dict, column -> list or array with one value for every house
+        """
+        lines = []
+        for j, (row, address) in enumerate(zip(rows, addresses)):
+            record = {"row": int(row), "Address": str(address)}
+            for column, values in results.items():
+                record[column] = json_value(values[j])
+            line = (json.dumps(record) + "\n").encode("utf-8")
+            self.index[record["row"]] = (self.size, record["Address"], record.get("error") is None)
+            self.size += len(line)
+            lines.append(line)
+        self.f.write(b"".join(lines))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def results(self, rows, addresses, columns):
+        """
+        Results of many houses, read from the journal file.
+
+        Output :
+            results : dict, column -> array with one value for every house,
+                    nan for the houses which are not in the journal (or whose address changed)
+        """
+        results = {column: np.full(len(rows), np.nan) for column in columns}
+        houses = []
+        for j, (row, address) in enumerate(zip(rows, addresses)):
+            entry = self.index.get(int(row))
+            if entry is not None and entry[1] == str(address):
+                houses.append((entry[0], j))
+        with open(self.path, "rb") as f:
+            # in file order, so the reads go forward
+            for offset, j in sorted(houses):
+                f.seek(offset)
+                record = json.loads(f.readline())
+                for column in columns:
+                    if record.get(column) is not None:
+                        results[column][j] = record[column]
+        return results
+
+    def forget(self, rows):
+        """
+        Remove the houses from the index of the journal (not from the file),
+        once their results are written to the output, so the memory does not grow with the run.
+        """
+        for row in rows:
+            self.index.pop(int(row), None)
+
+    def close(self):
+        self.f.close()
+
+
+def remove_partial_line(path):
+    """
+    Cut the last line of the journal when a crash stopped it before the end of the line,
+    so the next record starts on its own line.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def journal_index(path):
+    """
+    Index of a journal written by result_journal, without keeping the records.
+
+    Output :
+        index : dict, row number -> (byte offset of the last record of that row, address, no "error")
+    """
+    index = {}
+    if not os.path.exists(path):
+        return index
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # the last line may be cut by a crash
+                offset += len(line)
+                continue
+            index[int(record["row"])] = (offset, record["Address"], record.get("error") is None)
+            offset += len(line)
+    return index
+
+
+def read_journal(path):
+    """
+    Read a journal written by result_journal.
+
+    Output :
+        records : dict, row number -> the last record of that row
+    """
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding = "utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # the last line may be cut by a crash
+                continue
+            records[int(record["row"])] = record
+    return records
+
+
+def rebuild_output(file, journal_path, columns = None):
+    """
+    Fill the result columns of the target file from the journal.
+
+    Input Arguments:
+        file : pd.DataFrame, the target file, the journal rows are its row numbers
+
+        journal_path : string (character)
+
+        columns : list, default is None (every column in the journal)
+
+    Output :
+        file : pd.DataFrame, the houses which are not in the journal (or whose address changed) obtain nan
+    """
+    records = read_journal(journal_path)
+    if columns is None:
+        columns = []
+        for record in records.values():
+            columns.extend(column for column in record
+                            if column not in ("row", "Address", "error") and column not in columns)
+    addresses = file["Address"].astype(str).to_numpy()
+    for column in columns:
+        values = np.full(len(file), np.nan)
+        for row, record in records.items():
+            if row < len(file) and addresses[row] == record["Address"] and record.get(column) is not None:
+                values[row] = record[column]
+        file[column] = values
+    return file
@@ -0,0 +1,225 @@
+## This is the group-vectorized solar capacity optimization of a whole county
+# Author : Qiancheng Sun
+"""
+Inside one county the houses only differ in the consumption type (the NREL load profile),
+the scale factor and the PV profile (the weather tile). The load of a house is
+
+    load_hourly_kW = load_profile / scale_factor
+
+and both objectives are scale invariant:
+
+    payback(house, c) = payback(load_profile, c * scale_factor)
+    cost_per_kWh(house, c) = cost_per_kWh(load_profile, c * scale_factor)
+
+because dividing the load and the capacity by the same factor divides the behind meter solar,
+the excess solar, the cost and the income by that factor too.
+
+So the houses sharing one load profile and one PV profile are one group, the capacity response curve
+(solar_capacity_curve.capacity_breakpoints()) is built once for the group, and the two optimization
+stages of the pipeline are solved for all the houses of the group as one
+(houses x breakpoints) array calculation in the scaled capacity u = c * scale_factor.
+The result is the same as solar_house_optimization.optimize_house_capacity() with the "exact" backend.
+"""
+#%%
+import numpy as np
+
+import solar_capacity_curve
+import solar_house_optimization
+import solar_metrics
+
+# the result columns of every house, see optimize_county()
+optimization_columns = ["solar_capacity", "optimized_payback_year", "optimized_cost_per_kWh"]
+
+
+def group_houses(house_PV_rows, house_load_rows):
+    """
+    Group the houses by their PV profile row and load profile row.
+
+    Output :
+        groups : dict, (PV row, load row) -> array of the house positions
+    """
+    keys = np.column_stack([np.asarray(house_PV_rows, dtype = np.int64),
+                            np.asarray(house_load_rows, dtype = np.int64)])
+    if len(keys) == 0:
+        return {}
+    unique_keys, inverse = np.unique(keys, axis = 0, return_inverse = True)
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse, kind = "stable")
+    starts = np.searchsorted(inverse[order], np.arange(len(unique_keys) + 1))
+    return {(int(key[0]), int(key[1])): order[starts[j]:starts[j + 1]] for j, key in enumerate(unique_keys)}
+
+
+def minimize_group_on_curve(curve, objective, lower, upper, chunk_size = 256, **prices):
+    """
+    Exact minimum of the objective for many houses sharing one curve,
+    the same result as solar_capacity_curve.minimize_on_curve() for every house.
+
+    Input Arguments:
+        curve : dict, obtained by solar_capacity_curve.capacity_breakpoints()
+
+        objective : string (character), "payback" or "cost_per_kWh"
+
+        lower, upper : arrays with one value for every house, the boundary of the capacity on the curve
+
+        chunk_size : numeric, default is 256, number of houses in one (houses x breakpoints) array
+
+        prices : the price and cost arguments of simple_payback() / cost_per_kWh()
+
+    Output :
+        solar_capacity_kW : array, the smallest capacity that obtains the minimum of every house
+        value : array, the minimum objective value of every house
+    """
+    if objective == "payback":
+        function = solar_capacity_curve.simple_payback
+    elif objective == "cost_per_kWh":
+        function = solar_capacity_curve.cost_per_kWh
+    else:
+        raise ValueError("objective must be 'payback' or 'cost_per_kWh'")
+    lower = np.asarray(lower, dtype = np.float64).reshape(-1)
+    upper = np.asarray(upper, dtype = np.float64).reshape(-1)
+    breakpoints = curve["breakpoint"]
+    # every candidate is evaluated once for the whole group
+    breakpoint_values = function(curve, breakpoints, **prices)
+    solar_capacity_kW = lower.copy()
+    value = np.asarray(function(curve, lower, **prices), dtype = np.float64).copy()
+    # without any breakpoint only the boundary is left
+    for start in range(0, len(lower) if len(breakpoints) else 0, chunk_size):
+        end = min(start + chunk_size, len(lower))
+        # the breakpoints inside the boundary of every house, (houses x breakpoints)
+        inside = (breakpoints > lower[start:end, np.newaxis]) & (breakpoints < upper[start:end, np.newaxis])
+        values = np.where(inside, breakpoint_values, np.inf)
+        # np.argmin returns the first minimum, which is the smallest capacity
+        best = np.argmin(values, axis = 1)
+        best_value = values[np.arange(end - start), best]
+        # the lower boundary is smaller than the breakpoints, it is kept when the values are equal
+        better = best_value < value[start:end]
+        solar_capacity_kW[start:end] = np.where(better, breakpoints[best], solar_capacity_kW[start:end])
+        value[start:end] = np.where(better, best_value, value[start:end])
+    upper_value = function(curve, upper, **prices)
+    better = upper_value < value
+    solar_capacity_kW = np.where(better, upper, solar_capacity_kW)
+    value = np.where(better, upper_value, value)
+    return solar_capacity_kW, value
+
+
+def optimize_group(solar_PV_kW_per_kW_capacity, load_profile_kW, scale_factors, chunk_size = 256,
+    upper = 10, cost_window_kW = solar_house_optimization.cost_window_kW, **prices):
+    """
+    Two-stage solar capacity optimization of the houses sharing one PV profile and one load profile,
+    the same stages as solar_house_optimization.optimize_house_capacity().
+
+    Input Arguments:
+        solar_PV_kW_per_kW_capacity : array of 8760 values (unit : kW), the hourly AC output per kW capacity
+
+        load_profile_kW : array of 8760 values (unit : kW), the load profile before scaling
+
+        scale_factors : array, the scale factor of every house (must be positive)
+
+        chunk_size : numeric, see minimize_group_on_curve()
+
+        upper : numeric, default is 10, the upper boundary of the stage 1 capacity (unit : kW)
+
+        cost_window_kW : numeric (unit : kW), default is 0, the stage 2 boundary before scaling,
+                see solar_house_optimization.optimize_house_capacity()
+
+        prices : the price and cost arguments of simple_payback() / cost_per_kWh()
+
+    Output :
+        result : dict of arrays with one value for every house, the keys are optimization_columns,
+                 and "curve", the curve of the load profile before scaling
+    """
+    scale_factors = np.asarray(scale_factors, dtype = np.float64).reshape(-1)
+    with solar_metrics.stage("capacity_breakpoints"):
+        curve = solar_capacity_curve.capacity_breakpoints(solar_PV_kW_per_kW_capacity, load_profile_kW)
+    cost_prices = {name: prices[name] for name in ("behind_meter_price", "generation_rate") if name in prices}
+
+    # stage 1 boundary of every house, see solar_house_optimization.payback_boundary()
+    max_load = np.max(load_profile_kW) / scale_factors
+    lower_1 = np.where(max_load >= upper, 0.0, max_load)
+    with solar_metrics.stage("payback_optimization"):
+        payback_capacity, payback_value = minimize_group_on_curve(curve, "payback",
+                                                                lower_1 * scale_factors,
+                                                                upper * scale_factors,
+                                                                chunk_size = chunk_size,
+                                                                **prices)
+
+    # stage 2 boundary around the stage 1 capacity, see solar_house_optimization.cost_boundary()
+    boundary_2 = solar_house_optimization.cost_boundary(payback_capacity / scale_factors,
+                                                        np.column_stack([lower_1, np.full(len(lower_1), upper)]),
+                                                        cost_window_kW)
+    with solar_metrics.stage("cost_optimization"):
+        if cost_window_kW == 0:
+            cost_capacity = payback_capacity
+            cost_value = solar_capacity_curve.cost_per_kWh(curve, payback_capacity, **cost_prices)
+        else:
+            cost_capacity, cost_value = minimize_group_on_curve(curve, "cost_per_kWh",
+                                                                boundary_2[:, 0] * scale_factors,
+                                                                boundary_2[:, 1] * scale_factors,
+                                                                chunk_size = chunk_size,
+                                                                **cost_prices)
+    return {"solar_capacity": cost_capacity / scale_factors,
+            "optimized_payback_year": payback_value,
+            "optimized_cost_per_kWh": cost_value,
+            "curve": curve}
+
+
+def optimize_county(PV_profiles,
+    load_profiles,
+    house_PV_rows,
+    house_load_rows,
+    scale_factors,
+    chunk_size = 256,
+    return_curves = False,
+    cost_window_kW = solar_house_optimization.cost_window_kW,
+    **prices):
+    """
+    Solar capacity optimization of all the houses of a county, group by group.
+
+    Input Arguments:
+        PV_profiles : array (number of PV profiles x 8760), the hourly AC output per kW capacity (kW)
+
+        load_profiles : array (number of load profiles x 8760), the load profiles before scaling (kW),
+                for example solar_load_profile.load_profile_library().profiles
+
+        house_PV_rows, house_load_rows, scale_factors : list or array with one value for every house,
+                the same as solar_parallel.optimize_houses_parallel()
+
+        chunk_size : numeric, see minimize_group_on_curve()
+
+        return_curves : Boolean, default is False
+                When the value is True, the capacity response curve of every group is returned once
+                as "group_curves", and the position of the group curve of every house as "curve_index"
+                (-1 for the houses without a curve). The curve of a house is
+                solar_capacity_curve.scale_capacity_curve(group_curves[curve_index], scale_factor),
+                see solar_capacity_curve.scaled_capacity_curves
+
+        cost_window_kW : numeric (unit : kW), default is 0, see optimize_group()
+
+        prices : the price and cost arguments of simple_payback() / cost_per_kWh()
+
+    Output :
+        result : dict, the keys are optimization_columns, every value is an array with one value for
+                every house in the input order, and "group_curves" and "curve_index" when return_curves is True.
+                The houses with a scale factor which is not positive obtain nan.
+    """
+    scale_factors = np.asarray(scale_factors, dtype = np.float64).reshape(-1)
+    n_houses = len(scale_factors)
+    result = {column: np.full(n_houses, np.nan) for column in optimization_columns}
+    group_curves = []
+    curve_index = np.full(n_houses, -1, dtype = np.int64)
+    valid = np.isfinite(scale_factors) & (scale_factors > 0)
+    for (PV_row, load_row), houses in group_houses(house_PV_rows, house_load_rows).items():
+        houses = houses[valid[houses]]
+        if len(houses) == 0:
+            continue
+        group_result = optimize_group(PV_profiles[PV_row], load_profiles[load_row], scale_factors[houses],
+                                    chunk_size = chunk_size, cost_window_kW = cost_window_kW, **prices)
+        for column in optimization_columns:
+            result[column][houses] = group_result[column]
+        if return_curves:
+            curve_index[houses] = len(group_curves)
+            group_curves.append(group_result["curve"])
+    if return_curves:
+        result["group_curves"] = group_curves
+        result["curve_index"] = curve_index
+    return result
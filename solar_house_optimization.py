@@ -0,0 +1,208 @@
+## This is the two-stage solar capacity optimization of one house
+# Author : Qiancheng Sun
+"""
+The same two stages as the loop in solar_API_pipeline.py, as a function of the hourly
+solar PV output per kW and the hourly load of one house, without any global variable,
+so it can run in another process (see solar_parallel.py):
+
+    1. minimum simple payback, with the capacity between max(load) and 10 kW
+    2. minimum cost per kWh, with the capacity within cost_window_kW of the stage 1 capacity
+
+The pipeline took the stage 2 boundary from the min and max of the stage 1 GA convergence, which
+are paybacks (years) and not capacities, and with the exact backend (one value in the report)
+that boundary is a 1 W window, so the reported capacity was the stage 1 capacity. The cost per
+kWh never rises with the capacity, so a positive window only moves the capacity to
+min(stage 1 capacity + cost_window_kW, upper). The default window is 0 : the reported capacity
+is the stage 1 capacity and the cost per kWh is the cost at that capacity, as in the pipeline.
+"""
+#%%
+import numpy as np
+
+import solar_capacity_curve
+import solar_metrics
+import solar_objective_cache
+import solar_optimization
+from solar_batch_ga import batch_geneticalgorithm as batch_ga
+
+# the algorithm parameters of the GA stages, the same as the pipeline
+default_algorithm_parameters = {'max_num_iteration': 100,
+                                'population_size': 150,
+                                'mutation_probability': 0.01,
+                                'elit_ratio': 0,
+                                'crossover_probability': 0.8,
+                                'parents_portion': 0.3,
+                                # the option is uniform, one_point, two_point
+                                'crossover_type': 'uniform',
+                                'max_iteration_without_improv': 10}
+
+# the stage 2 capacity is at most cost_window_kW away from the stage 1 capacity (unit : kW),
+# 0 reports the stage 1 capacity
+cost_window_kW = 0
+
+
+def payback_boundary(load_hourly_kW, upper = 10):
+    """
+    The boundary of the stage 1 solar capacity, [max(load), upper] or [0, upper] when max(load) >= upper.
+    """
+    boundary = np.array([[np.max(load_hourly_kW), upper]])
+    if boundary[:, 0] >= boundary[:, 1]:
+        boundary = np.array([[0, upper]])
+    return boundary
+
+
+def cost_boundary(payback_capacity_kW, boundary, window_kW = cost_window_kW):
+    """
+    The boundary of the stage 2 solar capacity, the stage 1 boundary narrowed to window_kW around the stage 1 capacity.
+
+    Input Arguments:
+        payback_capacity_kW : numeric or array with one value for every house, the stage 1 capacity (unit : kW)
+
+        boundary : np.array([[lower, upper]]) or array (houses, 2), the stage 1 boundary (unit : kW)
+
+        window_kW : numeric, default is cost_window_kW
+
+    Output :
+        boundary_2 : array (houses, 2), [[lower, upper]] for one house
+    """
+    payback_capacity_kW = np.asarray(payback_capacity_kW, dtype = np.float64).reshape(-1)
+    boundary = np.asarray(boundary, dtype = np.float64).reshape(-1, 2)
+    return np.column_stack([np.maximum(payback_capacity_kW - window_kW, boundary[:, 0]),
+                            np.minimum(payback_capacity_kW + window_kW, boundary[:, 1])])
+
+
+def memoize(function, resolution_kW, variable_boundaries):
+    """
+    The batched objective with a memoization cache on the GA boundary,
+    or the objective itself when resolution_kW is None.
+    """
+    if resolution_kW is None:
+        return function
+    return solar_objective_cache.memoized_objective(function, resolution_kW = resolution_kW,
+                                                    variable_boundaries = variable_boundaries)
+
+
+def optimize_house_capacity(solar_PV_kW_per_kW_capacity,
+    load_hourly_kW,
+    optimizer_backend = "exact",
+    algorithm_parameters = None,
+    return_curve = False,
+    return_economics = False,
+    objective_resolution_kW = 0.01,
+    cost_window_kW = cost_window_kW,
+    convergence_curve = False,
+    progress_bar = False):
+    """
+    Two-stage solar capacity optimization of one house.
+
+    Input Arguments:
+        solar_PV_kW_per_kW_capacity : array of 8760 values (unit : kW), the hourly AC output per kW capacity
+
+        load_hourly_kW : array of 8760 values (unit : kW), the hourly electric consumption
+
+        optimizer_backend : string (character)
+                "exact" (default) : solar_capacity_curve.breakpoint_optimizer
+                "ga" : solar_batch_ga.batch_geneticalgorithm
+
+        algorithm_parameters : dict, default is None (default_algorithm_parameters), only used by the GA
+
+        return_curve : Boolean, default is False
+                When the value is True and the backend is "exact", the capacity response curve is returned as "curve"
+
+        return_economics : Boolean, default is False
+                When the value is True, the payback, cost per kWh, annual excess, behind meter savings and
+                export income of the optimized capacity are returned as "economics",
+                see solar_optimization.solar_economics()
+
+        objective_resolution_kW : numeric (unit : kW), default is 0.01, only used by the GA.
+                The GA objectives are memoized on the capacity rounded to this step (at most 1 / 1000 of
+                the boundary width), see solar_objective_cache.memoized_objective, None to evaluate every capacity
+
+        cost_window_kW : numeric (unit : kW), default is 0, the stage 2 boundary, see cost_boundary().
+                With 0 the stage 2 search is skipped and the cost per kWh is evaluated at the stage 1 capacity
+
+        convergence_curve, progress_bar : Boolean, only used by the GA
+
+    Output :
+        result : dict
+                "solar_capacity" : the optimized solar capacity (np.array with one value, the same as the GA output)
+                "optimized_payback_year" : the minimum simple payback
+                "optimized_cost_per_kWh" : the minimum cost per kWh (inside the stage 2 boundary)
+    """
+    if algorithm_parameters is None:
+        algorithm_parameters = default_algorithm_parameters
+    solar_PV_kW_per_kW_capacity = np.asarray(solar_PV_kW_per_kW_capacity, dtype = np.float64).reshape(-1)
+    load_hourly_kW = np.asarray(load_hourly_kW, dtype = np.float64).reshape(-1)
+    boundary = payback_boundary(load_hourly_kW)
+
+    curve = None
+    if optimizer_backend == "exact":
+        curve = solar_capacity_curve.capacity_breakpoints(solar_PV_kW_per_kW_capacity, load_hourly_kW)
+        payback_optimization_model = solar_capacity_curve.breakpoint_optimizer(objective = "payback",
+                                    solar_PV_kW_per_kW_capacity = None,
+                                    load_hourly_kW = None,
+                                    variable_boundaries = boundary,
+                                    curve = curve)
+    elif optimizer_backend == "ga":
+        payback_optimization_model = batch_ga(
+                                    function = memoize(lambda X: solar_optimization.simple_payback(solar_PV_kW_per_kW_capacity,
+                                                                                                load_hourly_kW, X[:, 0]),
+                                                        objective_resolution_kW, boundary),
+                                    dimension = 1,
+                                    variable_type = "real",
+                                    variable_boundaries = boundary,
+                                    algorithm_parameters = algorithm_parameters,
+                                    convergence_curve = convergence_curve,
+                                    progress_bar = progress_bar)
+    else:
+        raise ValueError("optimizer_backend must be 'exact' or 'ga'")
+    with solar_metrics.stage("payback_optimization"):
+        payback_optimization_model.run()
+    solution = payback_optimization_model.output_dict
+
+    # set up boundary for the fixed solar capacity
+    boundary_2 = cost_boundary(solution["variable"][0], boundary, cost_window_kW)
+
+    if cost_window_kW == 0:
+        # the stage 2 boundary is the stage 1 capacity, only its cost per kWh is evaluated
+        with solar_metrics.stage("cost_optimization"):
+            if curve is not None:
+                cost = solar_capacity_curve.cost_per_kWh(curve, solution["variable"])
+            else:
+                cost = solar_optimization.cost_per_kWh(solar_PV_kW_per_kW_capacity, load_hourly_kW,
+                                                    solution["variable"])
+        cost_solution = {"variable": solution["variable"], "function": float(np.asarray(cost).reshape(-1)[0])}
+    else:
+        if optimizer_backend == "exact":
+            cost_optimization_model = solar_capacity_curve.breakpoint_optimizer(objective = "cost_per_kWh",
+                                        solar_PV_kW_per_kW_capacity = None,
+                                        load_hourly_kW = None,
+                                        variable_boundaries = boundary_2,
+                                        curve = curve)
+        else:
+            cost_optimization_model = batch_ga(
+                                        function = memoize(lambda X: solar_optimization.cost_per_kWh(solar_PV_kW_per_kW_capacity,
+                                                                                                    load_hourly_kW, X[:, 0]),
+                                                            objective_resolution_kW, boundary_2),
+                                        dimension = 1,
+                                        variable_type = "real",
+                                        variable_boundaries = boundary_2,
+                                        algorithm_parameters = algorithm_parameters,
+                                        convergence_curve = convergence_curve,
+                                        progress_bar = progress_bar)
+        with solar_metrics.stage("cost_optimization"):
+            cost_optimization_model.run()
+        cost_solution = cost_optimization_model.output_dict
+
+    result = {"solar_capacity": cost_solution["variable"],
+            "optimized_payback_year": solution["function"],
+            "optimized_cost_per_kWh": cost_solution["function"]}
+    if return_curve and curve is not None:
+        result["curve"] = curve
+    if return_economics:
+        # the exact backend reads every value from the curve, the GA from one hourly split
+        if curve is not None:
+            result["economics"] = solar_capacity_curve.solar_economics(curve, cost_solution["variable"])
+        else:
+            result["economics"] = solar_optimization.solar_economics(solar_PV_kW_per_kW_capacity, load_hourly_kW,
+                                                                    cost_solution["variable"])
+    return result
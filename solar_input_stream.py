@@ -0,0 +1,92 @@
+## This is the chunked reader of the residence input file and the streamed output file
+# Author : Qiancheng Sun
+"""
+pd.read_csv(file_path) keeps every column of every residence in memory, which is fine for one county
+but not for the statewide file of millions of residences.
+
+read_input_chunks() in here reads only the columns the pipeline needs, with compact dtypes,
+and yields the residences as DataFrames of at most chunk_size rows. The index of every chunk is the
+row number in the input file, so the row numbers continue from one chunk to the next.
+output_stream writes the result of every chunk to the output csv file as soon as it is done, so
+the memory only depends on the chunk size, not on the size of the input file.
+
+    for chunk in read_input_chunks(file_path, chunk_size = 1000):
+        ... optimize the houses of the chunk ...
+        output.write(chunk)
+"""
+#%%
+import os
+
+import numpy as np
+import pandas as pd
+
+# the columns of the input file used by the pipeline and their dtypes
+input_dtypes = {"Address": object,
+                "consumption_type": "category",
+                # the scale factor is used by the calculation, so it keeps float64
+                "scale_factor": np.float64,
+                "typical_annual_electric_consumption": np.float32}
+input_columns = list(input_dtypes)
+
+
+def read_input_chunks(file_path, chunk_size = 10000, columns = None, dtypes = None):
+    """
+    Read the residence input file in chunks.
+
+    Input Arguments:
+        file_path : string (character), the input csv file
+
+        chunk_size : numeric, default is 10000, number of residences in one chunk
+
+        columns : list, default is None (input_columns)
+
+        dtypes : dict, default is None (input_dtypes)
+
+    Output :
+        generator of pd.DataFrame, the index is the row number in the input file
+    """
+    if columns is None:
+        columns = input_columns
+    if dtypes is None:
+        dtypes = input_dtypes
+    dtypes = {column: dtype for column, dtype in dtypes.items() if column in columns}
+    with pd.read_csv(file_path, usecols = columns, dtype = dtypes, chunksize = chunk_size) as reader:
+        for chunk in reader:
+            # the columns in the order of the argument, not the order of the file
+            yield chunk[columns]
+
+
+class output_stream:
+    """
+    Append the result of every chunk to one csv file.
+
+    Input Arguments:
+        file_path : string (character), the output csv file
+
+        columns : list, the columns written to the file, default is None (the columns of the first chunk)
+
+        append : Boolean, default is False
+                When the value is False an existing file is replaced,
+                when the value is True the chunks are added after the existing rows
+    """
+    def __init__(self, file_path, columns = None, append = False):
+        self.file_path = file_path
+        self.columns = columns
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok = True)
+        if not append and os.path.exists(file_path):
+            os.remove(file_path)
+        # the header is only written into an empty file
+        self.header = not (os.path.exists(file_path) and os.path.getsize(file_path) > 0)
+        self.n_rows = 0
+
+    def write(self, chunk):
+        """
+        Append the rows of the chunk, the index (row number) is the first column.
+        """
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+        chunk.to_csv(self.file_path, mode = "a", header = self.header, columns = self.columns)
+        self.header = False
+        self.n_rows += len(chunk)
@@ -0,0 +1,106 @@
+## This is the library of the NREL typical load profiles
+# Author : Qiancheng Sun
+"""
+The pipeline obtains the hourly load of a house from the NREL TMY3 residential load profiles
+(HIGH / BASE / LOW), divided by the scale factor of the house.
+
+load_profile_library in here reads every NREL csv file once, removes the duplicate first day
+of the files with 8784 rows once, and keeps the profiles as one contiguous float32 array
+(number of consumption types x 8760). The profile of a consumption type is a view of that array,
+and the load of a house is the profile divided by the scale factor on demand:
+
+    NREL_load_library = load_profile_library({"High": NREL_path_1, "Base": NREL_path_2, "Low": NREL_path_3})
+    load_hourly_kW = NREL_load_library.house_load(consumption_type, scale_factor)
+"""
+#%%
+import numpy as np
+import pandas as pd
+
+hours_per_year = 8760
+# the hourly electric consumption column of the NREL files
+NREL_load_column = "Electricity:Facility [kW](Hourly)"
+
+
+def read_NREL_load_profile(path, column = NREL_load_column):
+    """
+    Read the hourly load of one NREL TMY3 csv file.
+
+    Input Arguments:
+        path : string (character), path of the NREL csv file
+
+        column : string (character), default is NREL_load_column
+
+    Output :
+        profile : float32 array of 8760 values (unit : kW).
+                The HIGH and LOW files start with a duplicate day (8784 rows),
+                so only the last 8760 rows are kept, the same as .drop(range(0, 24)).
+    """
+    profile = pd.read_csv(path, usecols = [column])[column].to_numpy(dtype = np.float32)
+    if len(profile) > hours_per_year:
+        profile = profile[-hours_per_year:]
+    if len(profile) != hours_per_year:
+        raise ValueError(path + " has " + str(len(profile)) + " hourly values, expected " + str(hours_per_year))
+    return profile
+
+
+class load_profile_library:
+    """
+    The NREL load profiles, read once, one row for every consumption type.
+
+    Input Arguments:
+        paths : dict, {consumption type: path of the NREL csv file}, for example
+                {"High": NREL_path_1, "Base": NREL_path_2, "Low": NREL_path_3}
+
+        default_consumption_type : string (character), default is "Low"
+                the profile of the consumption types which are not in paths,
+                the same as the else branch of the pipeline
+
+        column : string (character), default is NREL_load_column
+
+    Attributes :
+        profiles : read-only float32 array (number of consumption types x 8760)
+        rows : dict, {consumption type: row of profiles}
+    """
+    def __init__(self, paths, default_consumption_type = "Low", column = NREL_load_column):
+        if default_consumption_type not in paths:
+            raise ValueError("default_consumption_type " + str(default_consumption_type) + " is not in paths")
+        self.consumption_types = list(paths)
+        self.rows = {consumption_type: row for row, consumption_type in enumerate(self.consumption_types)}
+        self.default_consumption_type = default_consumption_type
+        profiles = np.empty((len(self.consumption_types), hours_per_year), dtype = np.float32)
+        for consumption_type, row in self.rows.items():
+            profiles[row] = read_NREL_load_profile(paths[consumption_type], column)
+        profiles.flags.writeable = False
+        self.profiles = profiles
+
+    def row(self, consumption_type):
+        """
+        Row of the profile of the consumption type.
+        """
+        return self.rows.get(consumption_type, self.rows[self.default_consumption_type])
+
+    def house_rows(self, consumption_types):
+        """
+        Row of the profile of every house, consumption_types is a list or a pandas Series.
+        """
+        return np.array([self.row(consumption_type) for consumption_type in consumption_types], dtype = np.int64)
+
+    def profile(self, consumption_type):
+        """
+        Hourly load profile of the consumption type before scaling (a view, not a copy).
+        """
+        return self.profiles[self.row(consumption_type)]
+
+    def house_load(self, consumption_type, scale_factor, out = None):
+        """
+        Hourly load of one house (unit : kW), profile(consumption_type) / scale_factor.
+
+        Input Arguments:
+            consumption_type : string (character), for example "High", "Base", "Low"
+
+            scale_factor : numeric, the scale factor of the house
+
+            out : float32 array of 8760 values, default is None
+                    the result is written into out, so a loop over many houses can reuse one array
+        """
+        return np.divide(self.profile(consumption_type), np.float32(scale_factor), out = out)
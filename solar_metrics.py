@@ -0,0 +1,230 @@
+## This is the timing and throughput instrumentation of the solar pipeline
+# Author : Qiancheng Sun
+"""
+The pipeline only prints the address of every house, so a slow run does not tell whether the time is
+spent in the API, the json decoding, the csv writing or the optimization stages.
+
+pipeline_metrics in here collects:
+    stages : the total time, the number of calls and the longest call of every stage
+             with registry.stage("name"): ...
+    counters : for example PV watts API calls, cache hits and objective evaluations
+             registry.count("name", n)
+
+The library modules count into the module-level registry (count() and stage() below),
+so the pipeline reads them without passing an object through every function.
+A stage costs two time.perf_counter() calls and a counter one lock, so both can stay on in long runs.
+The worker processes of solar_parallel.py count into their own registry, which is reset before every
+chunk of houses and returned with the results of the chunk (export()), and the parent process adds it
+to its registry (merge()). The stage seconds of the workers are summed, so with several workers
+a stage can take longer than the elapsed time of the run.
+
+The pipeline calls registry.house_done() after every house, which prints the throughput and the ETA
+every report_every seconds, and registry.write_metrics() at the end of the run, which saves every
+stage and counter as json lines or in the Prometheus text format.
+"""
+#%%
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class pipeline_metrics:
+    """
+    Stage timers and counters of one run.
+
+    Input Arguments:
+        n_houses : numeric, default is None, number of houses of the run, used for the ETA
+
+        report_every : numeric (unit : seconds), default is 60, time between two throughput summaries,
+                None to never print them
+
+        stream : file, default is sys.stdout, where the summaries are printed
+    """
+    def __init__(self, n_houses = None, report_every = 60, stream = None):
+        self.lock = threading.Lock()
+        self.reset(n_houses, report_every, stream)
+
+    def reset(self, n_houses = None, report_every = 60, stream = None):
+        """
+        Remove every stage and counter and start the run clock again.
+        """
+        with self.lock:
+            self.n_houses = n_houses
+            self.report_every = report_every
+            self.stream = stream
+            self.stage_seconds = {}
+            self.stage_calls = {}
+            self.stage_max = {}
+            self.counters = {}
+            self.houses_done = 0
+            self.start_time = time.perf_counter()
+            self.last_report = self.start_time
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time the code inside the with block as the stage name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self.lock:
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+                self.stage_calls[name] = self.stage_calls.get(name, 0) + 1
+                if seconds > self.stage_max.get(name, 0.0):
+                    self.stage_max[name] = seconds
+
+    def count(self, name, n = 1):
+        """
+        Add n to the counter name.
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def export(self):
+        """
+        Output :
+            metrics : dict, the stages and the counters, for merge() in another process
+        """
+        with self.lock:
+            return {"stage_seconds": dict(self.stage_seconds),
+                    "stage_calls": dict(self.stage_calls),
+                    "stage_max": dict(self.stage_max),
+                    "counters": dict(self.counters)}
+
+    def merge(self, metrics):
+        """
+        Add the stages and the counters obtained by export() of another registry.
+        """
+        with self.lock:
+            for name, seconds in metrics["stage_seconds"].items():
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+            for name, calls in metrics["stage_calls"].items():
+                self.stage_calls[name] = self.stage_calls.get(name, 0) + calls
+            for name, seconds in metrics["stage_max"].items():
+                if seconds > self.stage_max.get(name, 0.0):
+                    self.stage_max[name] = seconds
+            for name, value in metrics["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def house_done(self, n = 1):
+        """
+        Count n finished houses, and print the throughput summary when report_every seconds passed.
+        """
+        with self.lock:
+            self.houses_done += n
+            now = time.perf_counter()
+            due = self.report_every is not None and now - self.last_report >= self.report_every
+            if due:
+                self.last_report = now
+        if due:
+            self.report()
+
+    def summary(self):
+        """
+        Output :
+            summary : dict with the elapsed time, the houses done, the throughput (houses / second),
+                    the ETA (seconds, None when n_houses is not known), the stages and the counters
+        """
+        with self.lock:
+            elapsed = time.perf_counter() - self.start_time
+            houses_per_second = self.houses_done / elapsed if elapsed > 0 else 0.0
+            eta = None
+            if self.n_houses is not None and houses_per_second > 0:
+                eta = max(self.n_houses - self.houses_done, 0) / houses_per_second
+            stages = {name: {"seconds": self.stage_seconds[name],
+                            "calls": self.stage_calls[name],
+                            "max_seconds": self.stage_max[name]} for name in self.stage_seconds}
+            return {"elapsed_seconds": elapsed,
+                    "houses_done": self.houses_done,
+                    "n_houses": self.n_houses,
+                    "houses_per_second": houses_per_second,
+                    "eta_seconds": eta,
+                    "stages": stages,
+                    "counters": dict(self.counters)}
+
+    def report(self):
+        """
+        Print the throughput, the ETA and the share of the time of every stage.
+        """
+        summary = self.summary()
+        stream = self.stream if self.stream is not None else sys.stdout
+        line = "%d houses in %.0f s, %.2f houses / s" % (summary["houses_done"], summary["elapsed_seconds"],
+                                                        summary["houses_per_second"])
+        if summary["n_houses"] is not None:
+            line += " (%d / %d" % (summary["houses_done"], summary["n_houses"])
+            if summary["eta_seconds"] is not None:
+                line += ", ETA %.0f s" % summary["eta_seconds"]
+            line += ")"
+        stages = sorted(summary["stages"].items(), key = lambda item: -item[1]["seconds"])
+        if stages:
+            line += " | " + ", ".join("%s %.1f s" % (name, stage["seconds"]) for name, stage in stages)
+        if summary["counters"]:
+            line += " | " + ", ".join("%s %d" % (name, value) for name, value in sorted(summary["counters"].items()))
+        print(line, file = stream, flush = True)
+
+    def write_metrics(self, path, metrics_format = None):
+        """
+        Save every stage and counter.
+
+        Input Arguments:
+            path : string (character), the metrics file
+
+            metrics_format : string (character), default is None (from the file extension)
+                    "jsonl" : one json object per line, {"metric": ..., "type": ..., "value": ...}
+                    "prometheus" : the Prometheus text format (.prom or .txt)
+        """
+        if metrics_format is None:
+            metrics_format = "prometheus" if path.endswith((".prom", ".txt")) else "jsonl"
+        summary = self.summary()
+        if metrics_format == "jsonl":
+            lines = [{"metric": "elapsed_seconds", "type": "gauge", "value": summary["elapsed_seconds"]},
+                    {"metric": "houses_done", "type": "counter", "value": summary["houses_done"]},
+                    {"metric": "houses_per_second", "type": "gauge", "value": summary["houses_per_second"]}]
+            for name, stage in sorted(summary["stages"].items()):
+                lines.append({"metric": "stage", "stage": name, "type": "timer",
+                            "seconds": stage["seconds"], "calls": stage["calls"], "max_seconds": stage["max_seconds"]})
+            for name, value in sorted(summary["counters"].items()):
+                lines.append({"metric": name, "type": "counter", "value": value})
+            text = "".join(json.dumps(line) + "\n" for line in lines)
+        elif metrics_format == "prometheus":
+            lines = ["# TYPE solar_pipeline_elapsed_seconds gauge",
+                    "solar_pipeline_elapsed_seconds %r" % summary["elapsed_seconds"],
+                    "# TYPE solar_pipeline_houses_done_total counter",
+                    "solar_pipeline_houses_done_total %d" % summary["houses_done"],
+                    "# TYPE solar_pipeline_stage_seconds_total counter",
+                    "# TYPE solar_pipeline_stage_calls_total counter"]
+            for name, stage in sorted(summary["stages"].items()):
+                lines.append('solar_pipeline_stage_seconds_total{stage="%s"} %r' % (name, stage["seconds"]))
+                lines.append('solar_pipeline_stage_calls_total{stage="%s"} %d' % (name, stage["calls"]))
+            for name, value in sorted(summary["counters"].items()):
+                lines.append("# TYPE solar_pipeline_%s_total counter" % name)
+                lines.append("solar_pipeline_%s_total %d" % (name, value))
+            text = "\n".join(lines) + "\n"
+        else:
+            raise ValueError("metrics_format must be 'jsonl' or 'prometheus'")
+        with open(path, "w", encoding = "utf-8") as f:
+            f.write(text)
+        return path
+
+
+# the registry of the process, used by the library modules
+registry = pipeline_metrics()
+
+
+def count(name, n = 1):
+    """
+    Add n to the counter name of the registry.
+    """
+    registry.count(name, n)
+
+
+def stage(name):
+    """
+    Time a with block as the stage name of the registry.
+    """
+    return registry.stage(name)
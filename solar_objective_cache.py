@@ -0,0 +1,123 @@
+## This is the memoization of the objective function evaluations of the GA
+# Author : Qiancheng Sun
+"""
+With max_iteration_without_improv = 10 the later generations of the GA mostly score capacities
+it has already seen, or capacities a few watts away from them, and every one of them is a full
+8760-hour evaluation of the objective.
+
+memoized_objective in here wraps the objective of one house. The capacity is rounded to
+resolution_kW (default 0.01 kW = 10 W) and the objective value of the rounded capacity is kept in
+a bounded LRU dict, so a capacity on the same 10 W step is a dict lookup:
+
+    objective = memoized_objective(lambda X: solar_optimization.simple_payback(pv, load, X[:, 0]))
+    payback_optimization_model = batch_ga(function = objective, ...)
+
+Every capacity is scored at its rounded capacity (also the first time), so the value does not
+depend on the order of the evaluations. The GA still reports its own (not rounded) capacity,
+which is at most resolution_kW / 2 away from the capacity of its value.
+The cache belongs to one objective of one house, a new house needs a new memoized_objective.
+
+With the variable boundary of the GA, the steps start at the lower boundary and the rounded capacity is
+clipped to the boundary, so a lower boundary of max(load) = 3.004 kW is scored at 3.004 kW and not at 3.00 kW.
+The step is then at most 1 / min_steps of the boundary width, so a narrow stage 2 boundary is still
+min_steps different capacities and not one constant objective.
+"""
+#%%
+from collections import OrderedDict
+
+import numpy as np
+
+import solar_metrics
+
+# a boundary of the GA is at least min_steps steps of the memoization
+min_steps = 1000
+
+
+class memoized_objective:
+    """
+    Bounded LRU memoization of an objective function of the solar capacity.
+
+    Input Arguments:
+        function : the objective function
+                batched = True : function(X) with X of shape (number of individuals, 1), see solar_batch_ga.py
+                batched = False : function(X) with X of shape (1,), see geneticalgorithm
+
+        resolution_kW : numeric (unit : kW), default is 0.01, the capacities are rounded to this step
+
+        max_size : numeric, default is 4096, number of capacities kept, the least recently used is removed first
+
+        batched : Boolean, default is True
+
+        variable_boundaries : array [[lower, upper]], default is None, the variable boundary of the GA.
+                The steps start at lower, the step is at most (upper - lower) / min_steps,
+                and the rounded capacities are clipped to the boundary
+
+    Attributes:
+        resolution_kW : numeric, the step of the rounding
+        hits, misses : numeric, number of evaluations answered from the cache / by the function
+    """
+    def __init__(self, function, resolution_kW = 0.01, max_size = 4096, batched = True, variable_boundaries = None):
+        if resolution_kW <= 0:
+            raise ValueError("resolution_kW must be positive")
+        self.function = function
+        self.resolution_kW = float(resolution_kW)
+        self.lower = 0.0
+        self.upper = np.inf
+        if variable_boundaries is not None:
+            self.lower, self.upper = (float(value) for value in np.asarray(variable_boundaries,
+                                                                        dtype = np.float64).reshape(-1)[:2])
+            if self.upper > self.lower:
+                self.resolution_kW = min(self.resolution_kW, (self.upper - self.lower) / min_steps)
+        self.max_size = int(max_size)
+        self.batched = batched
+        self.values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def __call__(self, X):
+        X = np.asarray(X, dtype = np.float64)
+        capacities = X[:, 0] if self.batched else X.reshape(-1)[:1]
+        keys = np.rint((capacities - self.lower) / self.resolution_kW).astype(np.int64).tolist()
+        # the value of every capacity of this call, taken before the eviction below
+        call_values = {}
+        missing = []
+        for key in keys:
+            if key in call_values:
+                continue
+            if key in self.values:
+                self.values.move_to_end(key)
+                call_values[key] = self.values[key]
+            else:
+                call_values[key] = None
+                missing.append(key)
+        n_misses = len(missing)
+        if missing:
+            rounded = np.clip(self.lower + np.array(missing, dtype = np.float64) * self.resolution_kW,
+                            self.lower, self.upper)
+            if self.batched:
+                # every missing capacity of the generation in one call
+                new_values = np.asarray(self.function(rounded[:, np.newaxis]), dtype = np.float64).reshape(-1)
+            else:
+                new_values = [np.asarray(self.function(rounded[j:j + 1]), dtype = np.float64).reshape(-1)[0]
+                            for j in range(len(rounded))]
+            for key, value in zip(missing, new_values):
+                call_values[key] = self.values[key] = float(value)
+            while len(self.values) > self.max_size:
+                self.values.popitem(last = False)
+        values = np.array([call_values[key] for key in keys], dtype = np.float64)
+        self.hits += len(keys) - n_misses
+        self.misses += n_misses
+        solar_metrics.count("objective_cache_hits", len(keys) - n_misses)
+        solar_metrics.count("objective_cache_misses", n_misses)
+        if self.batched:
+            return values
+        return values[0]
+
+    def clear(self):
+        """
+        Remove every capacity, the hit and miss counters are kept.
+        """
+        self.values.clear()
@@ -0,0 +1,242 @@
+## This is the function package for the solar capacity optimization
+# Author : Qiancheng Sun
+"""
+The objective functions of the solar capacity optimization, calculate_simple_payback() and
+calculate_cost_per_kWh() in solar_API_pipeline.py, compare the hourly solar PV generation
+with the hourly load one hour at a time in a python loop.
+
+The functions in here do the same calculation on whole numpy arrays:
+    solar behind the meter = min(solar PV, load)
+    solar excess = max(solar PV - load, 0)
+for every hour at once. The solar capacity can be one value or an array of capacities,
+in which case an array of results is returned. An array of capacities is evaluated
+capacity_chunk_size capacities at a time in buffers that are reused for every chunk,
+a whole (capacities x 8760) float64 array at once does not fit in the cache and is slower
+than a python loop over the capacities.
+
+solar_economics() evaluates the simple payback, the cost per kWh and the annual energy and money
+they are built from with one hourly split, for the reporting of a capacity without running
+simple_payback() and cost_per_kWh() one after the other.
+"""
+#%%
+import numpy as np
+
+import solar_metrics
+
+# cost assumptions of the solar PV system
+cost_capital_solar_PV_per_kW = 1.77 * 1000 # USD / kW
+tax_incentive_solar_PV = 0.26
+cost_solar_pv_system_OM_per_kW_per_year = 12 # USD / kW / year
+
+# electricity price saved by the solar behind the meter (USD / kWh)
+behind_meter_price = 0.2
+# income of the excess solar returned to the grid (USD / kWh)
+generation_rate = 0.1
+
+# number of capacities evaluated as one (capacities x 8760) array, 16 x 8760 float64 is about 1 MB
+capacity_chunk_size = 16
+
+
+def annual_solar_split(solar_PV_kW_per_kW_capacity, load_hourly_kW, solar_capacity_kW):
+    """
+    Annual solar behind the meter and annual solar excess (unit : kWh),
+    the solar behind the meter is min(solar PV, load) and the rest of the solar PV is the excess.
+
+    Input Arguments:
+        solar_PV_kW_per_kW_capacity : array of 8760 values (unit : kW)
+                the hourly AC output per kW solar capacity, obtained by obtain_PV_AC_output()
+
+        load_hourly_kW : array of 8760 values (unit : kW)
+                the hourly electric consumption of the house
+
+        solar_capacity_kW : numeric or array of capacities (unit : kW)
+
+    Output :
+        annual_solar_behind_meter_kW : numeric or array with one value for every capacity
+        annual_solar_excess_kW : numeric or array with one value for every capacity
+    """
+    annual_solar_behind_meter_kW, annual_solar_excess_kW, _ = chunked_solar_split(solar_PV_kW_per_kW_capacity,
+                                                                                load_hourly_kW,
+                                                                                solar_capacity_kW)
+    return annual_solar_behind_meter_kW, annual_solar_excess_kW
+
+
+def chunked_solar_split(solar_PV_kW_per_kW_capacity, load_hourly_kW, solar_capacity_kW,
+    behind_meter_price = None, generation_rate = None, split = True):
+    """
+    Annual solar behind the meter and excess (unit : kWh) of every capacity (None when split is False),
+    and the cost per kWh when the prices are given (None otherwise), capacity_chunk_size capacities at a time.
+    The results have the shape of solar_capacity_kW.
+    """
+    solar_PV_kW_per_kW_capacity = np.asarray(solar_PV_kW_per_kW_capacity, dtype = np.float64).reshape(-1)
+    load_hourly_kW = np.asarray(load_hourly_kW, dtype = np.float64).reshape(-1)
+    solar_capacity_kW = np.asarray(solar_capacity_kW, dtype = np.float64)
+    capacities = solar_capacity_kW.reshape(-1)
+    with_cost = behind_meter_price is not None
+    if with_cost and (generation_rate < 0 or behind_meter_price < 0):
+        raise ValueError("behind_meter_price and generation_rate must not be negative")
+    # the buffers of one chunk, reused for every chunk
+    buffer_shape = (min(len(capacities), capacity_chunk_size), len(load_hourly_kW))
+    annual_solar_behind_meter_kW = annual_solar_excess_kW = cost = None
+    if split:
+        annual_solar_behind_meter_kW = np.empty(len(capacities))
+        behind_meter = np.empty(buffer_shape)
+    if with_cost:
+        cost = np.empty(len(capacities))
+        PV_load_ratio = solar_PV_kW_per_kW_capacity / load_hourly_kW
+        bill = np.empty(buffer_shape)
+    for start in range(0, len(capacities), capacity_chunk_size):
+        end = min(start + capacity_chunk_size, len(capacities))
+        n = end - start
+        if split:
+            # calculate hourly generation, kW
+            np.multiply(capacities[start:end, np.newaxis], solar_PV_kW_per_kW_capacity, out = behind_meter[:n])
+            # the solar behind the meter can not be more than the load
+            np.minimum(behind_meter[:n], load_hourly_kW, out = behind_meter[:n])
+            behind_meter[:n].sum(axis = -1, out = annual_solar_behind_meter_kW[start:end])
+        if with_cost:
+            # the electricity bill of every hour per kWh of load, the income can not make it negative.
+            # with the solar not larger than the load, the bill is behind_meter_price x (1 - solar / load),
+            # with more solar than load, the excess income makes the bill 0
+            np.multiply(capacities[start:end, np.newaxis], PV_load_ratio, out = bill[:n])
+            np.subtract(1, bill[:n], out = bill[:n])
+            np.maximum(bill[:n], 0, out = bill[:n])
+            np.mean(bill[:n], axis = -1, out = cost[start:end])
+            cost[start:end] *= behind_meter_price
+    if split:
+        # the rest of the solar generation is returned to the grid
+        annual_solar_excess_kW = capacities * solar_PV_kW_per_kW_capacity.sum() - annual_solar_behind_meter_kW
+    shape = solar_capacity_kW.shape
+    return tuple(None if result is None else result.reshape(shape)
+                for result in (annual_solar_behind_meter_kW, annual_solar_excess_kW, cost))
+
+
+def simple_payback(solar_PV_kW_per_kW_capacity,
+    load_hourly_kW,
+    solar_capacity_kW,
+    behind_meter_price = behind_meter_price,
+    generation_rate = generation_rate,
+    cost_capital_solar_PV_per_kW = cost_capital_solar_PV_per_kW,
+    tax_incentive_solar_PV = tax_incentive_solar_PV,
+    cost_solar_pv_system_OM_per_kW_per_year = cost_solar_pv_system_OM_per_kW_per_year):
+    """
+    Simple payback (unit : year) of installing solar_capacity_kW solar PV on the house,
+    the same result as calculate_simple_payback() in solar_API_pipeline.py.
+
+    Input Arguments:
+        solar_PV_kW_per_kW_capacity, load_hourly_kW, solar_capacity_kW : see annual_solar_split()
+
+        behind_meter_price, generation_rate : numeric (unit : USD / kWh)
+
+        cost_capital_solar_PV_per_kW, tax_incentive_solar_PV, cost_solar_pv_system_OM_per_kW_per_year :
+                the cost assumptions, default values are defined at the top of this file
+
+    Output :
+        simple_payback : numeric or array with one value for every capacity,
+                inf for the capacities that never pay back (annual income <= maintenance cost)
+    """
+    solar_capacity_kW = np.asarray(solar_capacity_kW, dtype = np.float64)
+    solar_metrics.count("objective_evaluations", solar_capacity_kW.size)
+    annual_solar_behind_meter_kW, annual_solar_excess_kW = annual_solar_split(solar_PV_kW_per_kW_capacity,
+                                                                            load_hourly_kW,
+                                                                            solar_capacity_kW)
+    return payback_from_annual_split(annual_solar_behind_meter_kW, annual_solar_excess_kW, solar_capacity_kW,
+                                    behind_meter_price, generation_rate, cost_capital_solar_PV_per_kW,
+                                    tax_incentive_solar_PV, cost_solar_pv_system_OM_per_kW_per_year)["simple_payback"]
+
+
+def payback_from_annual_split(annual_solar_behind_meter_kW, annual_solar_excess_kW, solar_capacity_kW,
+    behind_meter_price, generation_rate, cost_capital_solar_PV_per_kW, tax_incentive_solar_PV,
+    cost_solar_pv_system_OM_per_kW_per_year):
+    """
+    The income, the cost and the simple payback from the annual solar behind the meter and excess,
+    shared by simple_payback() and solar_economics().
+
+    Output :
+        result : dict, "behind_meter_savings", "export_income", "annual_total_income" (unit : USD / year),
+                "solar_install_cost" (unit : USD), "solar_maintenance_cost_annual" (unit : USD / year)
+                and "simple_payback" (unit : year)
+    """
+    # annual cost saved behind meter solar and annual income excess solar
+    behind_meter_savings = annual_solar_behind_meter_kW * behind_meter_price
+    export_income = annual_solar_excess_kW * generation_rate
+    annual_total_income = behind_meter_savings + export_income
+    # solar install cost
+    solar_install_cost = solar_capacity_kW * cost_capital_solar_PV_per_kW * (1 - tax_incentive_solar_PV)
+    # solar maintenance cost annual
+    solar_maintenance_cost_annual = cost_solar_pv_system_OM_per_kW_per_year * solar_capacity_kW
+    # the capacities that never pay back (annual income <= maintenance cost) obtain inf,
+    # the same as solar_capacity_curve.simple_payback()
+    annual_net_income = annual_total_income - solar_maintenance_cost_annual
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        simple_payback = np.where(annual_net_income > 0, solar_install_cost / annual_net_income, np.inf)[()]
+    return {"behind_meter_savings": behind_meter_savings,
+            "export_income": export_income,
+            "annual_total_income": annual_total_income,
+            "solar_install_cost": solar_install_cost,
+            "solar_maintenance_cost_annual": solar_maintenance_cost_annual,
+            "simple_payback": simple_payback}
+
+
+def cost_per_kWh(solar_PV_kW_per_kW_capacity,
+    load_hourly_kW,
+    solar_capacity_kW,
+    behind_meter_price = behind_meter_price,
+    generation_rate = generation_rate):
+    """
+    Average hourly electricity cost per kWh of load after installing solar_capacity_kW solar PV,
+    the same result as calculate_cost_per_kWh() in solar_API_pipeline.py.
+
+    Input Arguments:
+        solar_PV_kW_per_kW_capacity, load_hourly_kW, solar_capacity_kW : see annual_solar_split()
+
+        behind_meter_price, generation_rate : numeric (unit : USD / kWh)
+
+    Output :
+        cost_per_kWh : numeric or array with one value for every capacity
+    """
+    solar_metrics.count("objective_evaluations", np.size(solar_capacity_kW))
+    return chunked_solar_split(solar_PV_kW_per_kW_capacity, load_hourly_kW, solar_capacity_kW,
+                            behind_meter_price, generation_rate, split = False)[2]
+
+
+def solar_economics(solar_PV_kW_per_kW_capacity,
+    load_hourly_kW,
+    solar_capacity_kW,
+    behind_meter_price = behind_meter_price,
+    generation_rate = generation_rate,
+    cost_capital_solar_PV_per_kW = cost_capital_solar_PV_per_kW,
+    tax_incentive_solar_PV = tax_incentive_solar_PV,
+    cost_solar_pv_system_OM_per_kW_per_year = cost_solar_pv_system_OM_per_kW_per_year):
+    """
+    Simple payback, cost per kWh and the annual energy and money of installing solar_capacity_kW solar PV,
+    from one hourly split. The values are the same as simple_payback() and cost_per_kWh().
+
+    Input Arguments:
+        the same as simple_payback()
+
+    Output :
+        economics : dict, numeric or array with one value for every capacity
+                "solar_capacity" : the capacity (unit : kW)
+                "annual_solar_behind_meter_kWh", "annual_solar_excess_kWh" : (unit : kWh)
+                "behind_meter_savings", "export_income", "annual_total_income" : (unit : USD / year)
+                "solar_install_cost" : (unit : USD)
+                "solar_maintenance_cost_annual" : (unit : USD / year)
+                "simple_payback" : (unit : year)
+                "cost_per_kWh" : (unit : USD / kWh)
+    """
+    solar_capacity_kW = np.asarray(solar_capacity_kW, dtype = np.float64)
+    solar_metrics.count("objective_evaluations", solar_capacity_kW.size)
+    annual_solar_behind_meter_kW, annual_solar_excess_kW, cost = chunked_solar_split(solar_PV_kW_per_kW_capacity,
+                                                                                    load_hourly_kW,
+                                                                                    solar_capacity_kW,
+                                                                                    behind_meter_price,
+                                                                                    generation_rate)
+    economics = {"solar_capacity": solar_capacity_kW,
+                "annual_solar_behind_meter_kWh": annual_solar_behind_meter_kW,
+                "annual_solar_excess_kWh": annual_solar_excess_kW}
+    economics.update(payback_from_annual_split(annual_solar_behind_meter_kW, annual_solar_excess_kW, solar_capacity_kW,
+                                            behind_meter_price, generation_rate, cost_capital_solar_PV_per_kW,
+                                            tax_incentive_solar_PV, cost_solar_pv_system_OM_per_kW_per_year))
+    economics["cost_per_kWh"] = cost
+    return economics
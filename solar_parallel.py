@@ -0,0 +1,209 @@
+## This is the parallel driver of the per-house solar capacity optimization
+# Author : Qiancheng Sun
+"""
+The loop in solar_API_pipeline.py optimizes one house after another on one CPU core.
+optimize_houses_parallel() in here distributes the houses across a process pool.
+
+The NREL load profiles (HIGH / BASE / LOW) and the fetched PV profiles are placed into
+shared memory once, and every worker process reads them from there, so a task only
+sends the row numbers and the scale factor of one house instead of pickling the profiles.
+The results come back in the input order, and a house that fails obtains an "error" instead of
+stopping the run. When a worker process dies (for example out of memory), the pool is broken and
+every chunk that was not finished is sent again to a new pool, at most max_pool_restarts times.
+The stages and the counters of the workers (objective evaluations, objective cache hits, the
+optimization stage timers) come back with every chunk and are added to solar_metrics.registry
+of the parent process.
+"""
+#%%
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import solar_house_optimization
+import solar_metrics
+
+# the shared arrays of one worker process, filled by attach_shared_arrays()
+worker_arrays = {}
+worker_blocks = []
+worker_options = {}
+
+
+def share_array(array):
+    """
+    Copy the array into a new shared memory block.
+
+    Output :
+        block : shared_memory.SharedMemory, the caller closes and unlinks it
+        descriptor : tuple (block name, shape, dtype), sent to the worker processes
+    """
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create = True, size = max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype = array.dtype, buffer = block.buf)[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def attach_shared_memory(name):
+    """
+    Open an existing shared memory block in a worker process.
+    The worker processes use the resource tracker of the parent process,
+    so the block stays registered once and is unlinked by the parent only.
+    """
+    try:
+        # python >= 3.13, do not track the block in the worker at all
+        return shared_memory.SharedMemory(name = name, track = False)
+    except TypeError:
+        return shared_memory.SharedMemory(name = name)
+
+
+def attach_shared_arrays(descriptors, options):
+    """
+    Initializer of the worker processes, build the numpy views of the shared arrays.
+    """
+    for name, (block_name, shape, dtype) in descriptors.items():
+        block = attach_shared_memory(block_name)
+        worker_blocks.append(block)
+        worker_arrays[name] = np.ndarray(shape, dtype = np.dtype(dtype), buffer = block.buf)
+    worker_options.update(options)
+
+
+def optimize_house_task(task):
+    """
+    Optimize one house in a worker process.
+
+    Input Arguments:
+        task : tuple (PV profile row, load profile row, scale factor)
+
+    Output :
+        result : dict, see solar_house_optimization.optimize_house_capacity(),
+                 or {"error": traceback text} when the optimization failed
+    """
+    PV_row, load_row, scale_factor = task
+    try:
+        solar_PV_kW_per_kW_capacity = worker_arrays["PV_profiles"][PV_row]
+        load_hourly_kW = worker_arrays["load_profiles"][load_row] / scale_factor
+        return solar_house_optimization.optimize_house_capacity(solar_PV_kW_per_kW_capacity,
+                                                                load_hourly_kW,
+                                                                **worker_options)
+    except Exception:
+        return {"error": traceback.format_exc()}
+
+
+def optimize_houses_parallel(PV_profiles,
+    load_profiles,
+    house_PV_rows,
+    house_load_rows,
+    scale_factors,
+    max_workers = None,
+    chunksize = 16,
+    optimizer_backend = "exact",
+    algorithm_parameters = None,
+    return_curve = False,
+    objective_resolution_kW = 0.01,
+    cost_window_kW = solar_house_optimization.cost_window_kW,
+    mp_context = None,
+    max_pool_restarts = 2):
+    """
+    Optimize the solar capacity of many houses on a process pool.
+
+    Input Arguments:
+        PV_profiles : array (number of PV profiles x 8760), the hourly AC output per kW capacity (kW)
+
+        load_profiles : array (number of load profiles x 8760), the hourly electric consumption before scaling (kW),
+                for example the NREL HIGH / BASE / LOW profiles
+
+        house_PV_rows : list, the PV profile row of every house
+
+        house_load_rows : list, the load profile row of every house
+
+        scale_factors : list, the scale factor of every house, load = load_profiles[row] / scale_factor
+
+        max_workers : numeric, default is None (number of CPU cores)
+
+        chunksize : numeric, default is 16, number of houses sent to a worker at a time
+
+        optimizer_backend, algorithm_parameters, return_curve, objective_resolution_kW, cost_window_kW :
+                see solar_house_optimization.optimize_house_capacity()
+
+        mp_context : multiprocessing context, default is None (the default start method of the platform).
+                With the "spawn" start method a script calling this function must be protected by
+                if __name__ == "__main__", otherwise every worker process runs the script again.
+
+        max_pool_restarts : numeric, default is 2, number of new pools for the chunks that were not finished
+                when a worker process died. The houses of the chunks that are still not finished after
+                the last pool obtain an "error".
+
+    Output :
+        results : list, the result of every house in the input order.
+                A failed house obtains {"error": message}, the other houses are not affected.
+    """
+    tasks = list(zip(house_PV_rows, house_load_rows, scale_factors))
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    options = {"optimizer_backend": optimizer_backend,
+            "algorithm_parameters": algorithm_parameters,
+            "return_curve": return_curve,
+            "objective_resolution_kW": objective_resolution_kW,
+            "cost_window_kW": cost_window_kW}
+    blocks = []
+    descriptors = {}
+    try:
+        for name, array in (("PV_profiles", PV_profiles), ("load_profiles", load_profiles)):
+            block, descriptor = share_array(np.asarray(array))
+            blocks.append(block)
+            descriptors[name] = descriptor
+        results = [None] * len(tasks)
+        # the houses are sent in chunks, the chunks finished before a worker process died are kept
+        pending = [range(start, min(start + chunksize, len(tasks))) for start in range(0, len(tasks), chunksize)]
+        n_restarts = 0
+        while pending:
+            broken = []
+            with ProcessPoolExecutor(max_workers = max_workers,
+                                    mp_context = mp_context,
+                                    initializer = attach_shared_arrays,
+                                    initargs = (descriptors, options)) as executor:
+                futures = [(chunk, executor.submit(optimize_house_chunk, [tasks[i] for i in chunk])) for chunk in pending]
+                for chunk, future in futures:
+                    try:
+                        chunk_results, chunk_metrics = future.result()
+                        solar_metrics.registry.merge(chunk_metrics)
+                    except BrokenProcessPool as error:
+                        # a worker process died, the chunk is sent again to a new pool
+                        broken.append(chunk)
+                        pool_error = error
+                        continue
+                    except Exception as error:
+                        chunk_results = [{"error": repr(error)}] * len(chunk)
+                    for i, result in zip(chunk, chunk_results):
+                        results[i] = result
+            if broken and n_restarts < max_pool_restarts:
+                n_restarts += 1
+                solar_metrics.count("process_pool_restarts")
+                pending = broken
+                continue
+            for chunk in broken:
+                for i in chunk:
+                    results[i] = {"error": "the process pool broke %d times : %r" % (n_restarts + 1, pool_error)}
+            pending = []
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return results
+
+
+def optimize_house_chunk(chunk):
+    """
+    Optimize a chunk of houses in a worker process.
+
+    Output :
+        results : list, the result of every house, see optimize_house_task()
+        metrics : dict, the stages and the counters of the chunk, see solar_metrics.pipeline_metrics.export()
+    """
+    # a forked worker starts with a copy of the registry of the parent, only the chunk is sent back
+    solar_metrics.registry.reset(report_every = None)
+    results = [optimize_house_task(task) for task in chunk]
+    return results, solar_metrics.registry.export()
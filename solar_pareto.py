@@ -0,0 +1,281 @@
+## This is the Pareto front of the simple payback and the cost per kWh
+# Author : Qiancheng Sun
+"""
+The two optimization stages of the pipeline return one point (the minimum payback, then the
+minimum cost per kWh next to it), and with the GA that point depends on the random search.
+An installer rather wants the trade-off: how much cheaper the electricity gets for every
+year of payback given up.
+
+pareto_front() in here reads the front from the capacity response curve of the house
+(solar_capacity_curve.py). Between two breakpoints the simple payback is monotone and the cost per kWh
+is linear and decreasing, so the front is made of the boundary and the breakpoints inside it
+(solar_capacity_curve.candidate_capacities()) which no other capacity beats with both a lower payback
+and a lower cost per kWh, and the curve is exact between two of them. The capacities are the stage 1
+boundary of the other backends (solar_house_optimization.payback_boundary()), so the minimum payback
+of the front is the stage 1 result of the "exact" backend. The result is deterministic.
+
+The front can have thousands of breakpoints, thin_front() keeps a point only when the payback or the
+cost per kWh changed by thin_tolerance since the last kept point, so a saved front has about a hundred points.
+
+pareto_county() does the same for a whole county with the groups of solar_county_engine.py
+(one curve for the houses sharing a PV profile and a load profile, both objectives of every breakpoint
+are evaluated once for the group), and save_pareto_fronts() keeps the fronts of many houses
+as float32 arrays in one .npz file, keyed by the address.
+"""
+#%%
+import numpy as np
+
+import solar_capacity_curve
+import solar_county_engine
+import solar_house_optimization
+import solar_metrics
+
+# the upper boundary of the capacity (unit : kW), the same as the stage 1 of the other backends
+default_upper = 10
+# relative change of the payback or the cost per kWh between two points of a thinned front
+default_thin_tolerance = 0.01
+
+
+def non_dominated(payback, cost_per_kWh, rtol = 1e-9):
+    """
+    Positions of the non-dominated points when both values are minimized.
+
+    Input Arguments:
+        payback, cost_per_kWh : array with one value for every capacity,
+                the capacities that never pay back (inf or nan payback) are not on the front
+
+        rtol : numeric, default is 1e-9, paybacks closer than rtol are the same payback.
+                Below the smallest breakpoint all the solar is used behind the meter and the payback is flat,
+                the rounding of the flat paybacks must not put the smaller capacities on the front.
+
+    Output :
+        positions : array, sorted by the payback (the cost per kWh is decreasing along the front)
+    """
+    payback = np.asarray(payback, dtype = np.float64)
+    cost_per_kWh = np.asarray(cost_per_kWh, dtype = np.float64)
+    finite = np.flatnonzero(np.isfinite(payback) & np.isfinite(cost_per_kWh) & (payback >= 0))
+    order = finite[np.lexsort((cost_per_kWh[finite], payback[finite]))]
+    sorted_payback = payback[order]
+    sorted_cost = cost_per_kWh[order]
+    running_minimum = np.minimum.accumulate(sorted_cost)
+    # a point is on the front when its cost is lower than the cost of every point before it,
+    # and not higher than the cost of the points with the same payback after it
+    previous_minimum = np.concatenate([[np.inf], running_minimum[:-1]])
+    same_payback_end = np.searchsorted(sorted_payback, sorted_payback * (1 + rtol), side = "right") - 1
+    on_front = (sorted_cost < previous_minimum) & (sorted_cost <= running_minimum[same_payback_end])
+    return order[on_front]
+
+
+def front_of_candidates(capacities, payback, cost_per_kWh):
+    """
+    The front dict of the non-dominated candidates, sorted by the payback.
+    """
+    front = non_dominated(payback, cost_per_kWh)
+    return {"solar_capacity": capacities[front],
+            "payback": payback[front],
+            "cost_per_kWh": cost_per_kWh[front]}
+
+
+def thin_front(front, thin_tolerance = default_thin_tolerance):
+    """
+    Keep the first and the last point of the front, and the points whose payback or cost per kWh
+    changed by more than thin_tolerance (relative) since the last kept point.
+
+    Input Arguments:
+        front : dict, obtained by pareto_front()
+
+        thin_tolerance : numeric, default is 0.01, None or 0 to keep every point
+
+    Output :
+        front : dict, the kept points
+    """
+    n = len(front["payback"])
+    if not thin_tolerance or n <= 2:
+        return front
+    kept = [0]
+    payback = front["payback"]
+    cost = front["cost_per_kWh"]
+    for j in range(1, n - 1):
+        last = kept[-1]
+        if payback[j] > payback[last] * (1 + thin_tolerance) or cost[j] < cost[last] * (1 - thin_tolerance):
+            kept.append(j)
+    kept.append(n - 1)
+    return {name: values[kept] for name, values in front.items()}
+
+
+def pareto_front(solar_PV_kW_per_kW_capacity = None, load_hourly_kW = None, curve = None,
+    lower = None, upper = default_upper, thin_tolerance = None, **prices):
+    """
+    Pareto front of the simple payback and the cost per kWh of one house.
+
+    Input Arguments:
+        solar_PV_kW_per_kW_capacity, load_hourly_kW : array of 8760 values (unit : kW),
+                the PV output is not used when the curve is given
+
+        curve : dict, default is None, obtained by solar_capacity_curve.capacity_breakpoints()
+
+        lower : numeric (unit : kW), default is None, the lower boundary of
+                solar_house_optimization.payback_boundary() (max(load)), needs load_hourly_kW
+
+        upper : numeric (unit : kW), default is 10
+
+        thin_tolerance : numeric, default is None (every point of the front), see thin_front()
+
+        prices : the price and cost arguments of solar_optimization.simple_payback()
+
+    Output :
+        front : dict of arrays sorted by the payback, "solar_capacity" (kW), "payback" (year), "cost_per_kWh"
+    """
+    if curve is None:
+        curve = solar_capacity_curve.capacity_breakpoints(solar_PV_kW_per_kW_capacity, load_hourly_kW)
+    if lower is None:
+        if load_hourly_kW is None:
+            raise ValueError("lower or load_hourly_kW must be given")
+        lower, upper = solar_house_optimization.payback_boundary(load_hourly_kW, upper)[0]
+    capacities = solar_capacity_curve.candidate_capacities(curve, lower, upper)
+    economics = solar_capacity_curve.solar_economics(curve, capacities, **prices)
+    front = front_of_candidates(capacities, economics["simple_payback"], economics["cost_per_kWh"])
+    return thin_front(front, thin_tolerance)
+
+
+def pareto_summary(front, payback_tolerance = 0.1):
+    """
+    One point of the front for the columns of the output file.
+
+    Input Arguments:
+        front : dict, obtained by pareto_front()
+
+        payback_tolerance : numeric, default is 0.1, the lowest cost per kWh is taken among the
+                capacities whose payback is at most (1 + payback_tolerance) x the minimum payback
+
+    Output :
+        result : dict, "solar_capacity", "optimized_payback_year" (the minimum payback of the front)
+                and "optimized_cost_per_kWh" (the cost per kWh of the solar capacity), nan for an empty front
+    """
+    if len(front["payback"]) == 0:
+        return {column: np.nan for column in solar_county_engine.optimization_columns}
+    minimum_payback = front["payback"][0]
+    # the cost per kWh is decreasing along the front, the last point inside the tolerance is the cheapest
+    j = np.searchsorted(front["payback"], minimum_payback * (1 + payback_tolerance), side = "right") - 1
+    return {"solar_capacity": front["solar_capacity"][j],
+            "optimized_payback_year": minimum_payback,
+            "optimized_cost_per_kWh": front["cost_per_kWh"][j]}
+
+
+def pareto_county(PV_profiles,
+    load_profiles,
+    house_PV_rows,
+    house_load_rows,
+    scale_factors,
+    upper = default_upper,
+    payback_tolerance = 0.1,
+    thin_tolerance = default_thin_tolerance,
+    **prices):
+    """
+    Pareto front of every house of a county, group by group.
+
+    Input Arguments:
+        PV_profiles, load_profiles, house_PV_rows, house_load_rows, scale_factors :
+                see solar_county_engine.optimize_county()
+
+        upper : numeric (unit : kW), default is 10, the capacity of every house is between
+                max(load) and upper, see solar_house_optimization.payback_boundary()
+
+        payback_tolerance : see pareto_summary(), the summary is taken from the whole front
+
+        thin_tolerance : numeric, default is 0.01, the returned fronts are thinned, see thin_front()
+
+        prices : the price and cost arguments of solar_optimization.simple_payback()
+
+    Output :
+        result : dict, the keys of solar_county_engine.optimization_columns (from pareto_summary()),
+                every value is an array with one value for every house in the input order,
+                and "fronts", the front of every house (None for a scale factor which is not positive)
+    """
+    scale_factors = np.asarray(scale_factors, dtype = np.float64).reshape(-1)
+    n_houses = len(scale_factors)
+    result = {column: np.full(n_houses, np.nan) for column in solar_county_engine.optimization_columns}
+    fronts = [None] * n_houses
+    valid = np.isfinite(scale_factors) & (scale_factors > 0)
+    for (PV_row, load_row), houses in solar_county_engine.group_houses(house_PV_rows, house_load_rows).items():
+        houses = houses[valid[houses]]
+        if len(houses) == 0:
+            continue
+        with solar_metrics.stage("capacity_breakpoints"):
+            curve = solar_capacity_curve.capacity_breakpoints(PV_profiles[PV_row], load_profiles[load_row])
+        with solar_metrics.stage("pareto_sweep"):
+            # the objectives of the house with the scale factor s at the capacity c are the objectives
+            # of the load profile at c * s, see solar_county_engine.py, so every breakpoint is evaluated once
+            breakpoints = curve["breakpoint"]
+            breakpoint_economics = solar_capacity_curve.solar_economics(curve, breakpoints, **prices)
+            # the stage 1 boundary of every house in the capacity of the curve
+            max_load = np.max(load_profiles[load_row]) / scale_factors[houses]
+            lower = np.where(max_load >= upper, 0.0, max_load) * scale_factors[houses]
+            upper_scaled = upper * scale_factors[houses]
+            lower_economics = solar_capacity_curve.solar_economics(curve, lower, **prices)
+            upper_economics = solar_capacity_curve.solar_economics(curve, upper_scaled, **prices)
+            first = np.searchsorted(breakpoints, lower, side = "right")
+            last = np.searchsorted(breakpoints, upper_scaled, side = "left")
+            for j, house in enumerate(houses):
+                inside = slice(first[j], max(first[j], last[j]))
+                front = front_of_candidates(np.concatenate([[lower[j]], breakpoints[inside], [upper_scaled[j]]])
+                                                / scale_factors[house],
+                                            np.concatenate([[lower_economics["simple_payback"][j]],
+                                                            breakpoint_economics["simple_payback"][inside],
+                                                            [upper_economics["simple_payback"][j]]]),
+                                            np.concatenate([[lower_economics["cost_per_kWh"][j]],
+                                                            breakpoint_economics["cost_per_kWh"][inside],
+                                                            [upper_economics["cost_per_kWh"][j]]]))
+                for column, value in pareto_summary(front, payback_tolerance).items():
+                    result[column][house] = value
+                fronts[house] = thin_front(front, thin_tolerance)
+    result["fronts"] = fronts
+    return result
+
+
+def save_pareto_fronts(file_path, fronts):
+    """
+    Save the fronts of many houses into one compressed numpy archive.
+
+    Input Arguments:
+        file_path : string (character), the .npz file
+        fronts : dict, address -> front obtained by pareto_front()
+
+    The values are saved as float32, the fronts of all the houses are concatenated,
+    "offsets" tells where every house starts.
+    """
+    addresses = list(fronts)
+    sizes = np.array([len(fronts[address]["solar_capacity"]) for address in addresses], dtype = np.int64)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    def concatenate(name):
+        if not addresses:
+            return np.zeros(0, dtype = np.float32)
+        return np.concatenate([fronts[address][name] for address in addresses]).astype(np.float32)
+    np.savez_compressed(file_path,
+                        Address = np.array(addresses, dtype = str),
+                        offsets = offsets,
+                        solar_capacity = concatenate("solar_capacity"),
+                        payback = concatenate("payback"),
+                        cost_per_kWh = concatenate("cost_per_kWh"))
+
+
+def load_pareto_fronts(file_paths):
+    """
+    Read the fronts saved by save_pareto_fronts().
+
+    Input Arguments:
+        file_paths : string (character) or list of the .npz files
+
+    Output :
+        fronts : dict, address -> front
+    """
+    if isinstance(file_paths, str):
+        file_paths = [file_paths]
+    fronts = {}
+    for file_path in file_paths:
+        with np.load(file_path) as archive:
+            data = {name: archive[name] for name in archive.files}
+        for i, address in enumerate(data["Address"]):
+            start, end = data["offsets"][i], data["offsets"][i + 1]
+            fronts[str(address)] = {name: data[name][start:end] for name in ("solar_capacity", "payback", "cost_per_kWh")}
+    return fronts
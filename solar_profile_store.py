@@ -0,0 +1,134 @@
+## This is the memory-mapped store for the hourly profiles of every house
+# Author : Qiancheng Sun
+"""
+The hourly solar PV output (per kW capacity) and the hourly load of every house
+only exist inside the pipeline loop. The profile_store in here keeps them on disk
+as two float32 arrays of houses x 8760 hours, which are memory-mapped, so any
+subset of houses can be sliced without reading the .csv files or calling the API again.
+
+Layout of the store directory:
+    PV_per_kW.f32 : houses x 8760 float32, hourly AC output per kW capacity (kW)
+    load.f32 : houses x 8760 float32, hourly electric consumption (kW)
+    index.jsonl : one address per line (json string), line number = row number
+"""
+#%%
+import json
+import os
+
+import numpy as np
+
+hours_per_year = 8760
+
+# the profile name -> file name
+profile_files = {"PV_per_kW": "PV_per_kW.f32", "load": "load.f32"}
+
+
+class profile_store:
+    """
+    Houses x hours store of the PV per kW and load profiles.
+
+    Input Arguments:
+        store_dir : string (character)
+                The working directory of the store, created when it does not exist.
+
+        mode : string (character)
+                "a" (default) to read and append, "r" to read only.
+
+    Example:
+        store = profile_store(store_dir)
+        store.append(address, PV_per_kW, load)
+        rows = store.rows(["address 1", "address 2"])
+        PV = store.profiles("PV_per_kW")[rows]
+    """
+    def __init__(self, store_dir, mode = "a"):
+        self.store_dir = store_dir
+        self.mode = mode
+        self.row_bytes = hours_per_year * np.dtype(np.float32).itemsize
+        if mode != "r":
+            os.makedirs(store_dir, exist_ok = True)
+        self.index_path = os.path.join(store_dir, "index.jsonl")
+        self.addresses = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding = "utf-8") as f:
+                self.addresses = [json.loads(line) for line in f if line.strip()]
+        # the data is written before the index, so after a crash the index may be shorter, never longer
+        n_rows = len(self.addresses)
+        for name in profile_files:
+            path = self.profile_path(name)
+            n_saved = os.path.getsize(path) // self.row_bytes if os.path.exists(path) else 0
+            n_rows = min(n_rows, n_saved)
+        self.addresses = self.addresses[:n_rows]
+        self.row_of = {address: row for row, address in enumerate(self.addresses)}
+        self.maps = {}
+
+    def profile_path(self, name):
+        return os.path.join(self.store_dir, profile_files[name])
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def append(self, address, PV_per_kW, load):
+        """
+        Save the profiles of one house. When the address is already in the store its row is overwritten.
+
+        Input Arguments:
+            address : string (character)
+            PV_per_kW : array of 8760 values, hourly AC output per kW capacity (kW)
+            load : array of 8760 values, hourly electric consumption (kW)
+
+        Output :
+            row : numeric
+                    the row number of the house
+        """
+        if self.mode == "r":
+            raise ValueError("the profile store is opened read only")
+        values = {"PV_per_kW": np.ascontiguousarray(PV_per_kW, dtype = np.float32).reshape(-1),
+                "load": np.ascontiguousarray(load, dtype = np.float32).reshape(-1)}
+        for name, array in values.items():
+            if len(array) != hours_per_year:
+                raise ValueError(name + " has " + str(len(array)) + " values, expected " + str(hours_per_year))
+        row = self.row_of.get(address)
+        if row is not None:
+            for name, array in values.items():
+                with open(self.profile_path(name), "r+b") as f:
+                    f.seek(row * self.row_bytes)
+                    f.write(array.tobytes())
+            return row
+        row = len(self.addresses)
+        for name, array in values.items():
+            with open(self.profile_path(name), "ab") as f:
+                # cut a partial row left by a crash
+                f.truncate(row * self.row_bytes)
+                f.write(array.tobytes())
+        with open(self.index_path, "a", encoding = "utf-8") as f:
+            f.write(json.dumps(address) + "\n")
+        self.addresses.append(address)
+        self.row_of[address] = row
+        # the memory maps have to be opened again to see the new row
+        self.maps = {}
+        return row
+
+    def profiles(self, name):
+        """
+        Return the memory-mapped (houses x 8760) float32 array of "PV_per_kW" or "load".
+        Slicing it (for example [100:200]) does not copy the data.
+        """
+        if len(self.addresses) == 0:
+            return np.zeros((0, hours_per_year), dtype = np.float32)
+        if name not in self.maps:
+            self.maps[name] = np.memmap(self.profile_path(name), dtype = np.float32, mode = "r",
+                                        shape = (len(self.addresses), hours_per_year))
+        return self.maps[name]
+
+    def rows(self, addresses):
+        """
+        Return the row numbers of the addresses as np.array(), a KeyError is raised for an unknown address.
+        """
+        return np.array([self.row_of[address] for address in addresses], dtype = np.int64)
+
+    def house(self, address):
+        """
+        Return the (PV_per_kW, load) profiles of one house, as views of the memory maps.
+        """
+        row = self.row_of[address]
+        return self.profiles("PV_per_kW")[row], self.profiles("load")[row]
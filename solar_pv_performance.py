@@ -0,0 +1,168 @@
+## This is the local PVWatts recomputation of the hourly DC and AC output
+# Author : Qiancheng Sun
+"""
+The hourly PV watts response already contains the plane of array irradiance, the cell temperature
+and the DC output of the array, but changing the losses, the module type or the DC/AC ratio of the
+system still asks the API again for every house.
+
+The functions in here recompute the hourly DC and AC output from the cached arrays
+(solar_API.solar_PV_watts_hourly_arrays()) with the PVWatts model (PVWatts Version 5 Manual,
+NREL/TP-6A20-62641, which is also the model of PVWatts v6):
+
+    DC : dc = system_capacity * poa_transmitted / 1000 * (1 + gamma * (tcell - 25)) * (1 - losses / 100)
+    AC : zeta = dc / (system_capacity / dc_ac_ratio / eta_nom)
+         eta = eta_nom / eta_ref * (-0.0162 * zeta - 0.0059 / zeta + 0.9858)
+         ac = min(eta * dc, system_capacity / dc_ac_ratio), 0 when dc <= 0
+
+The transmitted irradiance (after the angle of incidence loss of the module cover) is not in the
+response, so the new DC output is the cached DC output rescaled by the new losses and the new
+temperature coefficient gamma of the module type. The cell temperature and the cover of the cached
+request are kept, so a premium module (anti-reflective cover) recomputed from a standard module
+request differs from the API by the small cover effect. The irradiance of another tilt, azimuth or
+array type is not in the response either, those still need the API.
+
+Every parameter can be one value or an array of values, the array of values gives one row of
+hourly output for every value, so a whole system design sweep is one numpy calculation:
+
+    ac = recompute_PV_output(arrays, original_parameters, losses = np.arange(5, 20))["ac"] # (15, 8760) W
+"""
+#%%
+import numpy as np
+
+# temperature coefficient of power (1 / degree C) of the PV watts module types
+# "0" standard, "1" premium, "2" thin film
+module_temperature_coefficient = {0: -0.0047, 1: -0.0035, 2: -0.0020}
+
+# the PV watts v6 defaults of the parameters the pipeline does not send
+default_dc_ac_ratio = 1.2
+default_inv_eff = 96 # nominal inverter efficiency (%)
+# reference inverter efficiency of the PVWatts efficiency curve
+reference_inverter_efficiency = 0.9637
+# reference cell temperature of the temperature coefficient (degree C)
+reference_cell_temperature = 25
+
+
+def temperature_coefficient(module_type):
+    """
+    Temperature coefficient of power of the module type ("0", "1", "2" or an array of them).
+    """
+    module_type = np.asarray(module_type, dtype = np.float64).astype(np.int64)
+    gamma = np.array([module_temperature_coefficient[t] for t in range(3)])
+    if np.any((module_type < 0) | (module_type > 2)):
+        raise ValueError("module_type must be 0 (standard), 1 (premium) or 2 (thin film)")
+    return gamma[module_type]
+
+
+def sweep_parameter(value):
+    """
+    One value stays a number, an array of values obtains a trailing axis to broadcast against the hours.
+    """
+    value = np.asarray(value, dtype = np.float64)
+    return value[..., np.newaxis] if value.ndim > 0 else value
+
+
+def recompute_dc(dc, tcell,
+    original_module_type,
+    original_losses,
+    module_type = None,
+    losses = None):
+    """
+    Hourly DC output for a new module type and new losses from the cached DC output.
+
+    Input Arguments:
+        dc : array of 8760 values (unit : W), the cached "dc" of the PV watts response
+
+        tcell : array of 8760 values (unit : degree C), the cached "tcell"
+
+        original_module_type, original_losses : the module_type and losses (%) of the cached request
+
+        module_type, losses : one value or an array of values, default is None (the original value)
+
+    Output :
+        dc : array (unit : W), shape (8760,) or (number of values, 8760)
+    """
+    if module_type is None:
+        module_type = original_module_type
+    if losses is None:
+        losses = original_losses
+    dc = np.asarray(dc, dtype = np.float64)
+    tcell_delta = np.asarray(tcell, dtype = np.float64) - reference_cell_temperature
+    original_temperature_factor = 1 + temperature_coefficient(original_module_type) * tcell_delta
+    temperature_factor = 1 + sweep_parameter(temperature_coefficient(module_type)) * tcell_delta
+    loss_factor = (1 - sweep_parameter(losses) / 100) / (1 - float(original_losses) / 100)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        new_dc = dc * loss_factor * temperature_factor / original_temperature_factor
+    return np.where(dc > 0, new_dc, 0.0)
+
+
+def inverter_ac(dc, system_capacity, dc_ac_ratio = default_dc_ac_ratio, inv_eff = default_inv_eff):
+    """
+    Hourly AC output of the PVWatts inverter model.
+
+    Input Arguments:
+        dc : array (unit : W), the hourly DC output, obtained by recompute_dc() or the cached "dc"
+
+        system_capacity : numeric (unit : kW), the DC nameplate capacity of the request
+
+        dc_ac_ratio : one value or an array of values, default is 1.2
+
+        inv_eff : one value or an array of values (unit : %), default is 96, the nominal inverter efficiency
+
+    Output :
+        ac : array (unit : W), the shape of dc broadcast with the parameters
+    """
+    dc = np.asarray(dc, dtype = np.float64)
+    # AC nameplate and the DC input at the AC nameplate
+    ac_nameplate = float(system_capacity) * 1000 / sweep_parameter(dc_ac_ratio)
+    eta_nominal = sweep_parameter(inv_eff) / 100
+    dc_nameplate = ac_nameplate / eta_nominal
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        zeta = dc / dc_nameplate
+        eta = eta_nominal / reference_inverter_efficiency * (-0.0162 * zeta - 0.0059 / zeta + 0.9858)
+        ac = np.minimum(eta * dc, ac_nameplate)
+    return np.where(dc > 0, np.maximum(ac, 0.0), 0.0)
+
+
+def recompute_PV_output(arrays, original_parameters,
+    module_type = None,
+    losses = None,
+    dc_ac_ratio = None,
+    inv_eff = None):
+    """
+    Hourly DC and AC output for new system parameters from the cached PV watts arrays.
+
+    Input Arguments:
+        arrays : dict, obtained by solar_API.solar_PV_watts_hourly_arrays() (uses "dc" and "tcell")
+
+        original_parameters : dict, the parameters of the cached request,
+                "system_capacity", "module_type" and "losses" (strings like the pipeline, or numbers),
+                "dc_ac_ratio" and "inv_eff" when they were sent (PV watts defaults otherwise)
+
+        module_type, losses, dc_ac_ratio, inv_eff : one value or an array of values,
+                default is None (the original value). Two arrays must have the same length,
+                or broadcast as numpy arrays.
+
+    Output :
+        output : dict, "dc" and "ac" (unit : W) with the shape (8760,) or (number of values, 8760)
+    """
+    system_capacity = float(original_parameters["system_capacity"])
+    if dc_ac_ratio is None:
+        dc_ac_ratio = float(original_parameters.get("dc_ac_ratio", default_dc_ac_ratio))
+    if inv_eff is None:
+        inv_eff = float(original_parameters.get("inv_eff", default_inv_eff))
+    dc = recompute_dc(arrays["dc"], arrays["tcell"],
+                    original_module_type = original_parameters["module_type"],
+                    original_losses = float(original_parameters["losses"]),
+                    module_type = module_type,
+                    losses = losses)
+    return {"dc": dc, "ac": inverter_ac(dc, system_capacity, dc_ac_ratio = dc_ac_ratio, inv_eff = inv_eff)}
+
+
+def PV_AC_output_per_kW(arrays, original_parameters, **parameters):
+    """
+    The hourly AC output per kW capacity (unit : kW) for new system parameters, the same quantity as
+    obtain_PV_AC_output() in solar_API_pipeline.py, ready for the optimization.
+    The keyword arguments are module_type, losses, dc_ac_ratio and inv_eff, see recompute_PV_output().
+    """
+    ac = recompute_PV_output(arrays, original_parameters, **parameters)["ac"]
+    return ac / 1000 / float(original_parameters["system_capacity"])
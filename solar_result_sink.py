@@ -0,0 +1,172 @@
+## This is the function package for saving the solar data of every house
+# Author : Qiancheng Sun
+"""
+solar_data_from_json() saves the solar data of every house as Montly_solar_PV_watts.csv,
+so the file is overwritten by the next house, and the text serialization runs inside the loop.
+
+A sink in here receives the solar data frame of every house with write(address, df_solar)
+and is closed with close() at the end of the run.
+    null_sink : nothing is saved
+    csv_sink : the old behaviour, one .csv file overwritten by every house
+    parquet_batch_sink : one .parquet file for every batch of houses, with an Address column (needs pyarrow)
+    npz_archive_sink : one compressed numpy archive for every batch of houses, houses x hours arrays
+    background_sink : wraps any sink, the writes run on a background thread with a bounded queue,
+                      so the serialization overlaps the optimization of the next house
+"""
+#%%
+import os
+import queue
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+class null_sink:
+    """
+    Sink that does not save anything.
+    """
+    def write(self, address, df_solar):
+        pass
+
+    def close(self):
+        pass
+
+
+class csv_sink:
+    """
+    Sink that saves the solar data into output_dir/file_name, the file is overwritten by every house.
+    """
+    def __init__(self, output_dir, file_name = "Montly_solar_PV_watts.csv"):
+        self.output_dir = output_dir
+        self.file_name = file_name
+
+    def write(self, address, df_solar):
+        if not os.path.exists(self.output_dir):
+            os.mkdir(self.output_dir)
+        df_solar.to_csv(os.path.join(self.output_dir, self.file_name))
+
+    def close(self):
+        pass
+
+
+class batch_sink:
+    """
+    Base of the sinks that collect batch_size houses and save them into one file.
+    The file names are <prefix>_00000.<extension>, <prefix>_00001.<extension>, ...
+    and a new sink continues the numbering of the files already in output_dir,
+    so a resumed run does not overwrite the files of the earlier runs.
+    """
+    extension = None
+
+    def __init__(self, output_dir, batch_size = 1000, prefix = "solar_data"):
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.addresses = []
+        self.frames = []
+        os.makedirs(output_dir, exist_ok = True)
+        self.n_files = len([name for name in os.listdir(output_dir)
+                            if name.startswith(prefix + "_") and name.endswith("." + self.extension)])
+
+    def write(self, address, df_solar):
+        self.addresses.append(address)
+        self.frames.append(df_solar)
+        if len(self.frames) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.frames:
+            return
+        path = os.path.join(self.output_dir, "%s_%05d.%s" % (self.prefix, self.n_files, self.extension))
+        self.save_batch(path, self.addresses, self.frames)
+        self.n_files += 1
+        self.addresses = []
+        self.frames = []
+
+    def close(self):
+        self.flush()
+
+
+class parquet_batch_sink(batch_sink):
+    """
+    Sink that saves every batch of houses into one .parquet file, the rows of all the houses
+    are stacked and the Address column tells them apart. pyarrow is required.
+    """
+    extension = "parquet"
+
+    def __init__(self, output_dir, batch_size = 1000, prefix = "solar_data"):
+        try:
+            import pyarrow # noqa: F401
+        except ImportError:
+            raise ImportError("parquet_batch_sink needs pyarrow, please install it (pip install pyarrow) "
+                            "or use npz_archive_sink")
+        super().__init__(output_dir, batch_size, prefix)
+
+    def save_batch(self, path, addresses, frames):
+        data = pd.concat(frames, keys = addresses, names = ["Address", "hour"]).reset_index()
+        data.to_parquet(path, index = False)
+
+
+class npz_archive_sink(batch_sink):
+    """
+    Sink that saves every batch of houses into one compressed numpy archive (.npz).
+    The archive holds the "Address" array and one (houses x hours) array for every column,
+    the column names are saved in "columns" in the same order as the arrays column_0, column_1, ...
+    """
+    extension = "npz"
+
+    def save_batch(self, path, addresses, frames):
+        columns = list(frames[0].columns)
+        arrays = {"Address": np.array(addresses, dtype = str),
+                "columns": np.array(columns, dtype = str)}
+        for j, column in enumerate(columns):
+            arrays["column_%d" % j] = np.stack([np.asarray(frame[column]) for frame in frames])
+        np.savez_compressed(path, **arrays)
+
+
+class background_sink:
+    """
+    Run the writes of another sink on a background thread.
+
+    Input Arguments:
+        sink : any sink in here
+        max_queue : numeric, default is 64
+                The number of houses waiting to be written, write() blocks when the queue is full
+                so the memory stays bounded.
+
+    An error in the background thread is raised again by the next write() or by close().
+    """
+    def __init__(self, sink, max_queue = 64):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize = max_queue)
+        self.error = None
+        self.thread = threading.Thread(target = self.run, name = "solar_result_sink", daemon = True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is None:
+                try:
+                    self.sink.write(*item)
+                except BaseException as error:
+                    self.error = error
+        if self.error is None:
+            try:
+                self.sink.close()
+            except BaseException as error:
+                self.error = error
+
+    def write(self, address, df_solar):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((address, df_solar))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
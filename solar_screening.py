@@ -0,0 +1,229 @@
+## This is the monthly screening of the houses before the hourly PV watts runs
+# Author : Qiancheng Sun
+"""
+The monthly PV watts response (timeframe = "monthly") is 12 values per output instead of
+8 x 8760 hourly values. The load of every house is known locally (NREL load profile / scale factor),
+so the monthly solar and the monthly load already bound the payback of the house.
+
+For the capacity c, the solar used behind the meter in one month can not be more than the solar
+or the load of the month, so with the monthly AC output per kW PV_m and the monthly load L_m
+
+    behind_meter(c) <= sum over the months of min(c * PV_m, L_m) = behind_meter_bound(c)
+
+and the behind meter solar is at least 0 (all the solar exported). With the annual income
+income(c) = generation_rate * c * PV + (behind_meter_price - generation_rate) * behind_meter(c)
+both bounds of the stage 1 payback of the pipeline (the minimum payback between max(load) and 10 kW):
+
+    lower bound : behind_meter_bound(c) / c does not increase with c, so the best case payback
+                  does not decrease with c and its minimum is at the lower boundary
+    upper bound : the payback of the worst case (no solar behind the meter) of any capacity
+
+A house whose lower bound is above max_payback_year can not be a candidate, it is screened out
+before the hourly fetch and the optimization. The houses without a monthly response are kept.
+
+The NREL quota counts requests, not bytes, so the monthly request of a weather tile whose houses
+stay candidates is one request more than the hourly run alone. The screening only saves quota when
+all the houses of a tile are screened out, which needs a max_payback_year well under the typical payback.
+monthly_PV_output() does not ask for the monthly output of a tile whose hourly response is already
+in the cache (a resumed run, or a tile of an earlier chunk), the monthly sums of its hourly AC output
+are the same values.
+
+The screened out houses are in the output file with the result columns empty, screened_out = True
+and the payback_lower_bound, so they can be told apart from the houses whose run failed.
+"""
+#%%
+import os
+
+import numpy as np
+
+import solar_API
+import solar_API_batch
+import solar_API_cache
+import solar_metrics
+import solar_optimization
+import solar_weather_tile
+
+# the days of every month of the PV watts typical year (not a leap year)
+days_per_month = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+month_start_hours = np.concatenate([[0], np.cumsum(days_per_month * 24)[:-1]])
+
+# the columns of the screening in the output file
+screening_columns = ["screened_out", "payback_lower_bound"]
+
+
+def monthly_load(load_hourly_kW):
+    """
+    Monthly electric consumption (unit : kWh) of one hourly load (8760,) or of many loads (n, 8760).
+    """
+    load_hourly_kW = np.asarray(load_hourly_kW, dtype = np.float64)
+    return np.add.reduceat(load_hourly_kW, month_start_hours, axis = -1)
+
+
+def payback_bounds(PV_monthly_kWh_per_kW, load_monthly_kWh, lower, upper = 10,
+    behind_meter_price = solar_optimization.behind_meter_price,
+    generation_rate = solar_optimization.generation_rate,
+    cost_capital_solar_PV_per_kW = solar_optimization.cost_capital_solar_PV_per_kW,
+    tax_incentive_solar_PV = solar_optimization.tax_incentive_solar_PV,
+    cost_solar_pv_system_OM_per_kW_per_year = solar_optimization.cost_solar_pv_system_OM_per_kW_per_year):
+    """
+    Bounds of the minimum simple payback between lower and upper from the monthly solar and load.
+
+    Input Arguments:
+        PV_monthly_kWh_per_kW : array (12,) or (houses, 12), the monthly AC output per kW capacity (kWh)
+
+        load_monthly_kWh : array (12,) or (houses, 12), the monthly consumption of the house (kWh)
+
+        lower, upper : numeric or array with one value for every house (unit : kW), the stage 1 boundary
+
+        the price and cost arguments : see solar_optimization.simple_payback()
+
+    Output :
+        payback_lower_bound, payback_upper_bound : numeric or array with one value for every house (unit : year),
+                inf when the capacity never pays back
+    """
+    PV_monthly_kWh_per_kW = np.asarray(PV_monthly_kWh_per_kW, dtype = np.float64)
+    load_monthly_kWh = np.asarray(load_monthly_kWh, dtype = np.float64)
+    lower = np.asarray(lower, dtype = np.float64)
+    upper = np.asarray(upper, dtype = np.float64)
+    annual_PV_kWh_per_kW = PV_monthly_kWh_per_kW.sum(axis = -1)
+    install_cost_per_kW = cost_capital_solar_PV_per_kW * (1 - tax_incentive_solar_PV)
+
+    def payback_per_kW(income_per_kW):
+        # the simple payback of a capacity only depends on the annual income per kW of the capacity
+        net_income_per_kW = income_per_kW - cost_solar_pv_system_OM_per_kW_per_year
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            return np.where(net_income_per_kW > 0, install_cost_per_kW / net_income_per_kW, np.inf)
+
+    def behind_meter_bound_per_kW(c):
+        # a capacity of 0 is the limit of a very small capacity, all the solar of a month with load is used
+        c = np.maximum(c, 1e-9)[..., np.newaxis]
+        return np.minimum(c * PV_monthly_kWh_per_kW, load_monthly_kWh).sum(axis = -1) / c[..., 0]
+
+    price_difference = behind_meter_price - generation_rate
+    if price_difference >= 0:
+        best_income = generation_rate * annual_PV_kWh_per_kW + price_difference * behind_meter_bound_per_kW(lower)
+        worst_income = generation_rate * annual_PV_kWh_per_kW
+    else:
+        # the export pays more than the saving, the solar behind the meter is the worst case
+        best_income = generation_rate * annual_PV_kWh_per_kW
+        worst_income = generation_rate * annual_PV_kWh_per_kW + price_difference * behind_meter_bound_per_kW(upper)
+    return payback_per_kW(best_income), payback_per_kW(worst_income)
+
+
+def monthly_PV_output(api_key, solar_api_url, data_format, addresses, geocode_table, PV_parameters, system_capacity,
+    max_workers = 8, requests_per_hour = solar_API_batch.NREL_requests_per_hour,
+    cache_dir = None, cache_ttl = None, cache_max_bytes = None, replay_only = False):
+    """
+    Monthly AC output per kW capacity of every house, one monthly request for every weather tile
+    whose hourly response is not in the cache.
+
+    Input Arguments:
+        addresses, geocode_table, PV_parameters : see solar_weather_tile.group_addresses_by_PV_profile(),
+                the timeframe of PV_parameters is replaced by "monthly"
+
+        the other arguments : see solar_API_batch.solar_PV_watts_API_batch()
+
+    Output :
+        PV_monthly_kWh_per_kW : array (houses, 12), nan for the houses whose request failed
+    """
+    addresses = list(addresses)
+    groups = solar_weather_tile.group_addresses_by_PV_profile(addresses = addresses,
+                                                            geocode_table = geocode_table,
+                                                            PV_parameters = dict(PV_parameters, timeframe = "monthly"))
+    PV_monthly_kWh_per_kW = np.full((len(addresses), 12), np.nan)
+    requested_groups = []
+    for group in groups.values():
+        ac_monthly = cached_hourly_ac_monthly(api_key, solar_api_url, data_format, group["arguments"], system_capacity,
+                                            cache_dir, cache_ttl)
+        if ac_monthly is None:
+            requested_groups.append(group)
+        else:
+            PV_monthly_kWh_per_kW[group["rows"]] = ac_monthly / float(system_capacity)
+    solar_metrics.count("screening_tiles_from_hourly_cache", len(groups) - len(requested_groups))
+    if not requested_groups:
+        return PV_monthly_kWh_per_kW
+    results = solar_API_batch.solar_PV_watts_API_batch(api_key = api_key,
+                                            solar_api_url = solar_api_url,
+                                            data_format = data_format,
+                                            parameter_list = [group["arguments"] for group in requested_groups],
+                                            default_parameters = {"system_capacity": system_capacity},
+                                            max_workers = max_workers,
+                                            requests_per_hour = requests_per_hour,
+                                            cache_dir = cache_dir,
+                                            cache_ttl = cache_ttl,
+                                            cache_max_bytes = cache_max_bytes,
+                                            replay_only = replay_only)
+    for group, result in zip(requested_groups, results):
+        try:
+            ac_monthly = solar_API.extract_outputs_by_schema(result, solar_API.monthly_output_schema[:1])
+        except ValueError:
+            continue
+        PV_monthly_kWh_per_kW[group["rows"]] = next(iter(ac_monthly.values())) / float(system_capacity)
+    return PV_monthly_kWh_per_kW
+
+
+def cached_hourly_ac_monthly(api_key, solar_api_url, data_format, arguments, system_capacity, cache_dir, cache_ttl = None):
+    """
+    Monthly AC output (kWh) of the tile from its cached hourly response, None when it is not in the cache.
+
+    Input Arguments:
+        arguments : dict, the monthly request arguments of the tile, see monthly_PV_output()
+    """
+    if cache_dir is None:
+        return None
+    arguments = dict({"system_capacity": system_capacity, "address": None}, **arguments)
+    arguments["timeframe"] = "hourly"
+    params = solar_API.PV_watts_request_parameters(api_key = api_key, **arguments)
+    key = solar_API_cache.PV_watts_cache_key(solar_api_url, data_format, params)
+    # a tile without hourly response is not counted as a cache miss, its monthly request is
+    if not os.path.exists(solar_API_cache.cache_file_path(cache_dir, key)):
+        return None
+    data = solar_API_cache.read_cached_response(cache_dir, key, ttl = cache_ttl)
+    if data is None:
+        return None
+    ac = solar_API.decode_hourly_outputs([data.encode("utf-8")])["ac"]
+    return np.add.reduceat(ac.astype(np.float64), month_start_hours) / 1000
+
+
+def screen_houses(PV_monthly_kWh_per_kW, load_profiles, house_load_rows, scale_factors,
+    max_payback_year, upper = 10, **prices):
+    """
+    Monthly screening of the houses of a county.
+
+    Input Arguments:
+        PV_monthly_kWh_per_kW : array (houses, 12), obtained by monthly_PV_output()
+
+        load_profiles, house_load_rows, scale_factors : see solar_county_engine.optimize_county()
+
+        max_payback_year : numeric (unit : year), the houses whose payback lower bound is above it are screened out
+
+        upper : numeric, default is 10, the upper boundary of the stage 1 capacity (unit : kW)
+
+        prices : the price and cost arguments of solar_optimization.simple_payback()
+
+    Output :
+        screening : dict of arrays with one value for every house,
+                "payback_lower_bound", "payback_upper_bound" (nan without monthly output or scale factor)
+                and "candidate" (Boolean, True for the houses that need the hourly run)
+    """
+    load_profiles = np.asarray(load_profiles)
+    house_load_rows = np.asarray(house_load_rows, dtype = np.int64)
+    scale_factors = np.asarray(scale_factors, dtype = np.float64).reshape(-1)
+    # the monthly load and the maximum load of every profile once, the houses only scale them
+    profile_monthly_load = monthly_load(load_profiles)
+    profile_max_load = load_profiles.max(axis = -1).astype(np.float64)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        load_monthly_kWh = profile_monthly_load[house_load_rows] / scale_factors[:, np.newaxis]
+        max_load = profile_max_load[house_load_rows] / scale_factors
+    # the stage 1 boundary, see solar_house_optimization.payback_boundary()
+    lower = np.where(max_load >= upper, 0.0, max_load)
+    payback_lower_bound, payback_upper_bound = payback_bounds(PV_monthly_kWh_per_kW, load_monthly_kWh,
+                                                            lower, upper, **prices)
+    known = np.all(np.isfinite(PV_monthly_kWh_per_kW), axis = -1) & np.isfinite(scale_factors) & (scale_factors > 0)
+    payback_lower_bound = np.where(known, payback_lower_bound, np.nan)
+    payback_upper_bound = np.where(known, payback_upper_bound, np.nan)
+    candidate = ~(payback_lower_bound > max_payback_year)
+    solar_metrics.count("screened_out_houses", int(np.sum(~candidate)))
+    return {"payback_lower_bound": payback_lower_bound,
+            "payback_upper_bound": payback_upper_bound,
+            "candidate": candidate}
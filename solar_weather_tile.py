@@ -0,0 +1,115 @@
+## This is the function package for sharing the PV watts profile between neighbouring houses
+# Author : Qiancheng Sun
+"""
+The PV watts API uses the weather data of the closest NSRDB grid cell (about 4 km),
+so the neighbouring houses in the county file obtain the same hourly profile.
+The pipeline always asks for system_capacity = "1" and scales the AC output in
+obtain_PV_AC_output(), so the 1 kW profile only depends on the weather tile and the
+PV parameters (module_type, losses, array_type, tilt, azimuth).
+
+The functions in here map every address to a weather tile through a local geocode
+table, so one PV watts request is sent for every unique
+(tile, module_type, losses, array_type, tilt, azimuth) key instead of one for every house.
+"""
+#%%
+import pandas as pd
+
+# NSRDB PSM grid is 0.038 degree, round the location to 0.04 degree by default
+default_tile_resolution = 0.04
+
+# the PV parameters that change the 1 kW profile, besides the location
+PV_profile_parameters = ("module_type", "losses", "array_type", "tilt", "azimuth", "timeframe")
+
+
+def load_geocode_table(file_path, address_column = "Address", lat_column = "latitude", lon_column = "longitude"):
+    """
+    Read the local geocode table.
+
+    Input Arguments:
+        file_path : string (character)
+                The .csv file with one row for every address and the latitude / longitude columns.
+
+        address_column, lat_column, lon_column : string (character)
+                The column names in the geocode table.
+
+    Output :
+        geocode_table : dict
+                address -> (latitude, longitude)
+    """
+    table = pd.read_csv(file_path, usecols = [address_column, lat_column, lon_column])
+    table = table.dropna()
+    return dict(zip(table[address_column], zip(table[lat_column].astype(float), table[lon_column].astype(float))))
+
+
+def weather_tile(lat, lon, resolution = default_tile_resolution):
+    """
+    Round the location to the weather tile.
+
+    Output :
+        tile : tuple
+                (latitude index, longitude index) of the tile, the same for all the locations inside it.
+    """
+    return (int(round(float(lat) / resolution)), int(round(float(lon) / resolution)))
+
+
+def weather_tile_center(tile, resolution = default_tile_resolution):
+    """
+    Return the (lat, lon) strings of the tile center, which are sent to the PV watts API.
+    Always the same text for the same tile, so the response cache is shared by the whole tile.
+    """
+    return ("%.4f" % (tile[0] * resolution), "%.4f" % (tile[1] * resolution))
+
+
+def PV_location_arguments(address, geocode_table, resolution = default_tile_resolution):
+    """
+    Return the location arguments of solar_API.solar_PV_watts_API() for one address.
+
+    Output :
+        arguments : dict
+                {"address": None, "lat": ..., "lon": ...} with the tile center, when the address is in the geocode table.
+                {"address": address} otherwise, the API will geocode it.
+    """
+    location = geocode_table.get(address)
+    if location is None:
+        return {"address": address}
+    lat, lon = weather_tile_center(weather_tile(location[0], location[1], resolution), resolution)
+    return {"address": None, "lat": lat, "lon": lon}
+
+
+def group_addresses_by_PV_profile(addresses, geocode_table, PV_parameters, resolution = default_tile_resolution):
+    """
+    Group the houses that obtain the same PV watts profile.
+
+    Input Arguments:
+        addresses : list
+                The address of every house (for example file["Address"]).
+
+        geocode_table : dict
+                The table obtained by load_geocode_table().
+
+        PV_parameters : dict or list of dict
+                The PV parameters (module_type, losses, array_type, tilt, azimuth, timeframe),
+                either the same for every house or one dict for every house.
+
+        resolution : numeric (unit : degree)
+                The tile size, default is 0.04
+
+    Output :
+        groups : dict
+                PV profile key -> {"arguments": location and PV arguments for the API request,
+                                    "rows": the row number of every house in the group}
+                The houses that are not in the geocode table have their own group keyed by the address.
+    """
+    groups = {}
+    for row, address in enumerate(addresses):
+        parameters = PV_parameters[row] if isinstance(PV_parameters, (list, tuple)) else PV_parameters
+        location = PV_location_arguments(address, geocode_table, resolution)
+        if location["address"] is None:
+            location_key = (location["lat"], location["lon"])
+        else:
+            location_key = (address,)
+        key = location_key + tuple(str(parameters.get(name)) for name in PV_profile_parameters)
+        if key not in groups:
+            groups[key] = {"arguments": dict(parameters, **location), "rows": []}
+        groups[key]["rows"].append(row)
+    return groups